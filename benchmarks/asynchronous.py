@@ -8,7 +8,7 @@ from shared_memory_dict.caches.aiocache import SharedMemoryCache
 
 loop = asyncio.get_event_loop()
 
-cache_smc_aiocache = SharedMemoryCache(size=64)
+cache_smc_aiocache = SharedMemoryCache(size=1024)
 cache_aiocache_redis = RedisCache(loop=loop)
 cache_aiocache_memory = SimpleMemoryCache()
 
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from shared_memory_dict import AsyncSharedMemoryDict
+
+SIZES = [1024, 64 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+WRITES = 20
+TICK = 0.001
+
+
+async def ticker(stop: asyncio.Event) -> float:
+    """
+    Returns the longest time the loop took to run a 1ms sleep
+    """
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        worst = max(worst, time.perf_counter() - start - TICK)
+    return worst
+
+
+async def write_sync(smd: AsyncSharedMemoryDict, value: list) -> None:
+    for i in range(WRITES):
+        smd.dict[f'key-{i % 4}'] = value
+        smd.dict.get(f'key-{i % 4}')
+        await asyncio.sleep(0)
+
+
+async def write_async(smd: AsyncSharedMemoryDict, value: list) -> None:
+    for i in range(WRITES):
+        await smd.set(f'key-{i % 4}', value)
+        await smd.get(f'key-{i % 4}')
+
+
+async def stall(write, smd: AsyncSharedMemoryDict, size: int) -> float:
+    stop = asyncio.Event()
+    tick = asyncio.ensure_future(ticker(stop))
+    await write(smd, [b'x' * 64] * (size // 64))
+    stop.set()
+    return await tick
+
+
+async def main() -> None:
+    smd = AsyncSharedMemoryDict(
+        'bench-loop', 64 * 1024 * 1024, offload_threshold=64 * 1024
+    )
+    print('Worst event loop stall (ms) while writing and reading lists')
+    print(f'{"size":>10} {"SharedMemoryDict":>18} {"Async":>10}')
+    for size in SIZES:
+        sync = await stall(write_sync, smd, size)
+        asynchronous = await stall(write_async, smd, size)
+        print(f'{size:>10} {sync * 1000:>18.2f} {asynchronous * 1000:>10.2f}')
+    smd.shm.unlink()
+    smd.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
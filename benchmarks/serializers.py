@@ -0,0 +1,70 @@
+from timeit import timeit
+
+from shared_memory_dict import SharedMemoryDict
+from shared_memory_dict.serializers import (
+    JSONSerializer,
+    MarshalSerializer,
+    MsgpackSerializer,
+    PickleSerializer,
+)
+
+
+class NoFastPath:
+    fast_path = False
+
+    def __init__(self, serializer):
+        self._serializer = serializer
+
+    def dumps(self, obj):
+        return self._serializer.dumps(obj)
+
+    def loads(self, data):
+        return self._serializer.loads(data)
+
+
+serializers = {
+    'pickle': PickleSerializer(),
+    'pickle (no fast path)': NoFastPath(PickleSerializer()),
+    'json': JSONSerializer(),
+    'json (no fast path)': NoFastPath(JSONSerializer()),
+    'marshal': MarshalSerializer(),
+    'marshal (no fast path)': NoFastPath(MarshalSerializer()),
+}
+try:
+    serializers['msgpack'] = MsgpackSerializer()
+    serializers['msgpack (no fast path)'] = NoFastPath(MsgpackSerializer())
+except ImportError:
+    pass
+
+payloads = {
+    'short strings': [f'session-{i}' for i in range(100)],
+    'ints': list(range(100)),
+    'dicts': [{'id': i, 'name': f'user-{i}'} for i in range(100)],
+}
+
+
+def write_and_read(smd, values):
+    for i, value in enumerate(values):
+        smd[f'key-{i}'] = value
+    for i in range(len(values)):
+        smd[f'key-{i}']
+
+
+def collect(serializer, values):
+    smd = SharedMemoryDict(
+        name='bench-serializers', size=64 * 1024, serializer=serializer
+    )
+    try:
+        return timeit(lambda: write_and_read(smd, values), number=100)
+    finally:
+        smd.shm.unlink()
+        smd.cleanup()
+
+
+if __name__ == '__main__':
+    print('Bench Serializers')
+    for payload, values in payloads.items():
+        print(f'Payload: {payload}')
+        for name, serializer in serializers.items():
+            print(f'{name:<24}: {collect(serializer, values)}')
+        print('')
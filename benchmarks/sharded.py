@@ -0,0 +1,52 @@
+import multiprocessing
+import time
+
+from shared_memory_dict import ShardedSharedMemoryDict, SharedMemoryDict
+from shared_memory_dict.hooks import free_shared_memory
+
+PROCESSES = multiprocessing.cpu_count()
+WRITES = 20000
+SIZE = 16 * 1024 * 1024
+
+
+def open_dict(shards: int):
+    if shards == 1:
+        return SharedMemoryDict('bench-shards', SIZE, lock=True)
+    return ShardedSharedMemoryDict(
+        'bench-shards', SIZE, shards=shards, lock=True
+    )
+
+
+def write(shards: int, worker: int) -> None:
+    smd = open_dict(shards)
+    for i in range(WRITES):
+        smd[f'key-{worker}-{i % 1024}'] = i
+    smd.cleanup()
+
+
+def run(shards: int) -> float:
+    smd = open_dict(shards)
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=write, args=(shards, worker))
+        for worker in range(PROCESSES)
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    smd.cleanup()
+    free_shared_memory('bench-shards', shards=None if shards == 1 else shards)
+    return PROCESSES * WRITES / elapsed
+
+
+def main() -> None:
+    print(f'Writes per second of {PROCESSES} processes')
+    for shards in [1, 2, 4, 8, 16, 32]:
+        print(f'{shards:>6} shards {run(shards):>12,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,7 +6,7 @@ from django_redis.cache import RedisCache
 from shared_memory_dict.caches.django import SharedMemoryCache
 
 cache_smc_django = SharedMemoryCache(
-    'django', params={'OPTIONS': {'MEMORY_BLOCK_SIZE': 64}}
+    'django', params={'OPTIONS': {'MEMORY_BLOCK_SIZE': 1024}}
 )
 cache_django_redis = RedisCache(server='redis://127.0.0.1:6379/1', params={})
 cache_django_locmem = LocMemCache('locmem', params={})
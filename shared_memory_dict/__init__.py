@@ -1 +1,6 @@
+from .aio import AsyncSharedMemoryDict  # noqa
 from .dict import SharedMemoryDict  # noqa
+from .sharded import (  # noqa
+    AsyncShardedSharedMemoryDict,
+    ShardedSharedMemoryDict,
+)
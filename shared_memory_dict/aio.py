@@ -0,0 +1,378 @@
+import asyncio
+import sys
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from itertools import islice
+from multiprocessing.shared_memory import SharedMemory
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from .dict import (
+    NOT_GIVEN,
+    READ_RETRIES,
+    SharedMemoryDict,
+    _encode_key,
+    _time_left,
+)
+from .ring import Change, Watcher
+
+# Values of this many bytes or more are encoded and decoded in an executor
+OFFLOAD_THRESHOLD = 64 * 1024
+# Objects looked at to estimate the size of a value before encoding it,
+# bigger values are encoded in the executor
+SIZE_ITEMS = 1024
+# Seconds between attempts to take the lock of the memory block, doubled
+# on every attempt up to the maximum
+LOCK_POLL_INTERVAL = 0.0005
+MAX_LOCK_POLL_INTERVAL = 0.01
+# Seconds an executor thread sleeps waiting for writes at a time, so
+# cancelled waits don't hold it for long
+WATCH_SLICE = 0.1
+
+
+class AsyncSharedMemoryDict:
+    """
+    An asyncio API of SharedMemoryDict that never blocks the event loop
+
+    Writes wait for the lock of the memory block by trying to take it
+    without blocking and sleeping between attempts, instead of blocking
+    the event loop thread, and so do reads that keep colliding with
+    writes. Values of at least `offload_threshold` bytes (estimated from
+    the objects they hold before being encoded) are encoded and decoded in
+    `executor`, the default executor of the loop when it's not given.
+
+    The lock of the memory block is reentrant for the thread holding it,
+    so the coroutines of a process also take turns with an asyncio lock.
+    Other arguments are passed to SharedMemoryDict, but reads always
+    decode the values they read (the `cache` argument is ignored).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        size: int,
+        *,
+        offload_threshold: int = OFFLOAD_THRESHOLD,
+        executor: Optional[Executor] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._dict = SharedMemoryDict(name, size, **kwargs)
+        self._offload_threshold = offload_threshold
+        self._executor = executor
+        self._write_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def dict(self) -> SharedMemoryDict:
+        """
+        The SharedMemoryDict of the same memory block, for blocking calls
+        """
+        return self._dict
+
+    @property
+    def shm(self) -> SharedMemory:
+        return self._dict.shm
+
+    def cleanup(self) -> None:
+        self._dict.cleanup()
+
+    async def get(self, key: Any, default: Optional[Any] = None) -> Any:
+        encoded_key = _encode_key(key)
+        found = await self._read_data([encoded_key])
+        if encoded_key not in found:
+            return default
+        return await self._loads(*found[encoded_key])
+
+    async def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        """
+        Returns the values of the keys that exist, all read at once
+        """
+        encoded_keys = {_encode_key(key): key for key in keys}
+        found = await self._read_data(list(encoded_keys))
+        size = sum(len(data) for data, _ in found.values())
+        values = await self._offload(
+            size >= self._offload_threshold, self._decode_many, found
+        )
+        return {encoded_keys[key]: value for key, value in values.items()}
+
+    async def exists(self, key: Any) -> bool:
+        return (
+            await self._read(self._dict._load_expires, _encode_key(key)) >= 0
+        )
+
+    async def ttl(self, key: Any) -> Optional[float]:
+        expires = await self._read(self._dict._load_expires, _encode_key(key))
+        return _time_left(key, expires)
+
+    async def set(
+        self, key: Any, value: Any, ttl: Optional[float] = None
+    ) -> None:
+        """
+        Sets the value of the key, which expires after `ttl` seconds when
+        it's given
+        """
+        pair = (_encode_key(key), await self._dumps(value))
+        async with self._locked():
+            self._dict._write_data([pair], ttl)
+
+    async def set_many(
+        self, mapping: Mapping[Any, Any], ttl: Optional[float] = None
+    ) -> None:
+        """
+        Sets the values of all keys in a single write, or none of them
+        when they don't fit
+        """
+        size = sum(
+            _estimate_size(value, self._offload_threshold)
+            for value in mapping.values()
+        )
+        pairs = await self._offload(
+            size >= self._offload_threshold, self._encode_many, mapping
+        )
+        async with self._locked():
+            self._dict._write_data(pairs, ttl)
+
+    async def delete(self, key: Any) -> bool:
+        """
+        Deletes the key and returns whether it existed
+        """
+        return await self.delete_many([key]) == 1
+
+    async def delete_many(self, keys: Iterable[Any]) -> int:
+        keys = list(keys)
+        async with self._locked():
+            return self._dict.delete_many(keys)
+
+    async def delete_prefix(self, prefix: str) -> int:
+        async with self._locked():
+            return self._dict.delete_prefix(prefix)
+
+    async def pop(self, key: Any, default: Any = NOT_GIVEN) -> Any:
+        async with self._locked():
+            with self._dict._modify_db() as table:
+                popped = table.pop(_encode_key(key))
+        if popped is not None:
+            return await self._loads(*popped)
+        if default is NOT_GIVEN:
+            raise KeyError(key)
+        return default
+
+    async def incr(
+        self, key: Any, delta: int = 1, default: Any = NOT_GIVEN
+    ) -> int:
+        async with self._locked():
+            return self._dict.incr(key, delta, default)
+
+    async def decr(
+        self, key: Any, delta: int = 1, default: Any = NOT_GIVEN
+    ) -> int:
+        return await self.incr(key, -delta, default)
+
+    async def get_with_version(
+        self, key: Any, default: Optional[Any] = None
+    ) -> Tuple[Any, int]:
+        """
+        See `SharedMemoryDict.get_with_version`
+        """
+        encoded_key = _encode_key(key)
+        found = await self._read(self._dict._load_versioned, encoded_key)
+        if found is None:
+            return default, 0
+        self._dict._touch([encoded_key])
+        data, tag, version = found
+        return await self._loads(data, tag), version
+
+    async def cas(
+        self, key: Any, version: int, value: Any, ttl: Optional[float] = None
+    ) -> bool:
+        """
+        See `SharedMemoryDict.cas`
+        """
+        pair = (_encode_key(key), await self._dumps(value))
+        async with self._locked():
+            return self._dict._cas_data(pair[0], version, pair[1], ttl)
+
+    async def cas_delete(self, key: Any, version: int) -> bool:
+        async with self._locked():
+            return self._dict.cas_delete(key, version)
+
+    async def expire(self, key: Any, ttl: Optional[float]) -> bool:
+        async with self._locked():
+            return self._dict.expire(key, ttl)
+
+    async def sweep(self, limit: Optional[int] = None) -> int:
+        async with self._locked():
+            return self._dict.sweep(limit)
+
+    async def clear(self) -> None:
+        async with self._locked():
+            self._dict.clear()
+
+    def watch(self, since: Optional[int] = None) -> 'AsyncWatcher':
+        """
+        Returns an AsyncWatcher, see `SharedMemoryDict.watch`
+        """
+        return AsyncWatcher(self._dict.watch(since), self._executor)
+
+    @asynccontextmanager
+    async def _locked(self) -> AsyncIterator[None]:
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            lock, interval = self._dict._lock, LOCK_POLL_INTERVAL
+            while not lock.acquire(blocking=False):
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, MAX_LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                lock.release()
+
+    async def _read(self, read: Callable, *args: Any) -> Any:
+        """
+        Runs `read` like `SharedMemoryDict._read_db`, but sleeps between
+        the attempts that collide with a write, and waits for the lock
+        without blocking when they keep colliding
+        """
+        for _ in range(READ_RETRIES):
+            done, result = self._dict._try_read(read, *args)
+            if done:
+                return result
+            await asyncio.sleep(0)
+
+        async with self._locked():
+            return self._dict._read_locked(read, *args)
+
+    async def _read_data(
+        self, keys: List[bytes]
+    ) -> Dict[bytes, Tuple[bytes, int]]:
+        data = await self._read(self._dict._load_data, keys)
+        self._dict._touch(data)
+        return data
+
+    async def _dumps(self, value: Any) -> Tuple[bytes, int]:
+        return await self._offload(
+            _estimate_size(value, self._offload_threshold)
+            >= self._offload_threshold,
+            self._dict._dumps,
+            value,
+        )
+
+    async def _loads(self, data: bytes, tag: int) -> Any:
+        return await self._offload(
+            len(data) >= self._offload_threshold, self._dict._loads, data, tag
+        )
+
+    async def _offload(self, offload: bool, func: Callable, *args: Any) -> Any:
+        if not offload:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _encode_many(
+        self, mapping: Mapping[Any, Any]
+    ) -> List[Tuple[bytes, Tuple[bytes, int]]]:
+        return [
+            (_encode_key(key), self._dict._dumps(value))
+            for key, value in mapping.items()
+        ]
+
+    def _decode_many(
+        self, found: Dict[bytes, Tuple[bytes, int]]
+    ) -> Dict[bytes, Any]:
+        return {
+            key: self._dict._loads(data, tag)
+            for key, (data, tag) in found.items()
+        }
+
+
+def _estimate_size(value: Any, limit: int) -> int:
+    """
+    Estimates the bytes taken by value and the objects it holds, up to
+    limit, which is returned once it's reached or more than SIZE_ITEMS
+    objects were looked at
+    """
+    size, stack = 0, [value]
+    for _ in range(SIZE_ITEMS):
+        if not stack:
+            return size
+        item = stack.pop()
+        size += sys.getsizeof(item)
+        if size >= limit:
+            return limit
+        if isinstance(item, dict):
+            stack.extend(islice(item.items(), SIZE_ITEMS))
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(islice(item, SIZE_ITEMS))
+        elif hasattr(item, '__dict__'):
+            stack.append(vars(item))
+    return size if not stack else limit
+
+
+class AsyncWatcher:
+    """
+    Waits for the writes to a SharedMemoryDict in an executor, sleeping
+    `WATCH_SLICE` seconds at a time. Iterating it yields the keys changed
+    by each write (None when they're unknown), see `Watcher`.
+    """
+
+    def __init__(
+        self, watcher: Watcher, executor: Optional[Executor] = None
+    ) -> None:
+        self._watcher = watcher
+        self._executor = executor
+
+    @property
+    def seq(self) -> int:
+        return self._watcher.seq
+
+    async def changes(
+        self, timeout: Optional[float] = 0
+    ) -> Optional[List[Change]]:
+        """
+        See `Watcher.changes`
+        """
+        return await self._wait(self._watcher.changes, timeout)
+
+    async def wait(self, timeout: Optional[float] = None) -> Optional[Set]:
+        """
+        See `Watcher.wait`
+        """
+        return await self._wait(self._watcher.wait, timeout)
+
+    async def _wait(self, func: Callable, timeout: Optional[float]) -> Any:
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            step = WATCH_SLICE
+            if deadline is not None:
+                step = min(step, max(deadline - loop.time(), 0))
+            found = await loop.run_in_executor(self._executor, func, step)
+            if found is None or found:
+                return found
+            if deadline is not None and loop.time() >= deadline:
+                return found
+
+    def close(self) -> None:
+        self._watcher.close()
+
+    def __aiter__(self) -> 'AsyncWatcher':
+        return self
+
+    async def __anext__(self) -> Optional[Set]:
+        return await self.wait()
+
+    async def __aenter__(self) -> 'AsyncWatcher':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.close()
@@ -1,19 +1,81 @@
 import asyncio
-from asyncio.events import AbstractEventLoop, TimerHandle
+import logging
+from collections import namedtuple
+from contextlib import suppress
 from typing import Any, Dict, List, Optional, Tuple, Union
+from weakref import WeakSet
 
 from aiocache.base import BaseCache
 from aiocache.serializers import BaseSerializer, NullSerializer
 
-from ..dict import SharedMemoryDict
+from ..aio import OFFLOAD_THRESHOLD, AsyncSharedMemoryDict
+from ..sharded import AsyncShardedSharedMemoryDict
 
 Number = Union[int, float]
+CacheDict = Union[AsyncSharedMemoryDict, AsyncShardedSharedMemoryDict]
+
+logger = logging.getLogger(__name__)
+
+# Seconds between sweeps of the expired keys, and keys checked by each
+# sweep of every dict
+SWEEP_INTERVAL = 10
+SWEEP_LIMIT = 1024
+
+# The cas token of `_gets`, the version of the entry it read (0 when the
+# key didn't exist)
+CasToken = namedtuple('CasToken', ['version'])
+
+# The dicts of the backends of this process, swept by a single task
+_swept: 'WeakSet[CacheDict]' = WeakSet()
+_sweeper: Optional['asyncio.Task[None]'] = None
+
+
+async def _sweep() -> None:
+    while _swept:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        for cache in list(_swept):
+            try:
+                await cache.sweep(SWEEP_LIMIT)
+            except Exception:
+                logger.exception('Sweeping the expired keys failed')
+                _swept.discard(cache)
+
+
+async def _stop_sweeping(cache: CacheDict) -> None:
+    """
+    Removes the dict from the ones swept, stopping the task of this process
+    when it was the last one
+    """
+    _swept.discard(cache)
+    if _swept or _sweeper is None or _sweeper.done():
+        return
+    _sweeper.cancel()
+    if _sweeper.get_loop() is asyncio.get_running_loop():
+        with suppress(asyncio.CancelledError):
+            await _sweeper
+
+
+def _start_sweeping(cache: CacheDict) -> None:
+    """
+    Adds the dict to the ones swept by the task of this process, starting
+    it in the running loop when there's none
+    """
+    global _sweeper
+    _swept.add(cache)
+    loop = asyncio.get_running_loop()
+    if _sweeper is None or _sweeper.done() or _sweeper.get_loop() is not loop:
+        _sweeper = loop.create_task(_sweep())
 
 
 class SharedMemoryCache(BaseCache):
     """
     A AioCache implementation of SharedMemoryDict
     based on aiocache.backends.memory.SimpleMemoryCache
+
+    It's built on AsyncSharedMemoryDict, so waiting for the lock and
+    encoding big values never block the event loop. Keys expire in the
+    memory block, at the same time for every process, and a single task
+    of each process reclaims the expired ones every SWEEP_INTERVAL seconds.
     """
 
     NAME = 'shared_memory'
@@ -23,12 +85,34 @@ class SharedMemoryCache(BaseCache):
         serializer: Optional[BaseSerializer] = None,
         name: str = 'smc',
         size: int = 1024,
+        lock: Optional[bool] = None,
+        max_size: Optional[int] = None,
+        eviction: Optional[str] = None,
+        compression: Optional[str] = None,
+        compress_threshold: Optional[int] = None,
+        prefix_index: bool = False,
+        offload_threshold: int = OFFLOAD_THRESHOLD,
+        shards: Optional[int] = None,
         **kwargs,
     ):
         super().__init__(**kwargs)
         self.serializer = serializer or NullSerializer()
-        self._cache = SharedMemoryDict(name, size)
-        self._handlers: Dict[str, TimerHandle] = {}
+        options: Dict[str, Any] = {
+            'offload_threshold': offload_threshold,
+            'lock': lock,
+            'max_size': max_size,
+            'eviction': eviction,
+            'compression': compression,
+            'compress_threshold': compress_threshold,
+            'prefix_index': prefix_index,
+        }
+        self._cache: CacheDict = (
+            AsyncSharedMemoryDict(name, size, **options)
+            if shards is None
+            else AsyncShardedSharedMemoryDict(
+                name, size, shards=shards, **options
+            )
+        )
 
     @classmethod
     def parse_uri_path(cls, path: str) -> Dict:
@@ -37,12 +121,18 @@ class SharedMemoryCache(BaseCache):
     async def _get(
         self, key: str, encoding: Optional[str] = 'utf-8', _conn=None
     ):
-        return self._cache.get(key)
+        return await self._cache.get(key)
+
+    async def _gets(
+        self, key: str, encoding: Optional[str] = 'utf-8', _conn=None
+    ) -> CasToken:
+        return CasToken((await self._cache.get_with_version(key))[1])
 
     async def _multi_get(
         self, keys: List[str], encoding: Optional[str] = 'utf-8', _conn=None
     ):
-        return [self._cache.get(key) for key in keys]
+        values = await self._cache.get_many(keys)
+        return [values.get(key) for key in keys]
 
     async def _set(
         self,
@@ -52,19 +142,21 @@ class SharedMemoryCache(BaseCache):
         _cas_token: Optional[Any] = None,
         _conn=None,
     ) -> bool:
-        if _cas_token is not None and _cas_token != self._cache.get(key):
-            return False
-
-        if key in self._handlers:
-            self._handlers[key].cancel()
-
-        self._cache[key] = value
-        if ttl:
-            self._handlers[key] = self._loop().call_later(
-                ttl, self._delete_key, key
-            )
-
-        return True
+        """
+        Sets the value, when the key still has the version of the
+        `CasToken` given, or (for any other token) the value given
+        """
+        if _cas_token is None:
+            await self._cache.set(key, value, self._ttl(ttl))
+            return True
+
+        if isinstance(_cas_token, CasToken):
+            version = _cas_token.version
+        else:
+            current, version = await self._cache.get_with_version(key)
+            if current != _cas_token:
+                return False
+        return await self._cache.cas(key, version, value, self._ttl(ttl))
 
     async def _multi_set(
         self,
@@ -72,8 +164,7 @@ class SharedMemoryCache(BaseCache):
         ttl: Optional[Number] = None,
         _conn=None,
     ) -> bool:
-        for key, value in pairs:
-            await self._set(key, value, ttl=ttl)
+        await self._cache.set_many(dict(pairs), self._ttl(ttl))
         return True
 
     async def _add(
@@ -83,76 +174,65 @@ class SharedMemoryCache(BaseCache):
         ttl: Optional[Number] = None,
         _conn=None,
     ):
-        if key in self._cache:
+        # version 0 only matches keys that don't exist
+        if not await self._cache.cas(key, 0, value, self._ttl(ttl)):
             raise ValueError(
                 f'Key {key} already exists, use .set to update the value'
             )
-
-        await self._set(key, value, ttl=ttl)
         return True
 
     async def _exists(self, key: str, _conn=None):
-        return key in self._cache
+        return await self._cache.exists(key)
 
     async def _increment(self, key: str, delta: int, _conn=None):
-        new_value = delta
-        if key not in self._cache:
-            self._cache[key] = delta
-        else:
-            value = self._cache[key]
+        while True:
+            with suppress(TypeError):
+                return await self._cache.incr(key, delta, default=0)
+            # values of other serializers, like '1', are converted with int
+            value, version = await self._cache.get_with_version(key)
+            if not version:
+                continue
             try:
                 new_value = int(value) + delta
-            except ValueError:
+                ttl = await self._cache.ttl(key)
+            except (TypeError, ValueError):
                 raise TypeError('Value is not an integer') from None
-
-        self._cache[key] = new_value
-        return new_value
+            except KeyError:
+                continue
+            if await self._cache.cas(key, version, new_value, ttl):
+                return new_value
 
     async def _expire(
         self, key: str, ttl: Union[int, float], _conn=None
     ) -> bool:
-        if key not in self._cache:
-            return False
-
-        handle = self._handlers.pop(key, None)
-
-        if handle:
-            handle.cancel()
-        if ttl:
-            self._handlers[key] = self._loop().call_later(
-                ttl, self._delete_key, key
-            )
-
-        return True
+        return await self._cache.expire(key, self._ttl(ttl))
 
     async def _delete(self, key: str, _conn=None) -> int:
-        return self._delete_key(key)
+        return await self._delete_key(key)
 
     async def _clear(
         self, namespace: Optional[str] = None, _conn=None
     ) -> bool:
         if namespace:
-            for key in self._cache.keys():
-                if key.startswith(namespace):
-                    self._delete_key(key)
+            await self._cache.delete_prefix(namespace)
         else:
-            self._cache.clear()
-            self._handlers = {}
+            await self._cache.clear()
         return True
 
+    async def _close(self, *args, _conn=None, **kwargs) -> None:
+        await _stop_sweeping(self._cache)
+
     async def _redlock_release(self, key: str, value: Any) -> int:
-        if self._cache.get(key) == value:
-            self._cache.pop(key)
-            return 1
-        return 0
-
-    def _delete_key(self, key: str) -> int:
-        if self._cache.pop(key, None):
-            handle = self._handlers.pop(key, None)
-            if handle:
-                handle.cancel()
-            return 1
-        return 0
-
-    def _loop(self) -> AbstractEventLoop:
-        return asyncio.get_event_loop()
+        current, version = await self._cache.get_with_version(key)
+        if current != value:
+            return 0
+        return int(await self._cache.cas_delete(key, version))
+
+    async def _delete_key(self, key: str) -> int:
+        return int(await self._cache.delete(key))
+
+    def _ttl(self, ttl: Optional[Number]) -> Optional[Number]:
+        if not ttl:
+            return None
+        _start_sweeping(self._cache)
+        return ttl
@@ -1,27 +1,68 @@
+import os
+import threading
 from time import time
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
 
-from ..dict import SharedMemoryDict
+from ..dict import NOT_GIVEN, SharedMemoryDict
+from ..sharded import ShardedSharedMemoryDict
 
-_caches: Dict[str, SharedMemoryDict] = {}
+CacheDict = Union[SharedMemoryDict, ShardedSharedMemoryDict]
+
+# The dicts attached by this process, by process id (children of a fork
+# attach their own), name and options
+_caches: Dict[Tuple, CacheDict] = {}
+_caches_lock = threading.Lock()
+
+
+def _attach(name: str, options: Dict[str, Any]) -> CacheDict:
+    key = (os.getpid(), name, tuple(sorted(options.items())))
+    cache = _caches.get(key)
+    if cache is not None:
+        return cache
+    with _caches_lock:
+        if key not in _caches:
+            kwargs = dict(options)
+            shards = kwargs.pop('shards')
+            _caches[key] = (
+                SharedMemoryDict(name, **kwargs)
+                if shards is None
+                else ShardedSharedMemoryDict(name, shards=shards, **kwargs)
+            )
+        return _caches[key]
 
 
 class SharedMemoryCache(BaseCache):
     """
     A Django Cache implementation of SharedMemoryDict
 
-    Values are stored as tuple with (`value`, `expiration time`)
+    Timeouts are stored by SharedMemoryDict with the values, so every
+    process sees a key expire at the same time. Backends of the same
+    location and options share the dict a process attached on first use.
     """
 
     def __init__(self, name: str, params: Dict) -> None:
         super().__init__(params=params)
         options = params.get('OPTIONS', {})
-        self._cache = _caches.get(
-            name,
-            SharedMemoryDict(name, options.get('MEMORY_BLOCK_SIZE', 1024)),
-        )
+        self._name = name
+        self._options = {
+            'size': options.get('MEMORY_BLOCK_SIZE', 1024),
+            'shards': options.get('SHARDS'),
+            'lock': options.get('USE_LOCK'),
+            'max_size': options.get('MAX_MEMORY_BLOCK_SIZE'),
+            'eviction': options.get('EVICTION'),
+            'compression': options.get('COMPRESSION'),
+            'compress_threshold': options.get('COMPRESS_THRESHOLD'),
+            'prefix_index': options.get('PREFIX_INDEX', False),
+        }
+        self._attached: Optional[CacheDict] = None
+
+    @property
+    def _cache(self) -> CacheDict:
+        if self._attached is None:
+            self._attached = _attach(self._name, self._options)
+        return self._attached
 
     def add(
         self,
@@ -31,7 +72,7 @@ class SharedMemoryCache(BaseCache):
         version: Optional[int] = None,
     ):
         key = self.make_key(key, version=version)
-        if self._get(key) is None:
+        if key not in self._cache:
             self._set(key, value, timeout)
             return True
         return False
@@ -43,12 +84,7 @@ class SharedMemoryCache(BaseCache):
         version: Optional[int] = None,
     ):
         key = self.make_key(key, version=version)
-
-        data = self._get(key)
-        if data is None:
-            return default
-
-        return data[0]
+        return self._cache.get(key, default)
 
     def set(
         self,
@@ -60,24 +96,82 @@ class SharedMemoryCache(BaseCache):
         key = self.make_key(key, version=version)
         self._set(key, value, timeout)
 
+    def get_many(self, keys: List[str], version: Optional[int] = None):
+        key_map = {self.make_key(key, version=version): key for key in keys}
+        values = self._cache.get_many(key_map)
+        return {key_map[key]: value for key, value in values.items()}
+
+    def set_many(
+        self,
+        data: Dict[str, Any],
+        timeout: Optional[int] = DEFAULT_TIMEOUT,
+        version: Optional[int] = None,
+    ):
+        self._cache.set_many(
+            {
+                self.make_key(key, version=version): value
+                for key, value in data.items()
+            },
+            self._ttl(timeout),
+        )
+        return []
+
+    def delete_many(self, keys: List[str], version: Optional[int] = None):
+        self._cache.delete_many(
+            self.make_key(key, version=version) for key in keys
+        )
+
+    def delete_prefix(self, prefix: str, version: Optional[int] = None):
+        """
+        Deletes the keys starting with prefix, of the given version (or the
+        current one), and returns how many existed
+        """
+        return self._cache.delete_prefix(
+            self.make_key(prefix, version=version)
+        )
+
     def incr(
         self, key: str, delta: Optional[int] = 1, version: Optional[int] = None
     ):
         key = self.make_key(key, version=version)
+        try:
+            return self._cache.incr(key, delta or 1)
+        except KeyError:
+            raise ValueError(f'Key "{key}" not found') from None
 
-        data = self._get(key)
-        if data is None:
-            raise ValueError(f'Key "{key}" not found')
-
-        value, exp = data
-        if not isinstance(value, int):
-            raise TypeError(f'Expected an integer value but has: {value}')
-
-        delta = delta or 1
-        new_value = value + delta
+    def get_or_set(
+        self,
+        key: str,
+        default: Any,
+        timeout: Optional[int] = DEFAULT_TIMEOUT,
+        version: Optional[int] = None,
+    ):
+        """
+        Returns the value of the key, setting it to default (or what it
+        returns when it's callable) when the key doesn't exist. The default
+        is computed without holding the lock, and the value another process
+        set meanwhile wins.
+        """
+        key = self.make_key(key, version=version)
+        value = self._cache.get(key, NOT_GIVEN)
+        if value is not NOT_GIVEN:
+            return value
+        if callable(default):
+            default = default()
+        return self._cache.setdefault(key, default, self._ttl(timeout))
+
+    def touch(
+        self,
+        key: str,
+        timeout: Optional[int] = DEFAULT_TIMEOUT,
+        version: Optional[int] = None,
+    ) -> bool:
+        key = self.make_key(key, version=version)
+        return self._cache.expire(key, self._ttl(timeout))
 
-        self._cache[key] = (new_value, exp)
-        return new_value
+    def has_key(self, key: str, version: Optional[int] = None) -> bool:
+        key = self.make_key(key, version=version)
+        return key in self._cache
 
     def delete(self, key: str, version: Optional[int] = None) -> None:
         key = self.make_key(key, version=version)
@@ -86,24 +180,16 @@ class SharedMemoryCache(BaseCache):
     def clear(self):
         self._cache.clear()
 
-    def _get(self, key: str) -> Optional[Tuple[Any, float]]:
-        """
-        This method will return a tuple with (value, expiration time)
-        or will return None if key has expired
-        """
-        data = self._cache.get(key, (None, -1.0))
-        if not isinstance(data, tuple) or len(data) != 2:
-            data = (None, -1.0)
-        value, exp = data
-        if exp is not None and exp <= time():
-            self._delete(key)
-            return None
-        return (value, exp)
-
     def _set(
         self, key: str, value: Any, timeout: Optional[int] = DEFAULT_TIMEOUT
     ):
-        self._cache[key] = (value, self.get_backend_timeout(timeout))
+        self._cache.set(key, value, self._ttl(timeout))
+
+    def _ttl(
+        self, timeout: Optional[int] = DEFAULT_TIMEOUT
+    ) -> Optional[float]:
+        expiration = self.get_backend_timeout(timeout)
+        return None if expiration is None else expiration - time()
 
     def _delete(self, key: str) -> None:
         try:
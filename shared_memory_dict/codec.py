@@ -0,0 +1,128 @@
+import lzma
+import struct
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .serializers import SharedMemoryDictSerializer
+
+# How a value is encoded, kept in a byte of its entry
+TAG_SERIALIZED = 0
+TAG_BYTES = 1
+TAG_STR = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+# The high bits of the tag tell how the bytes were compressed
+TAG_ZLIB = 0x10
+TAG_LZMA = 0x20
+COMPRESSION_MASK = 0xF0
+
+DEFAULT_COMPRESS_THRESHOLD = 1024
+
+INT64 = struct.Struct('<q')
+FLOAT64 = struct.Struct('<d')
+
+
+def pack_int(value: int) -> bytes:
+    try:
+        return INT64.pack(value)
+    except struct.error:
+        raise OverflowError('value would overflow a 64 bit integer') from None
+
+
+def encode(
+    value: Any, serializer: SharedMemoryDictSerializer
+) -> Tuple[bytes, int]:
+    """
+    Returns the bytes of the value and their tag
+
+    Values of exactly `bytes`, `str`, `int` (fitting 64 bits) or `float`
+    types are stored as they are, skipping the serializer, when it sets
+    `fast_path`. Anything else, subclasses included, goes through it.
+    """
+    if getattr(serializer, 'fast_path', False):
+        kind = type(value)
+        if kind is bytes:
+            return value, TAG_BYTES
+        if kind is str:
+            try:
+                return value.encode(), TAG_STR
+            except UnicodeEncodeError:
+                pass
+        elif kind is int:
+            try:
+                return pack_int(value), TAG_INT
+            except OverflowError:
+                pass
+        elif kind is float:
+            return FLOAT64.pack(value), TAG_FLOAT
+    return serializer.dumps(value), TAG_SERIALIZED
+
+
+def decode(
+    data: bytes, tag: int, serializer: SharedMemoryDictSerializer
+) -> Any:
+    if tag & COMPRESSION_MASK:
+        data = DECOMPRESSORS[tag & COMPRESSION_MASK](data)
+        tag &= ~COMPRESSION_MASK
+    if tag == TAG_INT:
+        return INT64.unpack_from(data)[0]
+    if tag == TAG_STR:
+        return str(data, 'utf-8')
+    if tag == TAG_BYTES:
+        return bytes(data)
+    if tag == TAG_FLOAT:
+        return FLOAT64.unpack_from(data)[0]
+    with memoryview(data) as view:
+        return serializer.loads(view)
+
+
+class Compressor:
+    """
+    Compresses the encoded values of at least `threshold` bytes, unless
+    they don't get smaller
+    """
+
+    def __init__(
+        self,
+        tag: int,
+        compress: Callable[[bytes], bytes],
+        threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+    ) -> None:
+        self.tag = tag
+        self.threshold = threshold
+        self._compress = compress
+
+    def compress(self, data: bytes, tag: int) -> Tuple[bytes, int]:
+        if len(data) < self.threshold:
+            return data, tag
+        compressed = self._compress(data)
+        if len(compressed) >= len(data):
+            return data, tag
+        return compressed, tag | self.tag
+
+
+COMPRESSIONS: Dict[str, Tuple[int, Callable[[bytes], bytes]]] = {
+    'zlib': (TAG_ZLIB, zlib.compress),
+    'lzma': (TAG_LZMA, lzma.compress),
+}
+DECOMPRESSORS: Dict[int, Callable[[bytes], bytes]] = {
+    TAG_ZLIB: zlib.decompress,
+    TAG_LZMA: lzma.decompress,
+}
+
+
+def create_compressor(
+    name: Optional[str], threshold: Optional[int] = None
+) -> Optional[Compressor]:
+    if name is None:
+        return None
+    try:
+        tag, compress = COMPRESSIONS[name]
+    except KeyError:
+        raise ValueError(
+            f'unknown compression {name!r}, '
+            f'expected one of {", ".join(COMPRESSIONS)}'
+        )
+    if threshold is None:
+        threshold = DEFAULT_COMPRESS_THRESHOLD
+    return Compressor(tag, compress, threshold)
@@ -1,34 +1,114 @@
 import logging
+import pickle
 import sys
+import threading
+import time
 import warnings
-from contextlib import contextmanager
+from collections import abc, namedtuple
+from contextlib import contextmanager, suppress
+from itertools import islice
 from multiprocessing.shared_memory import SharedMemory
 from typing import (
     Any,
+    Callable,
     Dict,
     Generator,
     ItemsView,
+    Iterable,
     Iterator,
     KeysView,
+    List,
+    Mapping,
     Optional,
+    Tuple,
     ValuesView,
 )
 
-from .lock import lock
+from .codec import TAG_INT, create_compressor, decode, encode, pack_int
+from .eviction import EvictionPolicy, create_policy
+from .lock import create_lock, lock
+from .ring import ChangeRing, Watcher
 from .serializers import (
     NULL_BYTE,
     PickleSerializer,
     SharedMemoryDictSerializer,
 )
-from .templates import MEMORY_NAME
+from .snapshot import read_snapshot, write_snapshot
+from .storage import HashTable, StorageFullError
+from .templates import DATA_MEMORY_NAME, MEMORY_NAME
 
 NOT_GIVEN = object()
 DEFAULT_SERIALIZER = PickleSerializer()
 
+READ_RETRIES = 64
+# Entries checked for expiry on every write
+SWEEP_STEP = 8
+# Entries checked for expiry when a write finds the memory block full
+FULL_SWEEP_STEP = 256
+# Entries read at once by scans and iterations
+SCAN_BATCH = 64
+# Heap blocks compacted on every write while too much of the heap is free
+COMPACT_STEP = 4
+MAX_FRAGMENTATION = 0.25
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'currsize'])
+
+# A null byte followed by the pickle PROTO opcode is never valid UTF-8,
+# so pickled keys can't clash with encoded strings
+PICKLED_KEY_PREFIX = NULL_BYTE + pickle.PROTO
+
 
 logger = logging.getLogger(__name__)
 
 
+def _encode_key(key: Any) -> bytes:
+    if isinstance(key, str):
+        return key.encode()
+    return NULL_BYTE + pickle.dumps(key, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode_key(data: bytes) -> Any:
+    with memoryview(data) as view:
+        if view[:2] == PICKLED_KEY_PREFIX:
+            return pickle.loads(view[1:])
+        return str(view, 'utf-8')
+
+
+def _expires(ttl: Optional[float]) -> float:
+    if ttl is None:
+        return 0
+    return time.time() + ttl
+
+
+def _time_left(key: Any, expires: float) -> Optional[float]:
+    if expires < 0:
+        raise KeyError(key)
+    if not expires:
+        return None
+    return max(expires - time.time(), 0.0)
+
+
+def _soonest(expires: float, other: float) -> float:
+    if expires and other:
+        return min(expires, other)
+    return expires or other
+
+
+class _ValuesView(abc.ValuesView):
+    _mapping: 'SharedMemoryDict'
+
+    def __iter__(self) -> Iterator:
+        for _, value in self._mapping._scan(b'', SCAN_BATCH, True):
+            yield value
+
+
+class _ItemsView(abc.ItemsView):
+    _mapping: 'SharedMemoryDict'
+
+    def __iter__(self) -> Iterator:
+        return self._mapping._scan(b'', SCAN_BATCH, True)
+
+
 class SharedMemoryDict:
     def __init__(
         self,
@@ -36,25 +116,61 @@ class SharedMemoryDict:
         size: int,
         *,
         serializer: SharedMemoryDictSerializer = DEFAULT_SERIALIZER,
+        cache: bool = False,
+        lock: Optional[bool] = None,
+        max_size: Optional[int] = None,
+        eviction: Optional[str] = None,
+        compression: Optional[str] = None,
+        compress_threshold: Optional[int] = None,
+        prefix_index: bool = False,
     ) -> None:
         super().__init__()
+        self._name = name
+        self._prefix_index = prefix_index
+        self._max_size = max(size, max_size or 0)
+        self._eviction = create_policy(eviction)
+        self._compressor = create_compressor(compression, compress_threshold)
         self._serializer = serializer
+        self._cache_enabled = cache
+        self._cached: Dict[bytes, Tuple[Any, float]] = {}
+        self._cached_snapshot: Optional[Dict[Any, Any]] = None
+        self._cached_generation = -1
+        self._cached_expires = 0.0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._lock = create_lock(name, lock)
         self._memory_block = self._get_or_create_memory_block(
             MEMORY_NAME.format(name=name), size
         )
+        self._root = self._table = HashTable(self._memory_block.buf)
+        self._data_block: Optional[SharedMemory] = None
+        # The tables threads are reading from, and the segments replaced
+        # by bigger ones that are closed once no thread reads from them
+        self._readers: List[HashTable] = []
+        self._retired: List[Tuple[SharedMemory, HashTable]] = []
+        self._segment_lock = threading.Lock()
+        self._epoch = 0
+        self._ring: Optional[ChangeRing] = None
         self._ensure_memory_initialization()
 
+    @lock
     def _ensure_memory_initialization(self):
-        memory_is_empty = (
-            bytes(self._memory_block.buf).split(NULL_BYTE, 1)[0] == b''
-        )
-        if memory_is_empty:
-            self._save_memory({})
+        if not self._root.is_initialized():
+            self._root.initialize(self._prefix_index)
 
     def cleanup(self) -> None:
         if not hasattr(self, '_memory_block'):
             return
+        if self._data_block is not None:
+            self._retired.append((self._data_block, self._table))
+        for block, table in self._retired:
+            table.release()
+            block.close()
+        if self._ring is not None:
+            self._ring.close()
+        self._root.release()
         self._memory_block.close()
+        self._lock.close()
 
     def move_to_end(self, key: str, last: Optional[bool] = True) -> None:
         warnings.warn(
@@ -63,12 +179,17 @@ class SharedMemoryDict:
             DeprecationWarning,
             stacklevel=2,
         )
-        with self._modify_db() as db:
-            db[key] = db.pop(key)
+        encoded_key = _encode_key(key)
+        with self._modify_db() as table:
+            popped = table.pop(encoded_key)
+            if popped is None:
+                raise KeyError(key)
+            value, tag = popped
+            self._insert(encoded_key, value, tag=tag)
 
-    @lock
     def clear(self) -> None:
-        self._save_memory({})
+        with self._modify_db() as table:
+            table.clear()
 
     def popitem(self, last: Optional[bool] = None) -> Any:
         if last is not None:
@@ -78,41 +199,66 @@ class SharedMemoryDict:
                 DeprecationWarning,
                 stacklevel=2,
             )
-        with self._modify_db() as db:
-            return db.popitem()
+        with self._modify_db() as table:
+            key, value, tag = table.pop_last()
+        return _decode_key(key), self._loads(value, tag)
 
     @contextmanager
-    @lock
     def _modify_db(self) -> Generator:
-        db = self._read_memory()
-        yield db
-        self._save_memory(db)
+        with self._lock:
+            self._sync_segment()
+            self._recover_interrupted_write()
+            ring = self._attach_ring() if self._root.watched else None
+            if ring is not None and ring.watchers:
+                self._table.journal = []
+            self._table.begin_write()
+            try:
+                self._table.sweep(SWEEP_STEP)
+                if self._table.fragmentation > MAX_FRAGMENTATION:
+                    self._table.compact(COMPACT_STEP)
+                yield self._table
+            finally:
+                journal, self._table.journal = self._table.journal, None
+                self._table.end_write()
+                if ring is not None and journal:
+                    ring.publish(journal)
 
     def __getitem__(self, key: str) -> Any:
-        return self._read_memory()[key]
+        value = self._get(_encode_key(key))
+        if value is NOT_GIVEN:
+            raise KeyError(key)
+        return value
 
     def __setitem__(self, key: str, value: Any) -> None:
-        with self._modify_db() as db:
-            db[key] = value
+        self.set(key, value)
 
     def __len__(self) -> int:
-        return len(self._read_memory())
+        table = self._pin()
+        try:
+            return len(table)
+        finally:
+            self._readers.remove(table)
 
     def __delitem__(self, key: str) -> None:
-        with self._modify_db() as db:
-            del db[key]
+        encoded_key = _encode_key(key)
+        with self._modify_db() as table:
+            if not table.delete(encoded_key):
+                raise KeyError(key)
 
     def __iter__(self) -> Iterator:
-        return iter(self._read_memory())
+        return self.scan()
 
     def __reversed__(self):
-        return reversed(self._read_memory())
+        return iter(self._read_db(self._decode_keys, True))
 
     def __del__(self) -> None:
         self.cleanup()
 
     def __contains__(self, key: str) -> bool:
-        return key in self._read_memory()
+        encoded_key = _encode_key(key)
+        if self._cache_enabled:
+            return self._get(encoded_key) is not NOT_GIVEN
+        return self._read_db(self._lookup, encoded_key) >= 0
 
     def __eq__(self, other: Any) -> bool:
         return self._read_memory() == other
@@ -129,9 +275,8 @@ class SharedMemoryDict:
             return other | self._read_memory()
 
         def __ior__(self, other: Any):
-            with self._modify_db() as db:
-                db |= other
-                return db
+            self.update(other)
+            return self
 
     def __str__(self) -> str:
         return str(self._read_memory())
@@ -140,30 +285,273 @@ class SharedMemoryDict:
         return repr(self._read_memory())
 
     def get(self, key: str, default: Optional[Any] = None) -> Any:
-        return self._read_memory().get(key, default)
+        value = self._get(_encode_key(key))
+        if value is NOT_GIVEN:
+            return default
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Sets the value of the key, which expires after `ttl` seconds when
+        it's given
+        """
+        self._write_data([(_encode_key(key), self._dumps(value))], ttl)
+
+    def expire(self, key: str, ttl: Optional[float]) -> bool:
+        """
+        Sets the time to live of the key (`None` makes it persistent) and
+        returns whether the key exists
+        """
+        encoded_key = _encode_key(key)
+        with self._modify_db() as table:
+            ix = table.lookup(encoded_key)
+            if ix < 0:
+                return False
+            table.set_expires(ix, _expires(ttl))
+            return True
+
+    def ttl(self, key: str) -> Optional[float]:
+        """
+        Returns the seconds left until the key expires, or `None` when it
+        never does
+        """
+        expires = self._read_db(self._load_expires, _encode_key(key))
+        return _time_left(key, expires)
+
+    def sweep(self, limit: Optional[int] = None) -> int:
+        """
+        Removes expired keys, checking at most `limit` keys (all of them by
+        default), and returns how many were removed. Writes already sweep
+        a few keys each, this reclaims the space of idle dicts.
+        """
+        with self._modify_db() as table:
+            return table.sweep(limit)
+
+    def snapshot(self, path: str) -> None:
+        """
+        Writes the memory block holding the data to path, as it is and with
+        a checksum. It's copied like any read, again when a write happened
+        meanwhile, so only with `lock=True` snapshots taken while other
+        processes keep writing are never torn. See `load_from`.
+        """
+        write_snapshot(self._read_db(self._copy_table), path)
+
+    def load_from(self, path: str) -> None:
+        """
+        Replaces the keys with the ones in the snapshot at path. The memory
+        block is copied at once when it has the size of the snapshot,
+        otherwise the keys that didn't expire are inserted one by one, so
+        the dict may grow or evict keys to fit them.
+        """
+        with read_snapshot(path) as data, self._modify_db() as table:
+            if len(data) == table.size:
+                table.load(data)
+                return
+            source = HashTable(data)
+            table.clear()
+            now = time.time()
+            for ix in source.entries():
+                expires = source.expires(ix)
+                if not expires or expires > now:
+                    self._insert(
+                        source.key(ix).tobytes(),
+                        source.value(ix).tobytes(),
+                        expires,
+                        source.tag(ix),
+                    )
+            source.release()
 
     def keys(self) -> KeysView[Any]:
-        return self._read_memory().keys()
+        return abc.KeysView(self)
 
     def values(self) -> ValuesView[Any]:
-        return self._read_memory().values()
+        return _ValuesView(self)
 
     def items(self) -> ItemsView:
-        return self._read_memory().items()
+        return _ItemsView(self)
+
+    def scan(
+        self, prefix: Optional[str] = None, batch: int = SCAN_BATCH
+    ) -> Iterator[Any]:
+        """
+        Yields the keys (the ones starting with `prefix` when it's given),
+        reading `batch` keys at a time without decoding any value. Writes
+        may happen between batches: keys set meanwhile may or may not be
+        yielded, and keys set again may be yielded twice.
+        """
+        encoded_prefix = _encode_key(prefix) if prefix else b''
+        for key, _ in self._scan(encoded_prefix, batch, False):
+            yield key
+
+    def iter_prefix(self, prefix: str) -> Iterator[Tuple[Any, Any]]:
+        """
+        Yields the keys starting with prefix and their values, in key order
+        when the dict has a prefix index
+        """
+        items = self._read_db(self._load_prefixed, _encode_key(prefix))
+        return iter(items)
+
+    def delete_prefix(self, prefix: str) -> int:
+        """
+        Deletes the keys starting with prefix in a single write and returns
+        how many existed
+        """
+        with self._modify_db() as table:
+            return table.delete_prefix(_encode_key(prefix))
+
+    def watch(self, since: Optional[int] = None) -> Watcher:
+        """
+        Returns a Watcher consuming the log of the changes made after the
+        sequence number `since` (from now on by default). Its `wait` sleeps
+        until some process writes to the dict and returns the keys the
+        writes changed, `changes` returns each change. Writes only log
+        their changes while some watcher is open.
+        """
+        with self._lock:
+            ring = self._attach_ring()
+            self._root.watched = True
+            return Watcher(ring, self._lock, _decode_key, since)
 
     def pop(self, key: str, default: Optional[Any] = NOT_GIVEN):
-        with self._modify_db() as db:
-            if default is NOT_GIVEN:
-                return db.pop(key)
-            return db.pop(key, default)
+        with self._modify_db() as table:
+            popped = table.pop(_encode_key(key))
+        if popped is not None:
+            return self._loads(*popped)
+        if default is NOT_GIVEN:
+            raise KeyError(key)
+        return default
 
     def update(self, other=(), /, **kwds):
-        with self._modify_db() as db:
-            db.update(other, **kwds)
+        self.set_many(dict(other, **kwds))
+
+    def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        """
+        Returns the values of the keys that exist, all read at once
+        """
+        encoded_keys = {_encode_key(key): key for key in keys}
+        values = self._get_many(list(encoded_keys))
+        return {
+            key: values[encoded_key]
+            for encoded_key, key in encoded_keys.items()
+            if encoded_key in values
+        }
+
+    def set_many(
+        self, mapping: Mapping[Any, Any], ttl: Optional[float] = None
+    ) -> None:
+        """
+        Sets the values of all keys in a single write, or none of them
+        when they don't fit
+        """
+        self._write_data(
+            [
+                (_encode_key(key), self._dumps(value))
+                for key, value in mapping.items()
+            ],
+            ttl,
+        )
+
+    def delete_many(self, keys: Iterable[Any]) -> int:
+        """
+        Deletes the keys in a single write and returns how many existed
+        """
+        encoded_keys = [_encode_key(key) for key in keys]
+        with self._modify_db() as table:
+            return sum(table.delete(key) for key in encoded_keys)
+
+    def setdefault(
+        self,
+        key: str,
+        default: Optional[Any] = None,
+        ttl: Optional[float] = None,
+    ):
+        """
+        Returns the value of the key, setting it to default (expiring after
+        `ttl` seconds when it's given) when the key doesn't exist
+        """
+        encoded_key = _encode_key(key)
+        with self._modify_db() as table:
+            ix = table.lookup(encoded_key)
+            if ix < 0:
+                data, tag = self._dumps(default)
+                self._insert(encoded_key, data, _expires(ttl), tag)
+                return default
+            return self._loads(table.value(ix), table.tag(ix))
+
+    def incr(self, key: str, delta: int = 1, default: Any = NOT_GIVEN) -> int:
+        """
+        Adds delta to the integer value of the key and returns the result,
+        starting from `default` when the key doesn't exist
 
-    def setdefault(self, key: str, default: Optional[Any] = None):
-        with self._modify_db() as db:
-            return db.setdefault(key, default)
+        The value is stored as a 64 bit integer, so next increments update
+        it in place without serializing it.
+        """
+        encoded_key = _encode_key(key)
+        with self._modify_db() as table:
+            ix = table.lookup(encoded_key)
+            if ix >= 0 and table.tag(ix) == TAG_INT:
+                value = table.increment(ix, delta)
+                if self._eviction is not None:
+                    self._eviction.insert(table, encoded_key)
+                return value
+
+            if ix >= 0:
+                value = self._loads(table.value(ix), table.tag(ix))
+                expires = table.expires(ix)
+            elif default is not NOT_GIVEN:
+                value, expires = default, 0
+            else:
+                raise KeyError(key)
+            if not isinstance(value, int):
+                raise TypeError(f'Expected an integer value but has: {value}')
+
+            value += delta
+            self._insert(encoded_key, pack_int(value), expires, TAG_INT)
+            return value
+
+    def decr(self, key: str, delta: int = 1, default: Any = NOT_GIVEN) -> int:
+        return self.incr(key, -delta, default)
+
+    def get_with_version(
+        self, key: str, default: Optional[Any] = None
+    ) -> Tuple[Any, int]:
+        """
+        Returns the value of the key and its version, which changes every
+        time the value does, or default and version 0 when the key doesn't
+        exist. See `cas`.
+        """
+        found = self._read_versioned(_encode_key(key))
+        if found is None:
+            return default, 0
+        data, tag, version = found
+        return self._loads(data, tag), version
+
+    def cas(
+        self,
+        key: str,
+        version: int,
+        value: Any,
+        ttl: Optional[float] = None,
+    ) -> bool:
+        """
+        Sets the value of the key, in a single write, only when its version
+        is still `version` (0 when the key must not exist), and returns
+        whether it did
+        """
+        return self._cas_data(
+            _encode_key(key), version, self._dumps(value), ttl
+        )
+
+    def cas_delete(self, key: str, version: int) -> bool:
+        """
+        Deletes the key, in a single write, only when its version is still
+        `version`, and returns whether it did
+        """
+        encoded_key = _encode_key(key)
+        with self._modify_db() as table:
+            if not version or self._version(table, encoded_key) != version:
+                return False
+            return table.delete(encoded_key)
 
     def _get_or_create_memory_block(
         self, name: str, size: int
@@ -173,15 +561,503 @@ class SharedMemoryDict:
         except FileNotFoundError:
             return SharedMemory(name=name, create=True, size=size)
 
-    def _save_memory(self, db: Dict[str, Any]) -> None:
-        data = self._serializer.dumps(db)
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            self._cache_hits, self._cache_misses, len(self._cached)
+        )
+
+    @property
+    def generation(self) -> int:
+        table = self._pin()
+        try:
+            return table.generation
+        finally:
+            self._readers.remove(table)
+
+    def _insert(
+        self, key: bytes, data: bytes, expires: float = 0, tag: int = 0
+    ) -> None:
+        """
+        Inserts into the table. When it's full the expired entries out of
+        the next FULL_SWEEP_STEP are removed, then the table is moved to a
+        bigger segment while the dict may grow up to max_size, and then
+        entries are evicted if an eviction policy was chosen.
+        """
+        try:
+            self._table.insert(key, data, expires, tag)
+        except StorageFullError:
+            if self._table.sweep(FULL_SWEEP_STEP):
+                self._insert(key, data, expires, tag)
+                return
+            if self._table.size < self._max_size:
+                self._grow(key, data, expires, tag)
+            elif self._eviction is not None:
+                self._evict(self._eviction, key, data, expires, tag)
+            else:
+                raise
+        if self._eviction is not None:
+            self._eviction.insert(self._table, key)
+
+    def _evict(
+        self,
+        policy: EvictionPolicy,
+        key: bytes,
+        data: bytes,
+        expires: float,
+        tag: int,
+    ) -> None:
+        table = self._table
+        if len(key) + len(data) > table.capacity:
+            raise StorageFullError()
+        while True:
+            ix = policy.victim(table)
+            if ix < 0:
+                raise StorageFullError()
+            table.remove(ix)
+            try:
+                table.insert(key, data, expires, tag)
+                return
+            except StorageFullError:
+                continue
+
+    def _grow(self, key: bytes, data: bytes, expires: float, tag: int) -> None:
+        """
+        Copies the table into a new segment with (at least) twice its size
+        and points the first segment to it. Other processes move to the
+        new segment when they notice the epoch change.
+        """
+        old, epoch, size = self._table, self._epoch + 1, self._table.size
+        name = DATA_MEMORY_NAME.format(name=self._name, epoch=epoch)
+        while True:
+            size = min(size * 2, self._max_size)
+            with suppress(FileNotFoundError):
+                SharedMemory(name=name).unlink()
+            block = SharedMemory(name=name, create=True, size=size)
+            table = HashTable(block.buf)
+            table.initialize(old.prefix_index)
+            try:
+                old.copy_to(table)
+                table.journal = old.journal
+                table.insert(key, data, expires, tag)
+                break
+            except StorageFullError:
+                table.release()
+                block.close()
+                block.unlink()
+                if size >= self._max_size:
+                    raise
+
+        logger.info('Growing %s to %d bytes', self._name, size)
+        with self._segment_lock:
+            table.begin_write()
+            self._root.epoch = epoch
+            old.end_write()
+            if self._data_block is not None:
+                self._data_block.unlink()
+            self._switch_segment(block, table, epoch)
+
+    def _sync_segment(self) -> None:
+        if self._root.epoch == self._epoch:
+            return
+        with self._segment_lock:
+            epoch = self._root.epoch
+            while epoch != self._epoch:
+                try:
+                    block = SharedMemory(
+                        name=DATA_MEMORY_NAME.format(
+                            name=self._name, epoch=epoch
+                        )
+                    )
+                except FileNotFoundError:
+                    # it has just been replaced by a bigger one
+                    epoch = self._root.epoch
+                    continue
+                self._switch_segment(block, HashTable(block.buf), epoch)
+
+    def _switch_segment(
+        self, block: SharedMemory, table: HashTable, epoch: int
+    ) -> None:
+        """
+        Moves to the table of the segment `epoch`, then closes the replaced
+        segments no thread is reading from. The others are closed by a
+        later switch, or by `cleanup`.
+        """
+        if self._data_block is not None:
+            self._retired.append((self._data_block, self._table))
+        # the epoch goes last, threads seeing it already see the table
+        self._data_block, self._table, self._epoch = block, table, epoch
+        retired = []
+        for old_block, old_table in self._retired:
+            if old_table in self._readers:
+                retired.append((old_block, old_table))
+                continue
+            old_table.release()
+            try:
+                old_block.close()
+            except BufferError:
+                # a value read from it is still referenced
+                retired.append((old_block, old_table))
+        self._retired = retired
+
+    def _pin(self) -> HashTable:
+        """
+        Returns the current table, which isn't closed until it's removed
+        from `_readers` even if another thread moves to a bigger segment
+        meanwhile
+        """
+        while True:
+            self._sync_segment()
+            table = self._table
+            self._readers.append(table)
+            # tables are only closed after being replaced
+            if table is self._table:
+                return table
+            self._readers.remove(table)
+
+    @contextmanager
+    def _pinned(self) -> Generator[HashTable, None, None]:
+        table = self._pin()
         try:
-            self._memory_block.buf[: len(data)] = data
-        except ValueError as exc:
-            raise ValueError("exceeds available storage") from exc
+            yield table
+        finally:
+            self._readers.remove(table)
+
+    def _attach_ring(self) -> ChangeRing:
+        if self._ring is None:
+            self._ring = ChangeRing(self._name)
+        return self._ring
+
+    def _get(self, key: bytes) -> Any:
+        value = self._get_value(key)
+        if value is not NOT_GIVEN:
+            self._touch([key])
+        return value
+
+    def _get_value(self, key: bytes) -> Any:
+        if not self._cache_enabled:
+            return self._read_db(self._load_value, key)
+
+        self._sync_cache()
+        try:
+            value, _ = self._cached[key]
+        except KeyError:
+            self._cache_misses += 1
+            value, expires = self._read_db(self._load_entry, key)
+            if value is not NOT_GIVEN:
+                self._cached[key] = (value, expires)
+                self._cached_expires = _soonest(self._cached_expires, expires)
+        else:
+            self._cache_hits += 1
+        return value
+
+    def _get_many(self, keys: List[bytes]) -> Dict[bytes, Any]:
+        if not self._cache_enabled:
+            entries = self._read_db(self._load_entries, keys)
+            values = {key: value for key, (value, _) in entries.items()}
+        else:
+            self._sync_cache()
+            values, missing = {}, []
+            for key in keys:
+                if key in self._cached:
+                    values[key] = self._cached[key][0]
+                else:
+                    missing.append(key)
+            self._cache_hits += len(values)
+            self._cache_misses += len(missing)
+            entries = self._read_db(self._load_entries, missing)
+            for key, (value, expires) in entries.items():
+                values[key] = value
+                self._cached[key] = (value, expires)
+                self._cached_expires = _soonest(self._cached_expires, expires)
+
+        self._touch(values)
+        return values
+
+    def _touch(self, keys: Iterable[bytes]) -> None:
+        """
+        Tells the eviction policy the keys were read
+        """
+        if self._eviction is not None:
+            with self._pinned() as table:
+                for key in keys:
+                    self._eviction.touch(table, key)
+
+    def _write_data(
+        self,
+        pairs: List[Tuple[bytes, Tuple[bytes, int]]],
+        ttl: Optional[float],
+    ) -> None:
+        expires = _expires(ttl)
+        with self._modify_db() as table:
+            # a single failed insert leaves the table as it was, batches
+            # that may not fit as they are copy it to put it back
+            previous = None
+            if len(pairs) > 1 and not table.has_room(
+                len(key) + len(data) for key, (data, _) in pairs
+            ):
+                previous = bytes(table.buf)
+            try:
+                for key, (data, tag) in pairs:
+                    self._insert(key, data, expires, tag)
+            except StorageFullError:
+                if previous is not None:
+                    self._restore(previous)
+                raise
+
+    def _restore(self, data: bytes) -> None:
+        """
+        Puts back the table copied before a write that failed halfway, key
+        by key when the table moved to a bigger segment meanwhile
+        """
+        table = self._table
+        if len(data) == table.size:
+            table.load(memoryview(data))
+            return
+        source = HashTable(memoryview(data))
+        table.clear()
+        source.copy_to(table)
+        source.release()
+
+    def _load_data(self, keys: List[bytes]) -> Dict[bytes, Tuple[bytes, int]]:
+        table, data = self._table, {}
+        for key in keys:
+            ix = table.lookup(key)
+            if ix >= 0:
+                data[key] = (table.value(ix).tobytes(), table.tag(ix))
+        return data
+
+    def _read_versioned(self, key: bytes) -> Optional[Tuple[bytes, int, int]]:
+        """
+        Copies the encoded value of the key, its codec tag and its version
+        out of the memory block, when the key exists
+        """
+        found = self._read_db(self._load_versioned, key)
+        if found is not None:
+            self._touch([key])
+        return found
+
+    def _cas_data(
+        self,
+        key: bytes,
+        version: int,
+        value: Tuple[bytes, int],
+        ttl: Optional[float],
+    ) -> bool:
+        with self._modify_db() as table:
+            if self._version(table, key) != version:
+                return False
+            self._insert(key, value[0], _expires(ttl), value[1])
+            return True
+
+    def _load_versioned(self, key: bytes) -> Optional[Tuple[bytes, int, int]]:
+        table = self._table
+        ix = table.lookup(key)
+        if ix < 0:
+            return None
+        return table.value(ix).tobytes(), table.tag(ix), table.version(ix)
+
+    @staticmethod
+    def _version(table: HashTable, key: bytes) -> int:
+        ix = table.lookup(key)
+        return 0 if ix < 0 else table.version(ix)
+
+    def _load_value(self, key: bytes) -> Any:
+        table = self._table
+        ix = table.lookup(key)
+        if ix < 0:
+            return NOT_GIVEN
+        return self._loads(table.value(ix), table.tag(ix))
+
+    def _load_entry(self, key: bytes) -> Tuple[Any, float]:
+        table = self._table
+        ix = table.lookup(key)
+        if ix < 0:
+            return NOT_GIVEN, 0
+        return self._loads(table.value(ix), table.tag(ix)), table.expires(ix)
+
+    def _load_entries(
+        self, keys: List[bytes]
+    ) -> Dict[bytes, Tuple[Any, float]]:
+        entries = {}
+        for key in keys:
+            value, expires = self._load_entry(key)
+            if value is not NOT_GIVEN:
+                entries[key] = (value, expires)
+        return entries
+
+    def _load_prefixed(self, prefix: bytes) -> List[Tuple[Any, Any]]:
+        table = self._table
+        return [
+            (
+                _decode_key(table.key(ix)),
+                self._loads(table.value(ix), table.tag(ix)),
+            )
+            for ix in table.prefixed(prefix)
+        ]
+
+    def _copy_table(self) -> bytes:
+        return self._table.buf.tobytes()
+
+    def _lookup(self, key: bytes) -> int:
+        return self._table.lookup(key)
+
+    def _load_expires(self, key: bytes) -> float:
+        table = self._table
+        ix = table.lookup(key)
+        if ix < 0:
+            return -1
+        return table.expires(ix)
+
+    def _sync_cache(self) -> None:
+        """
+        Drops the decoded values when another write happened since they were
+        read, which costs a single integer compare on the read path, or when
+        one of them expired
+        """
+        generation = self.generation
+        if generation != self._cached_generation or (
+            0 < self._cached_expires <= time.time()
+        ):
+            self._cached = {}
+            self._cached_snapshot = None
+            self._cached_generation = generation
+            self._cached_expires = 0
 
     def _read_memory(self) -> Dict[str, Any]:
-        return self._serializer.loads(self._memory_block.buf.tobytes())
+        if not self._cache_enabled:
+            return self._read_db(self._snapshot)[0]
+
+        self._sync_cache()
+        if self._cached_snapshot is None:
+            self._cache_misses += 1
+            self._cached_snapshot, expires = self._read_db(self._snapshot)
+            self._cached_expires = _soonest(self._cached_expires, expires)
+        else:
+            self._cache_hits += 1
+        return self._cached_snapshot
+
+    def _snapshot(self) -> Tuple[Dict[str, Any], float]:
+        table, snapshot, expires = self._table, {}, 0.0
+        for ix in table.entries():
+            snapshot[_decode_key(table.key(ix))] = self._loads(
+                table.value(ix), table.tag(ix)
+            )
+            expires = _soonest(expires, table.expires(ix))
+        return snapshot, expires
+
+    def _scan(
+        self, prefix: bytes, batch: int, load_values: bool
+    ) -> Iterator[Tuple[Any, Any]]:
+        cursor, last = 0, None
+        while cursor is not None:
+            items, cursor, last = self._read_db(
+                self._scan_batch, prefix, batch, load_values, cursor, last
+            )
+            yield from items
+
+    def _scan_batch(
+        self,
+        prefix: bytes,
+        batch: int,
+        load_values: bool,
+        cursor: int,
+        last: Optional[bytes],
+    ) -> Tuple[List[Tuple[Any, Any]], Optional[int], Optional[bytes]]:
+        """
+        Reads the keys (and values) of the `batch` entries from `cursor` on,
+        and returns them with the cursor of the next batch, None when it's
+        the last one, and the last key read
+        """
+        table = self._table
+        if last is not None and not (
+            table.is_live(cursor - 1) and table.key(cursor - 1) == last
+        ):
+            # the entries were renumbered (by a resize or a grow) since the
+            # last batch, so it resumes after the last key read
+            ix = table.lookup(last)
+            if ix >= 0:
+                cursor = ix + 1
+        indexes = list(islice(table.entries(start=cursor), batch))
+        items = []
+        for ix in indexes:
+            key = table.key(ix)
+            if key[: len(prefix)] == prefix:
+                value = (
+                    self._loads(table.value(ix), table.tag(ix))
+                    if load_values
+                    else None
+                )
+                items.append((_decode_key(key), value))
+        if len(indexes) < batch:
+            return items, None, None
+        return items, indexes[-1] + 1, bytes(table.key(indexes[-1]))
+
+    def _decode_keys(self, reverse: bool = False) -> List[Any]:
+        return [_decode_key(key) for key in self._table.keys(reverse)]
+
+    def _read_db(self, read: Callable, *args: Any) -> Any:
+        """
+        Runs `read` without locking, seqlock style: it's retried when a
+        write started or finished meanwhile (errors of reading a half
+        written table included). Readers that keep colliding with writers
+        fall back to the lock.
+        """
+        for _ in range(READ_RETRIES):
+            done, result = self._try_read(read, *args)
+            if done:
+                return result
+            time.sleep(0)
+
+        with self._lock:
+            return self._read_locked(read, *args)
+
+    def _try_read(self, read: Callable, *args: Any) -> Tuple[bool, Any]:
+        """
+        Runs `read` once without locking, and returns whether no write
+        started or finished meanwhile and the table is still the current
+        one (tables released by a segment switch included), with its result
+        """
+        table = self._pin()
+        try:
+            sequence = table.sequence
+            if sequence & 1:
+                return False, None
+            try:
+                result = read(*args)
+            except Exception:
+                if table.sequence == sequence and table is self._table:
+                    raise
+            else:
+                if table.sequence == sequence and table is self._table:
+                    return True, result
+            return False, None
+        finally:
+            self._readers.remove(table)
+
+    def _read_locked(self, read: Callable, *args: Any) -> Any:
+        """
+        Runs `read` with the lock held
+        """
+        with self._pinned():
+            self._recover_interrupted_write()
+            return read(*args)
+
+    def _recover_interrupted_write(self) -> None:
+        if self._lock.exclusive and self._table.dirty:
+            logger.warning(
+                'Recovering %s from an interrupted write',
+                self._memory_block.name,
+            )
+            self._table.recover()
+
+    def _dumps(self, value: Any) -> Tuple[bytes, int]:
+        data, tag = encode(value, self._serializer)
+        if self._compressor is not None:
+            return self._compressor.compress(data, tag)
+        return data, tag
+
+    def _loads(self, data: bytes, tag: int) -> Any:
+        return decode(data, tag, self._serializer)
 
     @property
     def shm(self) -> SharedMemory:
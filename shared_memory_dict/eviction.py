@@ -0,0 +1,122 @@
+import random
+import time
+from typing import Optional
+from zlib import crc32
+
+from .storage import HashTable
+
+EVICTION_SAMPLES = 5
+
+
+class EvictionPolicy:
+    """
+    Chooses the entry to remove when the memory block is full
+
+    Policies keep their metadata in the access slots of the table, so every
+    process attached to the memory block takes part in the same decisions.
+    """
+
+    def touch(self, table: HashTable, key: bytes) -> None:
+        """
+        Records a read of the key
+        """
+        raise NotImplementedError
+
+    def insert(self, table: HashTable, key: bytes) -> None:
+        """
+        Records a write of the key
+        """
+        self.touch(table, key)
+
+    def victim(self, table: HashTable) -> int:
+        raise NotImplementedError
+
+
+class SampledPolicy(EvictionPolicy):
+    """
+    Evicts the entry with the lowest score out of a few random entries, the
+    way Redis approximates LRU and LFU without keeping a list of all keys
+    """
+
+    def victim(self, table: HashTable) -> int:
+        used = table.used
+        if not used:
+            return -1
+        candidates = []
+        for ix in random.sample(range(used), min(used, EVICTION_SAMPLES * 4)):
+            if table.is_live(ix):
+                candidates.append(ix)
+                if len(candidates) == EVICTION_SAMPLES:
+                    break
+        if not candidates:
+            return next(table.entries(), -1)
+        return min(candidates, key=lambda ix: table.access(table.hash(ix)))
+
+
+class LRUPolicy(SampledPolicy):
+    def touch(self, table: HashTable, key: bytes) -> None:
+        table.set_access(crc32(key), time.monotonic_ns())
+
+
+class LFUPolicy(SampledPolicy):
+    def touch(self, table: HashTable, key: bytes) -> None:
+        h = crc32(key)
+        table.set_access(h, table.access(h) + 1)
+
+    def victim(self, table: HashTable) -> int:
+        ix = super().victim(table)
+        # the next keys hashed to the slot of the evicted one don't inherit
+        # its whole count
+        if ix >= 0:
+            h = table.hash(ix)
+            table.set_access(h, table.access(h) >> 1)
+        return ix
+
+
+class ClockPolicy(EvictionPolicy):
+    """
+    Second chance: reads set a reference bit and the hand evicts the first
+    entry without it, clearing the bits it passes over. New entries aren't
+    referenced until they're read.
+    """
+
+    def touch(self, table: HashTable, key: bytes) -> None:
+        table.set_access(crc32(key), 1)
+
+    def insert(self, table: HashTable, key: bytes) -> None:
+        pass
+
+    def victim(self, table: HashTable) -> int:
+        used = table.used
+        if not used:
+            return -1
+        ix = table.hand
+        for _ in range(used * 2 + 1):
+            ix = ix % used
+            if table.is_live(ix):
+                h = table.hash(ix)
+                if not table.access(h):
+                    table.hand = ix + 1
+                    return ix
+                table.set_access(h, 0)
+            ix += 1
+        return next(table.entries(), -1)
+
+
+POLICIES = {
+    'lru': LRUPolicy,
+    'lfu': LFUPolicy,
+    'clock': ClockPolicy,
+}
+
+
+def create_policy(name: Optional[str]) -> Optional[EvictionPolicy]:
+    if name is None:
+        return None
+    try:
+        return POLICIES[name]()
+    except KeyError:
+        raise ValueError(
+            f'unknown eviction policy {name!r}, '
+            f'expected one of {", ".join(POLICIES)}'
+        )
@@ -1,12 +1,56 @@
+from contextlib import suppress
 from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
 
-from .templates import MEMORY_NAME
+from .dict import SharedMemoryDict
+from .lock import remove_lock
+from .sharded import shard_names
+from .snapshot import snapshot_size
+from .storage import HashTable
+from .templates import DATA_MEMORY_NAME, MEMORY_NAME, RING_MEMORY_NAME
 
 
-def create_shared_memory(name: str, size: int) -> None:
+def create_shared_memory(
+    name: str, size: int, warm_from: Optional[str] = None
+) -> None:
+    """
+    Creates the memory block of a SharedMemoryDict, filled with the keys of
+    the snapshot at `warm_from` when it's given. The memory block gets the
+    size of the snapshot when it's bigger, so it's copied at once.
+    """
+    if warm_from is not None:
+        size = max(size, snapshot_size(warm_from))
     SharedMemory(MEMORY_NAME.format(name=name), create=True, size=size)
+    if warm_from is not None:
+        smd = SharedMemoryDict(name, size)
+        try:
+            smd.load_from(warm_from)
+        finally:
+            smd.cleanup()
 
 
-def free_shared_memory(name: str) -> None:
+def free_shared_memory(name: str, shards: Optional[int] = None) -> None:
+    """
+    Frees the memory blocks of a SharedMemoryDict, or of every shard of a
+    ShardedSharedMemoryDict when `shards` is given
+    """
+    if shards is not None:
+        for shard_name in shard_names(name, shards):
+            free_shared_memory(shard_name)
+        return
+
     shared_memory = SharedMemory(MEMORY_NAME.format(name=name))
+    table = HashTable(shared_memory.buf)
+    epoch = table.epoch if table.is_initialized() else 0
+    watched = table.is_initialized() and table.watched
+    table.release()
     shared_memory.unlink()
+    if epoch:
+        with suppress(FileNotFoundError):
+            SharedMemory(
+                DATA_MEMORY_NAME.format(name=name, epoch=epoch)
+            ).unlink()
+    if watched:
+        with suppress(FileNotFoundError):
+            SharedMemory(RING_MEMORY_NAME.format(name=name)).unlink()
+    remove_lock(name)
@@ -1,28 +1,153 @@
 import os
+import tempfile
+import threading
+from contextlib import suppress
 from functools import wraps
+from typing import Optional
 
-if os.getenv('SHARED_MEMORY_USE_LOCK') == '1':
-    from multiprocessing import Lock
-else:
+from .templates import LOCK_NAME
 
-    class Lock:  # type: ignore
-        def acquire(self):
-            pass
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
 
-        def release(self):
-            pass
+USE_LOCK = os.getenv('SHARED_MEMORY_USE_LOCK') == '1'
+LOCK_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
 
 
-_lock = Lock()
+def lock_path(name: str) -> str:
+    return os.path.join(LOCK_DIR, LOCK_NAME.format(name=name))
+
+
+class NullLock:
+    exclusive = False
+
+    def acquire(self, blocking: bool = True) -> bool:
+        return True
+
+    def release(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'NullLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+
+class SegmentLock(NullLock):
+    """
+    A reentrant lock bound to a shared memory segment name
+
+    Processes are synchronized with `flock` on a lock file named after the
+    segment, so it works for any process attaching the segment (forked,
+    spawned or started independently) and the kernel releases it when the
+    holder dies. Threads of the same process are synchronized with a
+    `threading.RLock`.
+    """
+
+    exclusive = fcntl is not None
+
+    def __init__(self, name: str) -> None:
+        self._path = lock_path(name)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = -1
+        self._pid = -1
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if self._depth == 0 and fcntl is not None:
+            try:
+                locked = self._flock(blocking)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            if not locked:
+                self._thread_lock.release()
+                return False
+        self._depth += 1
+        return True
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    def close(self) -> None:
+        if self._fd >= 0 and self._pid == os.getpid():
+            os.close(self._fd)
+        self._fd = -1
+
+    def _flock(self, blocking: bool) -> bool:
+        flags = fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        while True:
+            try:
+                fcntl.flock(self._file(), flags)
+            except BlockingIOError:
+                return False
+            if self._is_current():
+                return True
+            # the lock file was removed (see `remove_lock`) while waiting
+            # for it, so the lock is taken again on the new one
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = -1
+            self._pid = -1
+
+    def _is_current(self) -> bool:
+        try:
+            return os.stat(self._path).st_ino == os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _file(self) -> int:
+        # A forked child shares the open file description of its parent,
+        # and so its flock, so each process opens the lock file again
+        pid = os.getpid()
+        if self._pid != pid:
+            if self._fd >= 0:
+                os.close(self._fd)
+            self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = pid
+        return self._fd
+
+
+def remove_lock(name: str) -> None:
+    """
+    Removes the lock file of a segment, holding the lock, so processes
+    waiting for it take it on a new file
+    """
+    lock = SegmentLock(name)
+    try:
+        with lock:
+            with suppress(FileNotFoundError):
+                os.unlink(lock_path(name))
+    finally:
+        lock.close()
+
+
+def create_lock(name: str, enabled: Optional[bool] = None) -> NullLock:
+    if enabled is None:
+        enabled = USE_LOCK
+    if enabled:
+        return SegmentLock(name)
+    return NullLock()
 
 
 def lock(func):
     @wraps(func)
-    def wrapper(*args, **kwargs):
-        _lock.acquire()
-        try:
-            return func(*args, **kwargs)
-        finally:
-            _lock.release()
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return func(self, *args, **kwargs)
 
     return wrapper
@@ -0,0 +1,339 @@
+import ctypes
+import platform
+import struct
+import sys
+import time
+from collections import namedtuple
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Iterator, List, Optional, Set, Tuple
+
+from .lock import NullLock
+from .storage import CHANGE_CLEAR
+from .templates import RING_MEMORY_NAME
+
+# Header: writes counter (the futex word), registered consumers, sequence
+# number of the latest record
+_RING_HEADER = struct.Struct('<IIQ')
+# Record: sequence number, change (CHANGE_* and the RECORD_* flags), key
+# length, followed by the key
+_RECORD = struct.Struct('<QBH')
+
+RECORDS = 256
+RECORD_SIZE = 128
+KEY_SIZE = RECORD_SIZE - _RECORD.size
+RING_SIZE = _RING_HEADER.size + RECORDS * RECORD_SIZE
+
+# The key didn't fit in the record
+RECORD_TRUNCATED = 0x80
+
+# Seconds between checks of the writes counter where there's no futex
+POLL_INTERVAL = 0.01
+
+FUTEX_WAIT = 0
+FUTEX_WAKE = 1
+_SYS_FUTEX = {
+    'x86_64': 202,
+    'aarch64': 98,
+    'i386': 240,
+    'i686': 240,
+    'armv7l': 240,
+}
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _load_syscall() -> Optional[Callable]:
+    if sys.platform != 'linux' or platform.machine() not in _SYS_FUTEX:
+        return None
+    try:
+        syscall = ctypes.CDLL(None, use_errno=True).syscall
+    except (OSError, AttributeError):  # pragma: no cover
+        return None
+    syscall.restype = ctypes.c_long
+    return syscall
+
+
+_syscall = _load_syscall()
+
+
+def futex_wait(
+    buf: memoryview, offset: int, value: int, timeout: Optional[float]
+) -> None:
+    """
+    Sleeps while the 32 bit word at offset of the shared buffer is value,
+    until woken or for at most timeout seconds (forever when it's None)
+    """
+    if _syscall is None:
+        time.sleep(
+            POLL_INTERVAL if timeout is None else min(timeout, POLL_INTERVAL)
+        )
+        return
+
+    timespec = None
+    if timeout is not None:
+        seconds = int(timeout)
+        timespec = _Timespec(seconds, int((timeout - seconds) * 1e9))
+    word = ctypes.c_uint32.from_buffer(buf, offset)
+    try:
+        _syscall(
+            _SYS_FUTEX[platform.machine()],
+            ctypes.byref(word),
+            FUTEX_WAIT,
+            ctypes.c_uint32(value),
+            None if timespec is None else ctypes.byref(timespec),
+            None,
+            0,
+        )
+    finally:
+        # the memory block can't be closed while the word is exported
+        del word
+
+
+def futex_wake(buf: memoryview, offset: int) -> None:
+    """
+    Wakes every process sleeping on the 32 bit word at offset
+    """
+    if _syscall is None:
+        return
+    word = ctypes.c_uint32.from_buffer(buf, offset)
+    try:
+        _syscall(
+            _SYS_FUTEX[platform.machine()],
+            ctypes.byref(word),
+            FUTEX_WAKE,
+            0x7FFFFFFF,
+            None,
+            None,
+            0,
+        )
+    finally:
+        del word
+
+
+# A set, delete or clear (CHANGE_*) and its key, None for clears and keys
+# longer than KEY_SIZE
+Change = namedtuple('Change', ['seq', 'change', 'key'])
+
+
+class ChangeRing:
+    """
+    An append-only log of the changes made by the writes of a
+    SharedMemoryDict, in a ring of RECORDS records in its own memory block,
+    named after the dict
+
+    While some consumer is registered, writers append a record for each
+    set, deleted or cleared key, numbered by a sequence that never
+    repeats, then bump a writes counter and wake the consumers. New
+    records overwrite the oldest ones: consumers sleep on the counter with
+    a futex on Linux (and poll it elsewhere), read the records after the
+    last sequence number they read, and find out they fell behind when
+    those records were overwritten.
+    """
+
+    def __init__(self, name: str) -> None:
+        memory_name = RING_MEMORY_NAME.format(name=name)
+        try:
+            self._memory_block = SharedMemory(
+                memory_name, create=True, size=RING_SIZE
+            )
+        except FileExistsError:
+            self._memory_block = SharedMemory(memory_name)
+        self._buf = self._memory_block.buf
+
+    @property
+    def writes(self) -> int:
+        return self._header()[0]
+
+    @property
+    def watchers(self) -> int:
+        return self._header()[1]
+
+    @property
+    def head(self) -> int:
+        """
+        The sequence number of the latest record, 0 before the first one
+        """
+        return self._header()[2]
+
+    def register(self, watchers: int = 1) -> None:
+        """
+        Adds to the number of consumers, with the lock of the dict held
+        """
+        writes, count, head = self._header()
+        _RING_HEADER.pack_into(
+            self._buf, 0, writes, max(count + watchers, 0), head
+        )
+
+    def publish(self, changes: List[Tuple[int, Optional[bytes]]]) -> None:
+        """
+        Appends the changes made by a write, with the lock of the dict held.
+        Only the latest RECORDS are kept when there are more.
+        """
+        writes, watchers, head = self._header()
+        if not watchers:
+            return
+        seq = head + max(len(changes) - RECORDS, 0)
+        for change, key in changes[-RECORDS:]:
+            seq += 1
+            offset = self._offset(seq)
+            if key is None:
+                key = b''
+            elif len(key) > KEY_SIZE:
+                change, key = change | RECORD_TRUNCATED, b''
+            # the sequence number goes first, readers of the record being
+            # overwritten compare it before and after reading the key
+            _RECORD.pack_into(self._buf, offset, seq, change, len(key))
+            start = offset + _RECORD.size
+            end = start + len(key)
+            self._buf[start:end] = key
+        _RING_HEADER.pack_into(
+            self._buf,
+            0,
+            (writes + 1) & 0xFFFFFFFF,
+            watchers,
+            head + len(changes),
+        )
+        futex_wake(self._buf, 0)
+
+    def read(
+        self, cursor: int
+    ) -> Tuple[Optional[List[Tuple[int, int, Optional[bytes]]]], int]:
+        """
+        Returns the (seq, change, key) records after the sequence number
+        cursor, without a key for clears and truncated keys, or None when
+        some were overwritten, and the cursor of the next read
+        """
+        head = self.head
+        if head - cursor > RECORDS or cursor > head:
+            return None, head
+        records: List[Tuple[int, int, Optional[bytes]]] = []
+        for seq in range(cursor + 1, head + 1):
+            offset = self._offset(seq)
+            written, change, key_len = _RECORD.unpack_from(self._buf, offset)
+            start = offset + _RECORD.size
+            end = start + key_len
+            key = bytes(self._buf[start:end])
+            if (
+                written != seq
+                or _RECORD.unpack_from(self._buf, offset)[0] != seq
+            ):
+                return None, self.head
+            if change & RECORD_TRUNCATED or change == CHANGE_CLEAR:
+                records.append((seq, change & ~RECORD_TRUNCATED, None))
+            else:
+                records.append((seq, change, key))
+        return records, head
+
+    def wait(self, writes: int, timeout: Optional[float] = None) -> None:
+        """
+        Sleeps until the writes counter is no longer `writes`, a spurious
+        wakeup or the timeout
+        """
+        futex_wait(self._buf, 0, writes, timeout)
+
+    def close(self) -> None:
+        self._buf = None  # type: ignore
+        self._memory_block.close()
+
+    def unlink(self) -> None:
+        self._memory_block.unlink()
+
+    def _offset(self, seq: int) -> int:
+        return _RING_HEADER.size + seq % RECORDS * RECORD_SIZE
+
+    def _header(self) -> Tuple[int, int, int]:
+        return _RING_HEADER.unpack_from(self._buf, 0)
+
+
+class Watcher:
+    """
+    Consumes the change log of a SharedMemoryDict, see
+    `SharedMemoryDict.watch`
+    """
+
+    def __init__(
+        self,
+        ring: ChangeRing,
+        lock: NullLock,
+        decode: Callable[[bytes], Any],
+        since: Optional[int] = None,
+    ) -> None:
+        self._ring = ring
+        self._lock = lock
+        self._decode = decode
+        with lock:
+            ring.register()
+            self._cursor = ring.head if since is None else since
+        self._closed = False
+
+    @property
+    def seq(self) -> int:
+        """
+        The sequence number of the latest change read
+        """
+        return self._cursor
+
+    def changes(self, timeout: Optional[float] = 0) -> Optional[List[Change]]:
+        """
+        Returns the changes made since the latest ones read, waiting at
+        most timeout seconds (forever when it's None) for some, or None
+        when some were lost because the watcher fell behind. Reading goes
+        on after the lost changes.
+        """
+        records = self._read(timeout)
+        if records is None:
+            return None
+        return [
+            Change(seq, change, None if key is None else self._decode(key))
+            for seq, change, key in records
+        ]
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Set[Any]]:
+        """
+        Waits for the next writes, for at most timeout seconds, and returns
+        the keys they changed, None when they're unknown, or an empty set
+        when there were none
+        """
+        records = self._read(timeout)
+        if records is None:
+            return None
+        keys = set()
+        for _, _, key in records:
+            if key is None:
+                return None
+            keys.add(self._decode(key))
+        return keys
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            with self._lock:
+                self._ring.register(-1)
+
+    def _read(
+        self, timeout: Optional[float]
+    ) -> Optional[List[Tuple[int, int, Optional[bytes]]]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            writes = self._ring.writes
+            records, self._cursor = self._ring.read(self._cursor)
+            if records is None or records:
+                return records
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return records
+            self._ring.wait(writes, remaining)
+
+    def __iter__(self) -> Iterator[Optional[Set[Any]]]:
+        while True:
+            yield self.wait()
+
+    def __enter__(self) -> 'Watcher':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
@@ -1,12 +1,18 @@
 import json
+import marshal
 import pickle
-from typing import Final, Protocol
+from typing import Any, Final, Protocol, Union
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
 
 NULL_BYTE: Final = b"\x00"
 
 
 class SerializationError(ValueError):
-    def __init__(self, data: dict) -> None:
+    def __init__(self, data: Any) -> None:
         super().__init__(f"Failed to serialize data: {data!r}")
 
 
@@ -16,37 +22,103 @@ class DeserializationError(ValueError):
 
 
 class SharedMemoryDictSerializer(Protocol):
-    def dumps(self, obj: dict) -> bytes:
+    def dumps(self, obj: Any) -> bytes:
         ...
 
-    def loads(self, data: bytes) -> dict:
+    def loads(self, data: Union[bytes, memoryview]) -> Any:
         ...
 
 
 class JSONSerializer:
-    def dumps(self, obj: dict) -> bytes:
+    fast_path = True
+
+    def dumps(self, obj: Any) -> bytes:
         try:
             return json.dumps(obj).encode() + NULL_BYTE
         except (ValueError, TypeError):
             raise SerializationError(obj)
 
-    def loads(self, data: bytes) -> dict:
-        data = data.split(NULL_BYTE, 1)[0]
-        try:
-            return json.loads(data)
-        except json.JSONDecodeError:
-            raise DeserializationError(data)
+    def loads(self, data: Union[bytes, memoryview]) -> Any:
+        with memoryview(data) as view:
+            size = len(view)
+            if view[-1:] == NULL_BYTE:
+                size -= 1
+            try:
+                return json.loads(str(view[:size], 'utf-8'))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                raise DeserializationError(view[:size].tobytes())
 
 
 class PickleSerializer:
-    def dumps(self, obj: dict) -> bytes:
+    fast_path = True
+
+    def dumps(self, obj: Any) -> bytes:
         try:
             return pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
         except pickle.PicklingError:
             raise SerializationError(obj)
 
-    def loads(self, data: bytes) -> dict:
+    def loads(self, data: Union[bytes, memoryview]) -> Any:
         try:
             return pickle.loads(data)
         except pickle.UnpicklingError:
-            raise DeserializationError(data)
+            raise DeserializationError(bytes(data))
+
+
+class MarshalSerializer:
+    """
+    Faster than pickle for builtin types, but the format may change
+    between Python versions, so every process must run the same one
+    """
+
+    fast_path = True
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return marshal.dumps(obj)
+        except ValueError:
+            raise SerializationError(obj)
+
+    def loads(self, data: Union[bytes, memoryview]) -> Any:
+        try:
+            return marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            raise DeserializationError(bytes(data))
+
+
+class MsgpackSerializer:
+    """
+    Requires the msgpack package (`pip install shared-memory-dict[msgpack]`)
+    """
+
+    fast_path = True
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise ImportError('MsgpackSerializer requires the msgpack package')
+
+    def dumps(self, obj: Any) -> bytes:
+        try:
+            return msgpack.packb(obj, use_bin_type=True)
+        except (TypeError, ValueError, OverflowError):
+            raise SerializationError(obj)
+
+    def loads(self, data: Union[bytes, memoryview]) -> Any:
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except ValueError:
+            raise DeserializationError(bytes(data))
+
+
+class BytesSerializer:
+    """
+    Stores bytes as they are, for dicts that only hold bytes values
+    """
+
+    def dumps(self, obj: Any) -> bytes:
+        if not isinstance(obj, (bytes, bytearray, memoryview)):
+            raise SerializationError(obj)
+        return bytes(obj)
+
+    def loads(self, data: Union[bytes, memoryview]) -> Any:
+        return bytes(data)
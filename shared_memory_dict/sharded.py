@@ -0,0 +1,384 @@
+import asyncio
+from collections import abc, defaultdict
+from itertools import chain
+from typing import (
+    Any,
+    Dict,
+    ItemsView,
+    Iterable,
+    Iterator,
+    KeysView,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+    ValuesView,
+)
+from zlib import crc32
+
+from .aio import AsyncSharedMemoryDict
+from .dict import NOT_GIVEN, SharedMemoryDict, _encode_key
+from .templates import SHARD_NAME
+
+T = TypeVar('T')
+
+
+def shard_names(name: str, shards: int) -> List[str]:
+    """
+    The names of the SharedMemoryDict holding the shards of a dict
+    """
+    return [SHARD_NAME.format(name=name, index=i) for i in range(shards)]
+
+
+def shard_index(key: Any, shards: int) -> int:
+    """
+    The shard of the key, the same in every process. It's taken from the
+    high bits of the crc32 of the key, since tables pick buckets from its
+    low bits.
+    """
+    return crc32(_encode_key(key)) * shards >> 32
+
+
+def _shard_sizes(
+    size: int, max_size: Optional[int], shards: int
+) -> Dict[str, Any]:
+    return {
+        'size': size // shards,
+        'max_size': None if max_size is None else max_size // shards,
+    }
+
+
+class _Shards:
+    """
+    Routes keys to the shards of a dict
+    """
+
+    _shards: List[Any]
+
+    @property
+    def shards(self) -> List[Any]:
+        return self._shards
+
+    def shard(self, key: Any) -> Any:
+        return self._shards[shard_index(key, len(self._shards))]
+
+    def _group(self, keys: Iterable[T]) -> Dict[int, List[T]]:
+        groups: Dict[int, List[T]] = defaultdict(list)
+        for key in keys:
+            groups[shard_index(key, len(self._shards))].append(key)
+        return groups
+
+    def _group_items(
+        self, mapping: Mapping[Any, Any]
+    ) -> Dict[int, Dict[Any, Any]]:
+        groups: Dict[int, Dict[Any, Any]] = defaultdict(dict)
+        for key, value in mapping.items():
+            groups[shard_index(key, len(self._shards))][key] = value
+        return groups
+
+
+class _ValuesView(abc.ValuesView):
+    _mapping: 'ShardedSharedMemoryDict'
+
+    def __iter__(self) -> Iterator:
+        for shard in self._mapping.shards:
+            yield from shard.values()
+
+
+class _ItemsView(abc.ItemsView):
+    _mapping: 'ShardedSharedMemoryDict'
+
+    def __iter__(self) -> Iterator:
+        for shard in self._mapping.shards:
+            yield from shard.items()
+
+
+class ShardedSharedMemoryDict(_Shards):
+    """
+    Spreads the keys across `shards` SharedMemoryDict, each with its own
+    memory blocks and lock, so processes writing to different shards don't
+    wait for each other
+
+    `size` and `max_size` are split evenly between the shards, other
+    arguments are passed to every SharedMemoryDict. Batches are split into
+    a single batch for each shard. Iterations go through one shard after
+    the other.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        size: int,
+        *,
+        shards: int,
+        max_size: Optional[int] = None,
+        **kwargs: Any,
+    ) -> None:
+        if shards < 1:
+            raise ValueError('shards must be at least 1')
+        self._name = name
+        self._shards = [
+            SharedMemoryDict(
+                shard_name, **_shard_sizes(size, max_size, shards), **kwargs
+            )
+            for shard_name in shard_names(name, shards)
+        ]
+
+    def cleanup(self) -> None:
+        for shard in self._shards:
+            shard.cleanup()
+
+    def clear(self) -> None:
+        for shard in self._shards:
+            shard.clear()
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.shard(key)[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.shard(key)[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        del self.shard(key)[key]
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.shard(key)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def __iter__(self) -> Iterator:
+        return self.scan()
+
+    def __eq__(self, other: Any) -> bool:
+        return dict(self.items()) == other
+
+    def __ne__(self, other: Any) -> bool:
+        return dict(self.items()) != other
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def get(self, key: Any, default: Optional[Any] = None) -> Any:
+        return self.shard(key).get(key, default)
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        self.shard(key).set(key, value, ttl)
+
+    def setdefault(
+        self,
+        key: Any,
+        default: Optional[Any] = None,
+        ttl: Optional[float] = None,
+    ) -> Any:
+        return self.shard(key).setdefault(key, default, ttl)
+
+    def pop(self, key: Any, default: Any = NOT_GIVEN) -> Any:
+        return self.shard(key).pop(key, default)
+
+    def expire(self, key: Any, ttl: Optional[float]) -> bool:
+        return self.shard(key).expire(key, ttl)
+
+    def ttl(self, key: Any) -> Optional[float]:
+        return self.shard(key).ttl(key)
+
+    def incr(self, key: Any, delta: int = 1, default: Any = NOT_GIVEN) -> int:
+        return self.shard(key).incr(key, delta, default)
+
+    def decr(self, key: Any, delta: int = 1, default: Any = NOT_GIVEN) -> int:
+        return self.incr(key, -delta, default)
+
+    def get_with_version(
+        self, key: Any, default: Optional[Any] = None
+    ) -> Tuple[Any, int]:
+        return self.shard(key).get_with_version(key, default)
+
+    def cas(
+        self, key: Any, version: int, value: Any, ttl: Optional[float] = None
+    ) -> bool:
+        return self.shard(key).cas(key, version, value, ttl)
+
+    def cas_delete(self, key: Any, version: int) -> bool:
+        return self.shard(key).cas_delete(key, version)
+
+    def sweep(self, limit: Optional[int] = None) -> int:
+        """
+        Removes expired keys, checking at most `limit` keys of each shard
+        """
+        return sum(shard.sweep(limit) for shard in self._shards)
+
+    def update(self, other=(), /, **kwds):
+        self.set_many(dict(other, **kwds))
+
+    def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        """
+        Returns the values of the keys that exist, read at once from each
+        shard
+        """
+        values: Dict[Any, Any] = {}
+        for index, group in self._group(keys).items():
+            values.update(self._shards[index].get_many(group))
+        return values
+
+    def set_many(
+        self, mapping: Mapping[Any, Any], ttl: Optional[float] = None
+    ) -> None:
+        """
+        Sets the values of all keys in a single write to each shard
+        """
+        for index, group in self._group_items(mapping).items():
+            self._shards[index].set_many(group, ttl)
+
+    def delete_many(self, keys: Iterable[Any]) -> int:
+        """
+        Deletes the keys in a single write to each shard and returns how
+        many existed
+        """
+        return sum(
+            self._shards[index].delete_many(group)
+            for index, group in self._group(keys).items()
+        )
+
+    def keys(self) -> KeysView[Any]:
+        return abc.KeysView(self)
+
+    def values(self) -> ValuesView[Any]:
+        return _ValuesView(self)
+
+    def items(self) -> ItemsView:
+        return _ItemsView(self)
+
+    def scan(self, prefix: Optional[str] = None, **kwargs: Any) -> Iterator:
+        return chain.from_iterable(
+            shard.scan(prefix, **kwargs) for shard in self._shards
+        )
+
+    def iter_prefix(self, prefix: str) -> Iterator[Tuple[Any, Any]]:
+        return chain.from_iterable(
+            shard.iter_prefix(prefix) for shard in self._shards
+        )
+
+    def delete_prefix(self, prefix: str) -> int:
+        return sum(shard.delete_prefix(prefix) for shard in self._shards)
+
+
+class AsyncShardedSharedMemoryDict(_Shards):
+    """
+    The asyncio API of ShardedSharedMemoryDict, spreading the keys across
+    `shards` AsyncSharedMemoryDict. Batches to different shards run
+    concurrently.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        size: int,
+        *,
+        shards: int,
+        max_size: Optional[int] = None,
+        **kwargs: Any,
+    ) -> None:
+        if shards < 1:
+            raise ValueError('shards must be at least 1')
+        self._shards = [
+            AsyncSharedMemoryDict(
+                shard_name, **_shard_sizes(size, max_size, shards), **kwargs
+            )
+            for shard_name in shard_names(name, shards)
+        ]
+
+    def cleanup(self) -> None:
+        for shard in self._shards:
+            shard.cleanup()
+
+    async def get(self, key: Any, default: Optional[Any] = None) -> Any:
+        return await self.shard(key).get(key, default)
+
+    async def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        values: Dict[Any, Any] = {}
+        for found in await asyncio.gather(
+            *(
+                self._shards[index].get_many(group)
+                for index, group in self._group(keys).items()
+            )
+        ):
+            values.update(found)
+        return values
+
+    async def exists(self, key: Any) -> bool:
+        return await self.shard(key).exists(key)
+
+    async def ttl(self, key: Any) -> Optional[float]:
+        return await self.shard(key).ttl(key)
+
+    async def set(
+        self, key: Any, value: Any, ttl: Optional[float] = None
+    ) -> None:
+        await self.shard(key).set(key, value, ttl)
+
+    async def set_many(
+        self, mapping: Mapping[Any, Any], ttl: Optional[float] = None
+    ) -> None:
+        await asyncio.gather(
+            *(
+                self._shards[index].set_many(group, ttl)
+                for index, group in self._group_items(mapping).items()
+            )
+        )
+
+    async def delete(self, key: Any) -> bool:
+        return await self.shard(key).delete(key)
+
+    async def delete_many(self, keys: Iterable[Any]) -> int:
+        deleted = await asyncio.gather(
+            *(
+                self._shards[index].delete_many(group)
+                for index, group in self._group(keys).items()
+            )
+        )
+        return sum(deleted)
+
+    async def delete_prefix(self, prefix: str) -> int:
+        deleted = await asyncio.gather(
+            *(shard.delete_prefix(prefix) for shard in self._shards)
+        )
+        return sum(deleted)
+
+    async def pop(self, key: Any, default: Any = NOT_GIVEN) -> Any:
+        return await self.shard(key).pop(key, default)
+
+    async def incr(
+        self, key: Any, delta: int = 1, default: Any = NOT_GIVEN
+    ) -> int:
+        return await self.shard(key).incr(key, delta, default)
+
+    async def decr(
+        self, key: Any, delta: int = 1, default: Any = NOT_GIVEN
+    ) -> int:
+        return await self.incr(key, -delta, default)
+
+    async def expire(self, key: Any, ttl: Optional[float]) -> bool:
+        return await self.shard(key).expire(key, ttl)
+
+    async def get_with_version(
+        self, key: Any, default: Optional[Any] = None
+    ) -> Tuple[Any, int]:
+        return await self.shard(key).get_with_version(key, default)
+
+    async def cas(
+        self, key: Any, version: int, value: Any, ttl: Optional[float] = None
+    ) -> bool:
+        return await self.shard(key).cas(key, version, value, ttl)
+
+    async def cas_delete(self, key: Any, version: int) -> bool:
+        return await self.shard(key).cas_delete(key, version)
+
+    async def sweep(self, limit: Optional[int] = None) -> int:
+        swept = await asyncio.gather(
+            *(shard.sweep(limit) for shard in self._shards)
+        )
+        return sum(swept)
+
+    async def clear(self) -> None:
+        await asyncio.gather(*(shard.clear() for shard in self._shards))
@@ -0,0 +1,73 @@
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+from zlib import crc32
+
+from .storage import HashTable
+
+SNAPSHOT_MAGIC = b'SMDS'
+SNAPSHOT_VERSION = 1
+
+# Header: magic, version, crc32 of the memory block, size of the memory
+# block, followed by the memory block
+_SNAPSHOT_HEADER = struct.Struct('<4sIIQ')
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def write_snapshot(data: bytes, path: str) -> None:
+    """
+    Writes a copy of the memory block of a table to path, replacing the
+    file at once
+    """
+    header = _SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, crc32(data), len(data)
+    )
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(header)
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def snapshot_size(path: str) -> int:
+    """
+    The size of the memory block in the snapshot at path
+    """
+    with open(path, 'rb') as file:
+        return _check_header(file.read(_SNAPSHOT_HEADER.size))[1]
+
+
+@contextmanager
+def read_snapshot(path: str) -> Iterator[memoryview]:
+    """
+    Maps the snapshot at path and yields the memory block in it, after
+    checking it's complete and intact
+    """
+    with open(path, 'rb') as file:
+        crc, size = _check_header(file.read(_SNAPSHOT_HEADER.size))
+        if os.fstat(file.fileno()).st_size != _SNAPSHOT_HEADER.size + size:
+            raise SnapshotError(f'{path} is truncated')
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            start = _SNAPSHOT_HEADER.size
+            with memoryview(mapped) as view, view[start:] as data:
+                if crc32(data) != crc:
+                    raise SnapshotError(f'{path} is corrupted')
+                if not HashTable(data).is_initialized():
+                    raise SnapshotError(f'{path} holds no table')
+                yield data
+
+
+def _check_header(header: bytes) -> Tuple[int, int]:
+    if len(header) < _SNAPSHOT_HEADER.size:
+        raise SnapshotError('not a snapshot')
+    magic, version, crc, size = _SNAPSHOT_HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError('not a snapshot')
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f'unsupported snapshot version {version}')
+    return crc, size
@@ -0,0 +1,1213 @@
+import os
+import struct
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+from zlib import crc32
+
+from .codec import INT64, pack_int
+
+MAGIC = b'SMD\x02'
+
+# Header: magic, buckets, live entries, used entries, heap top, heap low,
+# garbage
+_HEADER = struct.Struct('<4sIIIQQQ')
+_GENERATION = struct.Struct('<Q')
+_WRITER = struct.Struct('<Q')
+_SEQUENCE = struct.Struct('<Q')
+_EPOCH = struct.Struct('<Q')
+_ACCESS_SLOTS = struct.Struct('<Q')
+_HAND = struct.Struct('<Q')
+_SWEEP = struct.Struct('<Q')
+_ACCESS = struct.Struct('<Q')
+# Heads of the free lists, one for each size class
+_FREE_LISTS = struct.Struct('<15I')
+_FLAGS = struct.Struct('<I')
+# Heap block header: block size (and the PREV_FREE bit), index of the
+# entry it holds plus one (0 when the block is free)
+_BLOCK = struct.Struct('<II')
+# Free block: next and previous free block of its size class, and its size
+# again in its last bytes. Blocks are aligned to 8 bytes, so links keep
+# their offset divided by 8.
+_LINKS = struct.Struct('<II')
+_LINK = struct.Struct('<I')
+_FOOTER = struct.Struct('<I')
+# Entry: hash, block offset divided by 8 (so a table holds up to 32 GiB),
+# key length, value length, flags, codec tag, expiry time
+_ENTRY = struct.Struct('<IIIIBB2xd')
+# Entries are followed by their version, see `HashTable.version`
+_VERSION = struct.Struct('<I')
+_SLOT = struct.Struct('<i')
+
+GENERATION_OFFSET = _HEADER.size
+WRITER_OFFSET = GENERATION_OFFSET + _GENERATION.size
+SEQUENCE_OFFSET = WRITER_OFFSET + _WRITER.size
+EPOCH_OFFSET = SEQUENCE_OFFSET + _SEQUENCE.size
+ACCESS_SLOTS_OFFSET = EPOCH_OFFSET + _EPOCH.size
+HAND_OFFSET = ACCESS_SLOTS_OFFSET + _ACCESS_SLOTS.size
+SWEEP_OFFSET = HAND_OFFSET + _HAND.size
+FREE_LISTS_OFFSET = SWEEP_OFFSET + _SWEEP.size
+FLAGS_OFFSET = FREE_LISTS_OFFSET + _FREE_LISTS.size
+HEADER_SIZE = 160
+ENTRY_SIZE = _ENTRY.size + _VERSION.size
+SLOT_SIZE = _SLOT.size
+ACCESS_SIZE = _ACCESS.size
+BLOCK_HEADER_SIZE = _BLOCK.size
+MIN_BLOCK_SIZE = (BLOCK_HEADER_SIZE + _LINKS.size + _FOOTER.size + 7) & ~7
+# The block below is free
+PREV_FREE = 0x01
+SIZE_CLASSES = 15
+# Blocks moved by each compaction slice while making room for a write
+COMPACT_SLICE = 16
+# The whole heap is only repacked when one out of REPACK_RATIO bytes is free
+REPACK_RATIO = 8
+MIN_BUCKETS = 8
+# Deleted entries are dropped when an insert runs out of room and at least
+# one out of DELETED_RATIO entries is deleted
+DELETED_RATIO = 8
+MIN_ACCESS_SLOTS = 8
+# One access slot for each 128 to 256 bytes of memory
+ACCESS_SLOT_BYTES = 256
+FIBONACCI_MULTIPLIER = 0x9E3779B1
+MIN_SIZE = (
+    HEADER_SIZE
+    + MIN_BUCKETS * SLOT_SIZE
+    + ENTRY_SIZE
+    + MIN_ACCESS_SLOTS * ACCESS_SIZE
+)
+
+EMPTY = -1
+DUMMY = -2
+
+ENTRY_DELETED = 0x01
+
+# The table keeps its keys sorted, see `HashTable.prefixed`
+FLAG_PREFIX_INDEX = 0x01
+# Some process watches the table, see `shared_memory_dict.ring`
+FLAG_WATCHED = 0x02
+
+# The changes a write makes, see `HashTable.journal`
+CHANGE_SET = 1
+CHANGE_DELETE = 2
+CHANGE_CLEAR = 3
+
+
+class StorageFullError(ValueError):
+    def __init__(self) -> None:
+        super().__init__('exceeds available storage')
+
+
+def usable(buckets: int) -> int:
+    return (buckets << 1) // 3
+
+
+def block_size(nbytes: int) -> int:
+    """
+    The size of the heap block holding nbytes, aligned to 8 bytes
+    """
+    return max((nbytes + BLOCK_HEADER_SIZE + 7) & ~7, MIN_BLOCK_SIZE)
+
+
+def size_class(size: int) -> int:
+    """
+    The free list of blocks of the given size: blocks of 24 to 31 bytes,
+    32 to 63, 64 to 127 and so on, the last one holding the biggest blocks
+    """
+    return min(size.bit_length() - 5, SIZE_CLASSES - 1)
+
+
+def access_slots(size: int) -> int:
+    slots = MIN_ACCESS_SLOTS
+    while slots * ACCESS_SLOT_BYTES <= size:
+        slots <<= 1
+    return slots
+
+
+class HashTable:
+    """
+    An open addressing hash table laid out directly in a shared buffer
+
+    The layout mimics CPython's compact dict: a header, an index of
+    buckets pointing into an array of fixed size entries (kept in insertion
+    order) and a heap, growing downwards from the end of the buffer, with
+    the key and value bytes of each entry.
+
+    The heap is a slab allocator: every block starts with its size and
+    owner, so it can be walked, and freed blocks are merged with the free
+    blocks around them and go to free lists by size class (their heads are
+    in the header) to be reused. Compaction moves the lowest blocks into
+    free blocks above them, a few at a time, giving the space back to the
+    entries array.
+
+    Tables created with a prefix index keep, between the buckets and the
+    entries, the entry indexes sorted by key, so the keys sharing a prefix
+    are found with a binary search.
+
+    The end of the buffer holds the access slots, a fixed array of counters
+    indexed by key hash where eviction policies keep their metadata. As it
+    never moves, readers may update it without locking.
+    """
+
+    def __init__(self, buf: memoryview) -> None:
+        self._buf = buf
+        # When it's a list, the changes made by the write in progress are
+        # appended to it, as (CHANGE_*, key) pairs without a key for clears
+        self.journal: Optional[List[Tuple[int, Optional[bytes]]]] = None
+
+    def is_initialized(self) -> bool:
+        return self._buf[:4] == MAGIC
+
+    def initialize(self, prefix_index: bool = False) -> None:
+        size = len(self._buf)
+        min_size = MIN_SIZE
+        if prefix_index:
+            min_size += usable(MIN_BUCKETS) * SLOT_SIZE
+        if size < min_size:
+            raise ValueError(
+                f'memory block is too small, it must have at least '
+                f'{min_size} bytes'
+            )
+        slots = access_slots(size)
+        top = (size - slots * ACCESS_SIZE) & ~7
+        self._buf[top:size] = bytes(size - top)
+        self._write_header(MIN_BUCKETS, 0, 0, top, top, 0)
+        self._clear_index(MIN_BUCKETS)
+        _GENERATION.pack_into(self._buf, GENERATION_OFFSET, 0)
+        _WRITER.pack_into(self._buf, WRITER_OFFSET, 0)
+        _SEQUENCE.pack_into(self._buf, SEQUENCE_OFFSET, 0)
+        _EPOCH.pack_into(self._buf, EPOCH_OFFSET, 0)
+        _ACCESS_SLOTS.pack_into(self._buf, ACCESS_SLOTS_OFFSET, slots)
+        _HAND.pack_into(self._buf, HAND_OFFSET, 0)
+        _SWEEP.pack_into(self._buf, SWEEP_OFFSET, 0)
+        _FLAGS.pack_into(
+            self._buf, FLAGS_OFFSET, FLAG_PREFIX_INDEX if prefix_index else 0
+        )
+        self._clear_free_lists()
+
+    def release(self) -> None:
+        self._buf = None  # type: ignore
+
+    @property
+    def buf(self) -> memoryview:
+        """
+        The memory block holding the table
+        """
+        return self._buf
+
+    def load(self, data: memoryview) -> None:
+        """
+        Replaces the table with a copy of the table of the same size in
+        data, during a write. The write counters of the table and whether
+        it's watched are kept, and its generation doesn't go back.
+        """
+        header = bytearray(data[:HEADER_SIZE])
+        generation = _GENERATION.unpack_from(header, GENERATION_OFFSET)[0]
+        header[GENERATION_OFFSET:ACCESS_SLOTS_OFFSET] = self._buf[
+            GENERATION_OFFSET:ACCESS_SLOTS_OFFSET
+        ]
+        _GENERATION.pack_into(
+            header, GENERATION_OFFSET, max(generation, self.generation)
+        )
+        flags = _FLAGS.unpack_from(header, FLAGS_OFFSET)[0] & ~FLAG_WATCHED
+        _FLAGS.pack_into(
+            header, FLAGS_OFFSET, flags | self._flags() & FLAG_WATCHED
+        )
+        # readers check the header, it's replaced once the rest is copied
+        self._buf[HEADER_SIZE:] = data[HEADER_SIZE:]
+        self._buf[:HEADER_SIZE] = header
+        if self.journal is not None:
+            self.journal.append((CHANGE_CLEAR, None))
+
+    def __len__(self) -> int:
+        return self._header()[2]
+
+    @property
+    def size(self) -> int:
+        return len(self._buf)
+
+    @property
+    def generation(self) -> int:
+        return _GENERATION.unpack_from(self._buf, GENERATION_OFFSET)[0]
+
+    @property
+    def epoch(self) -> int:
+        """
+        The number of the segment holding the data of a grown table, only
+        meaningful in the first segment
+        """
+        return _EPOCH.unpack_from(self._buf, EPOCH_OFFSET)[0]
+
+    @epoch.setter
+    def epoch(self, epoch: int) -> None:
+        _EPOCH.pack_into(self._buf, EPOCH_OFFSET, epoch)
+
+    @property
+    def prefix_index(self) -> bool:
+        return bool(self._flags() & FLAG_PREFIX_INDEX)
+
+    @property
+    def watched(self) -> bool:
+        return bool(self._flags() & FLAG_WATCHED)
+
+    @watched.setter
+    def watched(self, watched: bool) -> None:
+        flags = self._flags() & ~FLAG_WATCHED
+        if watched:
+            flags |= FLAG_WATCHED
+        _FLAGS.pack_into(self._buf, FLAGS_OFFSET, flags)
+
+    @property
+    def capacity(self) -> int:
+        """
+        The size of the biggest key and value that fit in the empty table
+        """
+        top = self._header()[4]
+        free = top - self._entries_start(MIN_BUCKETS) - ENTRY_SIZE
+        return (free & ~7) - BLOCK_HEADER_SIZE
+
+    @property
+    def fragmentation(self) -> float:
+        """
+        The share of the heap in free blocks
+        """
+        _, _, _, _, top, heap_low, garbage = self._header()
+        if top == heap_low:
+            return 0.0
+        return garbage / (top - heap_low)
+
+    def has_room(self, sizes: Iterable[int]) -> bool:
+        """
+        Whether new entries holding keys and values of the given sizes fit
+        between the entries array and the heap, so inserting them never
+        moves the heap or the buckets
+        """
+        _, buckets, _, used, _, heap_low, _ = self._header()
+        count, nbytes = 0, 0
+        for size in sizes:
+            count += 1
+            nbytes += block_size(size)
+        end = self._entries_start(buckets) + (used + count) * ENTRY_SIZE
+        return used + count <= usable(buckets) and end + nbytes <= heap_low
+
+    @property
+    def hand(self) -> int:
+        """
+        The entry index where the CLOCK eviction policy resumes
+        """
+        return _HAND.unpack_from(self._buf, HAND_OFFSET)[0]
+
+    @hand.setter
+    def hand(self, ix: int) -> None:
+        _HAND.pack_into(self._buf, HAND_OFFSET, ix)
+
+    def access(self, h: int) -> int:
+        return _ACCESS.unpack_from(self._buf, self._access_offset(h))[0]
+
+    def set_access(self, h: int, value: int) -> None:
+        _ACCESS.pack_into(self._buf, self._access_offset(h), value)
+
+    @property
+    def dirty(self) -> bool:
+        """
+        Whether a writer started a change and didn't finish it
+        """
+        return _WRITER.unpack_from(self._buf, WRITER_OFFSET)[0] != 0
+
+    @property
+    def sequence(self) -> int:
+        """
+        A seqlock counter, odd while a write is in progress
+        """
+        return _SEQUENCE.unpack_from(self._buf, SEQUENCE_OFFSET)[0]
+
+    def begin_write(self) -> None:
+        _WRITER.pack_into(self._buf, WRITER_OFFSET, os.getpid())
+        _SEQUENCE.pack_into(self._buf, SEQUENCE_OFFSET, self.sequence | 1)
+
+    def end_write(self) -> None:
+        _GENERATION.pack_into(
+            self._buf, GENERATION_OFFSET, self.generation + 1
+        )
+        _SEQUENCE.pack_into(
+            self._buf, SEQUENCE_OFFSET, (self.sequence | 1) + 1
+        )
+        _WRITER.pack_into(self._buf, WRITER_OFFSET, 0)
+
+    def recover(self) -> None:
+        """
+        Rebuilds the header and the index from the entries after a writer
+        died in the middle of a change, dropping entries that point outside
+        of the heap
+        """
+        _, buckets, _, used, size, heap_low, _ = self._header()
+        count = 0
+        for ix in range(min(used, usable(buckets))):
+            _, offset, key_len, value_len, flags, _, _ = self._entry(ix)
+            if flags & ENTRY_DELETED:
+                continue
+            if (
+                offset - BLOCK_HEADER_SIZE < heap_low
+                or offset + key_len + value_len > size
+            ):
+                self._mark_deleted(ix)
+                continue
+            count += 1
+
+        self._write_header(buckets, count, used, size, heap_low, 0)
+        # the free lists may be half updated, so the heap is rebuilt from
+        # the entries
+        self._repack()
+        self._rebuild(buckets)
+        self.end_write()
+
+    def lookup(self, key: bytes) -> int:
+        ix = self._probe(key, crc32(key))[1]
+        if ix >= 0 and self._is_expired(self._entry(ix)[6], time.time()):
+            return -1
+        return ix
+
+    def get(self, key: bytes) -> Optional[memoryview]:
+        ix = self.lookup(key)
+        if ix < 0:
+            return None
+        return self.value(ix)
+
+    def key(self, ix: int) -> memoryview:
+        _, offset, key_len, _, _, _, _ = self._entry(ix)
+        return self._view(offset, key_len)
+
+    def value(self, ix: int) -> memoryview:
+        _, offset, key_len, value_len, _, _, _ = self._entry(ix)
+        return self._view(offset + key_len, value_len)
+
+    def tag(self, ix: int) -> int:
+        """
+        How the value is encoded, see `shared_memory_dict.codec`
+        """
+        return self._entry(ix)[5]
+
+    def increment(self, ix: int, delta: int) -> int:
+        """
+        Adds delta to the value of the entry, a 64 bit integer, in place
+        """
+        _, offset, key_len, _, _, _, _ = self._entry(ix)
+        value = INT64.unpack_from(self._buf, offset + key_len)[0] + delta
+        self._write(offset + key_len, pack_int(value))
+        self._write_version(ix, self._next_version())
+        self._record(ix)
+        return value
+
+    def version(self, ix: int) -> int:
+        """
+        A number that changes whenever the value of the entry changes: the
+        generation the write that set it ended at (its low 32 bits), never 0
+        """
+        return _VERSION.unpack_from(
+            self._buf, self._entry_offset(ix) + _ENTRY.size
+        )[0]
+
+    def expires(self, ix: int) -> float:
+        """
+        The time (as returned by `time.time`) when the entry expires, or 0
+        when it never does
+        """
+        return self._entry(ix)[6]
+
+    def set_expires(self, ix: int, expires: float) -> None:
+        self._write_entry(ix, *self._entry(ix)[:6], expires)
+        self._record(ix)
+
+    def hash(self, ix: int) -> int:
+        return self._entry(ix)[0]
+
+    def is_live(self, ix: int) -> bool:
+        return 0 <= ix < self._header()[3] and not (
+            self._entry(ix)[4] & ENTRY_DELETED
+        )
+
+    @property
+    def used(self) -> int:
+        """
+        The number of entries, deleted ones included
+        """
+        return self._header()[3]
+
+    def entries(self, reverse: bool = False, start: int = 0) -> Iterator[int]:
+        now = time.time()
+        for ix in self._entries(reverse, start):
+            if not self._is_expired(self._entry(ix)[6], now):
+                yield ix
+
+    def prefixed(self, prefix: bytes) -> Iterator[int]:
+        """
+        Yields the index of every entry whose key starts with prefix, in key
+        order, which takes a binary search with a prefix index and a scan
+        of every entry otherwise
+        """
+        now = time.time()
+        if not self.prefix_index:
+            indexes: Iterable[int] = (
+                ix
+                for ix in self._entries()
+                if self.key(ix)[: len(prefix)] == prefix
+            )
+        else:
+            indexes = self._sorted(*self._prefix_range(prefix))
+        for ix in indexes:
+            if not self._is_expired(self._entry(ix)[6], now):
+                yield ix
+
+    def keys(self, reverse: bool = False) -> Iterator[memoryview]:
+        for ix in self.entries(reverse):
+            yield self.key(ix)
+
+    def items(self) -> Iterator[Tuple[memoryview, memoryview]]:
+        for ix in self.entries():
+            yield self.key(ix), self.value(ix)
+
+    def insert(
+        self,
+        key: bytes,
+        value: bytes,
+        expires: float = 0,
+        tag: int = 0,
+        version: int = 0,
+    ) -> None:
+        """
+        Sets the value of the key, stamped with `version` (a new version by
+        default). When there's no room for it and enough of the entries
+        are deleted, they're dropped and the key is set again.
+        """
+        try:
+            self._put(key, value, expires, tag, version)
+        except StorageFullError:
+            _, buckets, count, used, _, _, _ = self._header()
+            if (used - count) * DELETED_RATIO < used:
+                raise
+            self._resize(buckets)
+            self._put(key, value, expires, tag, version)
+
+    def _put(
+        self, key: bytes, value: bytes, expires: float, tag: int, version: int
+    ) -> None:
+        h = crc32(key)
+        slot, ix = self._probe(key, h)
+        if ix >= 0:
+            self._replace(ix, value, expires, tag)
+            self._write_version(ix, version or self._next_version())
+            self._record(ix)
+            return
+
+        _, buckets, _, used, _, _, _ = self._header()
+        if used >= usable(buckets):
+            self._grow()
+            slot, _ = self._probe(key, h)
+            used = self._header()[3]
+
+        offset = self._alloc(len(key) + len(value), used, reserve=ENTRY_SIZE)
+        self._write(offset, key)
+        self._write(offset + len(key), value)
+
+        _, buckets, count, used, size, heap_low, garbage = self._header()
+        self._write_entry(
+            used, h, offset, len(key), len(value), 0, tag, expires
+        )
+        self._write_version(used, version or self._next_version())
+        self._write_slot(slot, used)
+        if self.prefix_index:
+            self._index_insert(key, used)
+        self._write_header(
+            buckets, count + 1, used + 1, size, heap_low, garbage
+        )
+        self._record(used)
+
+    def copy_to(self, other: 'HashTable') -> None:
+        """
+        Inserts every entry into other, in order, keeping the versions. The
+        generation of other becomes the highest of both.
+        """
+        generation = max(self.generation, other.generation)
+        for ix in self.entries():
+            _, _, _, _, _, tag, expires = self._entry(ix)
+            other.insert(
+                self.key(ix), self.value(ix), expires, tag, self.version(ix)
+            )
+        _GENERATION.pack_into(other._buf, GENERATION_OFFSET, generation)
+
+    def delete(self, key: bytes) -> bool:
+        slot, ix = self._probe(key, crc32(key))
+        if ix < 0:
+            return False
+        expires = self._entry(ix)[6]
+        self._delete(slot, ix)
+        return not self._is_expired(expires, time.time())
+
+    def pop(self, key: bytes) -> Optional[Tuple[bytes, int]]:
+        """
+        Removes the key and returns its value and codec tag
+        """
+        slot, ix = self._probe(key, crc32(key))
+        if ix < 0:
+            return None
+        _, _, _, _, _, tag, expires = self._entry(ix)
+        value = self.value(ix).tobytes()
+        self._delete(slot, ix)
+        if self._is_expired(expires, time.time()):
+            return None
+        return value, tag
+
+    def delete_prefix(self, prefix: bytes) -> int:
+        """
+        Deletes the keys starting with prefix and returns how many were not
+        expired. With a prefix index it takes time proportional to the
+        number of keys deleted.
+        """
+        if not self.prefix_index:
+            return sum(
+                self.delete(key.tobytes())
+                for key in [self.key(ix) for ix in self._entries()]
+                if key[: len(prefix)] == prefix
+            )
+
+        start, end = self._prefix_range(prefix)
+        indexes = list(self._sorted(start, end))
+        self._index_remove(start, end)
+        now, deleted = time.time(), 0
+        for ix in indexes:
+            _, _, _, _, _, _, expires = self._entry(ix)
+            slot, _ = self._probe(self.key(ix), self.hash(ix))
+            self._delete(slot, ix, unindex=False)
+            deleted += not self._is_expired(expires, now)
+        return deleted
+
+    def pop_last(self) -> Tuple[bytes, bytes, int]:
+        for ix in self.entries(reverse=True):
+            key, value = self.key(ix).tobytes(), self.value(ix).tobytes()
+            tag = self.tag(ix)
+            self.remove(ix)
+            return key, value, tag
+        raise KeyError('popitem(): dictionary is empty')
+
+    def remove(self, ix: int) -> None:
+        slot, _ = self._probe(self.key(ix), self.hash(ix))
+        self._delete(slot, ix)
+
+    def clear(self) -> None:
+        if self.journal is not None:
+            self.journal.append((CHANGE_CLEAR, None))
+        size = self._header()[4]
+        self._write_header(MIN_BUCKETS, 0, 0, size, size, 0)
+        self._clear_index(MIN_BUCKETS)
+        self._clear_free_lists()
+
+    def sweep(self, limit: Optional[int] = None) -> int:
+        """
+        Removes the expired entries out of the next `limit` entries (all of
+        them by default), resuming where the last sweep stopped. Returns
+        the number of removed entries.
+        """
+        _, buckets, _, used, _, _, _ = self._header()
+        if limit is None or limit > used:
+            limit = used
+        # removals leave the entries array where it is
+        start = self._entries_start(buckets)
+        ix = _SWEEP.unpack_from(self._buf, SWEEP_OFFSET)[0]
+        now, removed = time.time(), 0
+        for _ in range(limit):
+            ix = ix % used
+            entry = _ENTRY.unpack_from(self._buf, start + ix * ENTRY_SIZE)
+            flags, expires = entry[4], entry[6]
+            if not flags & ENTRY_DELETED and self._is_expired(expires, now):
+                self.remove(ix)
+                removed += 1
+            ix += 1
+        _SWEEP.pack_into(self._buf, SWEEP_OFFSET, ix)
+        return removed
+
+    def compact(self, limit: int) -> int:
+        """
+        Moves up to `limit` blocks from the bottom of the heap into free
+        blocks above them, dropping the free ones found there, so the free
+        space joins the room left for the entries array. Blocks that don't
+        fit any free block slide up into the next one instead. Returns the
+        number of blocks moved or dropped.
+        """
+        done = 0
+        while done < limit:
+            _, _, _, _, top, heap_low, garbage = self._header()
+            if heap_low >= top or not garbage:
+                break
+            size, owner = self._block(heap_low)
+            if not owner:
+                self._unlink(heap_low, size)
+                self._set_prev_free(heap_low + size, False)
+            else:
+                block = self._take_free(size, owner - 1)
+                if block < 0:
+                    slid = self._slide(limit - done)
+                    if not slid:
+                        break
+                    done += slid
+                    continue
+                self._write(
+                    block + BLOCK_HEADER_SIZE,
+                    self._read(
+                        heap_low + BLOCK_HEADER_SIZE, size - BLOCK_HEADER_SIZE
+                    ),
+                )
+                self._move_entry(owner - 1, block + BLOCK_HEADER_SIZE)
+            self._set_heap_low(heap_low + size)
+            done += 1
+        return done
+
+    def _probe(self, key: bytes, h: int) -> Tuple[int, int]:
+        """
+        Returns the bucket and the entry index of the key or, when the key
+        is not found, the bucket where it should be inserted and -1
+        """
+        buf = self._buf
+        buckets = self._header()[1]
+        mask = buckets - 1
+        entries_offset = self._entries_start(buckets)
+        i = h & mask
+        perturb = h
+        free = -1
+        for _ in range(buckets):
+            ix = _SLOT.unpack_from(buf, HEADER_SIZE + i * SLOT_SIZE)[0]
+            if ix == EMPTY:
+                return (i if free < 0 else free), -1
+            if ix == DUMMY:
+                if free < 0:
+                    free = i
+            else:
+                entry_h, offset, key_len, _, _, _, _ = _ENTRY.unpack_from(
+                    buf, entries_offset + ix * ENTRY_SIZE
+                )
+                if (
+                    entry_h == h
+                    and key_len == len(key)
+                    and self._view(offset << 3, key_len) == key
+                ):
+                    return i, ix
+            perturb >>= 5
+            i = (i * 5 + perturb + 1) & mask
+        return free, -1
+
+    def _replace(
+        self, ix: int, value: bytes, expires: float, tag: int
+    ) -> None:
+        h, offset, key_len, _, flags, _, _ = self._entry(ix)
+        block = offset - BLOCK_HEADER_SIZE
+        size = self._block(block)[0]
+        new_size = block_size(key_len + len(value))
+        if new_size <= size:
+            self._write(offset + key_len, value)
+            self._write_entry(
+                ix, h, offset, key_len, len(value), flags, tag, expires
+            )
+            if size - new_size >= MIN_BLOCK_SIZE:
+                self._write_block(
+                    block, new_size, ix + 1, self._prev_free(block)
+                )
+                self._write_block(block + new_size, size - new_size, 0)
+                self._release(block + new_size, size - new_size)
+            return
+
+        # the old block is released once the value is written, so a
+        # failed allocation leaves the entry as it was
+        new_offset = self._alloc(key_len + len(value), ix)
+        offset = self._entry(ix)[1]  # compaction may have moved it
+        self._write(new_offset, self._read(offset, key_len))
+        self._write(new_offset + key_len, value)
+        self._write_entry(
+            ix, h, new_offset, key_len, len(value), flags, tag, expires
+        )
+        block = offset - BLOCK_HEADER_SIZE
+        self._release(block, self._block(block)[0])
+
+    def _delete(self, slot: int, ix: int, unindex: bool = True) -> None:
+        self._record(ix, CHANGE_DELETE)
+        if unindex and self.prefix_index:
+            start = self._bisect(self.key(ix).tobytes())
+            self._index_remove(start, start + 1)
+        offset = self._entry(ix)[1]
+        self._mark_deleted(ix)
+        self._write_slot(slot, DUMMY)
+        _, buckets, count, used, size, heap_low, garbage = self._header()
+        self._write_header(buckets, count - 1, used, size, heap_low, garbage)
+        block = offset - BLOCK_HEADER_SIZE
+        self._release(block, self._block(block)[0])
+
+    def _alloc(self, nbytes: int, owner: int, reserve: int = 0) -> int:
+        """
+        Allocates a block for nbytes owned by the entry `owner`, from the
+        free lists or else from the bottom of the heap, leaving `reserve`
+        bytes after the entries array. Returns the offset of its data.
+        """
+        size = block_size(nbytes)
+        _, buckets, _, used, _, heap_low, garbage = self._header()
+        end = self._entries_start(buckets) + used * ENTRY_SIZE + reserve
+        if heap_low + garbage - size < end:
+            raise StorageFullError()
+        self._make_room(end)
+        block = self._take_free(size, owner)
+        if block < 0:
+            self._make_room(end + size)
+            block = self._header()[5] - size
+            self._set_heap_low(block)
+            self._write_block(block, size, owner + 1)
+        return block + BLOCK_HEADER_SIZE
+
+    def _make_room(self, end: int) -> None:
+        """
+        Compacts the heap, a slice at a time, until it starts at `end` or
+        above. When no free block fits the lowest one, or the free blocks
+        are too small because moved blocks kept the spare bytes of the free
+        blocks they took, the whole heap is repacked, as long as at least
+        one out of REPACK_RATIO bytes of the heap is free. StorageFullError
+        is raised otherwise, before anything but compaction is done.
+        """
+        while True:
+            _, _, _, _, top, heap_low, garbage = self._header()
+            if heap_low >= end:
+                return
+            if heap_low + garbage < end or not self.compact(COMPACT_SLICE):
+                if garbage * REPACK_RATIO < top - heap_low:
+                    raise StorageFullError()
+                self._repack()
+                if self._header()[5] < end:
+                    raise StorageFullError()
+                return
+
+    def _slide(self, limit: int) -> int:
+        """
+        Slides the blocks at the bottom of the heap up into the first free
+        block above them, when it's at most `limit` blocks away, and returns
+        the number of blocks moved
+        """
+        _, _, _, _, top, heap_low, _ = self._header()
+        owners: List[int] = []
+        end = heap_low
+        while len(owners) < limit and end < top:
+            size, owner = self._block(end)
+            if not owner:
+                self._unlink(end, size)
+                self._write(
+                    heap_low + size, self._read(heap_low, end - heap_low)
+                )
+                for ix in owners:
+                    self._move_entry(ix, self._entry(ix)[1] + size)
+                self._set_prev_free(end + size, False)
+                self._set_heap_low(heap_low + size)
+                return len(owners)
+            owners.append(owner - 1)
+            end += size
+        return 0
+
+    def _take_free(self, size: int, owner: int) -> int:
+        """
+        Takes a free block of at least `size` bytes for the entry `owner`
+        and returns its offset, or -1 when there's none. Only the head of
+        each list is checked, except for the biggest blocks. What's left of
+        a bigger block stays free.
+        """
+        buf = self._buf
+        first = size_class(size)
+        # the classes whose blocks are all big enough
+        fits = min((size - 1).bit_length() - 4, SIZE_CLASSES - 1)
+        for c in (first, *range(max(fits, first + 1), SIZE_CLASSES)):
+            block = self._free_list(c)
+            while block:
+                free_size = self._block(block)[0]
+                if free_size >= size:
+                    self._unlink(block, free_size)
+                    self._set_prev_free(block + free_size, False)
+                    rest = free_size - size
+                    if rest < MIN_BLOCK_SIZE:
+                        self._write_block(block, free_size, owner + 1)
+                        return block
+                    self._push(block, rest)
+                    self._write_block(block + rest, size, owner + 1, True)
+                    return block + rest
+                if c < SIZE_CLASSES - 1:
+                    break
+                block = (
+                    _LINK.unpack_from(buf, block + BLOCK_HEADER_SIZE)[0] << 3
+                )
+        return -1
+
+    def _release(self, block: int, size: int) -> None:
+        """
+        Frees the block, merged with the free blocks around it, or gives it
+        back to the room left for the entries array when it's the lowest
+        block
+        """
+        _, _, _, _, top, heap_low, _ = self._header()
+        end = block + size
+        if end < top:
+            next_size, owner = self._block(end)
+            if not owner:
+                self._unlink(end, next_size)
+                end += next_size
+        if block > heap_low and self._prev_free(block):
+            previous_size = _FOOTER.unpack_from(
+                self._buf, block - _FOOTER.size
+            )[0]
+            block -= previous_size
+            self._unlink(block, previous_size)
+
+        if block == heap_low:
+            self._set_prev_free(end, False)
+            self._set_heap_low(end)
+        else:
+            self._push(block, end - block)
+
+    def _push(self, block: int, size: int) -> None:
+        c = size_class(size)
+        head = self._free_list(c)
+        self._write_block(block, size, 0)
+        _LINKS.pack_into(self._buf, block + BLOCK_HEADER_SIZE, head >> 3, 0)
+        _FOOTER.pack_into(self._buf, block + size - _FOOTER.size, size)
+        if head:
+            _LINK.pack_into(
+                self._buf, head + BLOCK_HEADER_SIZE + _LINK.size, block >> 3
+            )
+        self._set_free_list(c, block)
+        self._set_prev_free(block + size, True)
+        self._add_garbage(size)
+
+    def _unlink(self, block: int, size: int) -> None:
+        following, previous = _LINKS.unpack_from(
+            self._buf, block + BLOCK_HEADER_SIZE
+        )
+        if previous:
+            _LINK.pack_into(
+                self._buf, (previous << 3) + BLOCK_HEADER_SIZE, following
+            )
+        else:
+            self._set_free_list(size_class(size), following << 3)
+        if following:
+            _LINK.pack_into(
+                self._buf,
+                (following << 3) + BLOCK_HEADER_SIZE + _LINK.size,
+                previous,
+            )
+        self._add_garbage(-size)
+
+    def _block(self, block: int) -> Tuple[int, int]:
+        """
+        The size and owner of the block
+        """
+        size, owner = _BLOCK.unpack_from(self._buf, block)
+        return size & ~PREV_FREE, owner
+
+    def _write_block(
+        self, block: int, size: int, owner: int, prev_free: bool = False
+    ) -> None:
+        if prev_free:
+            size |= PREV_FREE
+        _BLOCK.pack_into(self._buf, block, size, owner)
+
+    def _prev_free(self, block: int) -> bool:
+        return bool(_BLOCK.unpack_from(self._buf, block)[0] & PREV_FREE)
+
+    def _set_prev_free(self, block: int, prev_free: bool) -> None:
+        if block < self._header()[4]:
+            self._write_block(block, *self._block(block), prev_free)
+
+    def _set_heap_low(self, heap_low: int) -> None:
+        _, buckets, count, used, top, _, garbage = self._header()
+        self._write_header(buckets, count, used, top, heap_low, garbage)
+
+    def _move_entry(self, ix: int, offset: int) -> None:
+        h, _, key_len, value_len, flags, tag, expires = self._entry(ix)
+        self._write_entry(
+            ix, h, offset, key_len, value_len, flags, tag, expires
+        )
+
+    def _repack(self) -> None:
+        """
+        Slides every live block to the end of the heap, dropping the free
+        ones
+        """
+        blocks = []
+        for ix in self._entries():
+            _, offset, key_len, value_len, _, _, _ = self._entry(ix)
+            blocks.append((offset, key_len + value_len, ix))
+        blocks.sort(reverse=True)
+
+        _, buckets, count, used, top, _, _ = self._header()
+        heap_low = top
+        for offset, length, ix in blocks:
+            size = block_size(length)
+            heap_low -= size
+            if heap_low + BLOCK_HEADER_SIZE != offset:
+                self._write(
+                    heap_low + BLOCK_HEADER_SIZE, self._read(offset, length)
+                )
+                self._move_entry(ix, heap_low + BLOCK_HEADER_SIZE)
+            self._write_block(heap_low, size, ix + 1)
+        self._clear_free_lists()
+        self._write_header(buckets, count, used, top, heap_low, 0)
+
+    def _grow(self) -> None:
+        _, buckets, count, _, _, _, _ = self._header()
+        if (count + 1) * 3 // 2 > usable(buckets):
+            try:
+                self._resize(buckets * 2)
+                return
+            except ValueError:
+                if count >= usable(buckets):
+                    raise
+        self._resize(buckets)
+
+    def _resize(self, buckets: int) -> None:
+        """
+        Rebuilds the index with the given number of buckets, dropping the
+        deleted entries
+        """
+        count = self._header()[2]
+        entries_end = self._entries_start(buckets) + count * ENTRY_SIZE
+        self._make_room(entries_end + ENTRY_SIZE)
+        self._rebuild(buckets)
+
+    def _rebuild(self, buckets: int) -> None:
+        live = [self._entry(ix) for ix in self._entries()]
+        versions = [self.version(ix) for ix in self._entries()]
+        _, _, count, _, size, heap_low, garbage = self._header()
+        self._write_header(buckets, count, len(live), size, heap_low, garbage)
+        self._clear_index(buckets)
+        mask = buckets - 1
+        for ix, entry in enumerate(live):
+            self._write_entry(ix, *entry)
+            self._write_version(ix, versions[ix])
+            block = entry[1] - BLOCK_HEADER_SIZE
+            size = _BLOCK.unpack_from(self._buf, block)[0]
+            # the size keeps its PREV_FREE bit
+            _BLOCK.pack_into(self._buf, block, size, ix + 1)
+            h = perturb = entry[0]
+            i = h & mask
+            while self._slot(i) != EMPTY:
+                perturb >>= 5
+                i = (i * 5 + perturb + 1) & mask
+            self._write_slot(i, ix)
+        if self.prefix_index:
+            order = sorted(
+                range(len(live)),
+                key=lambda ix: self._read(live[ix][1], live[ix][2]),
+            )
+            self._write(
+                self._index_start(buckets),
+                struct.pack(f'<{len(order)}i', *order),
+            )
+
+    def _entries_start(self, buckets: int) -> int:
+        """
+        The offset of the entries array, after the buckets and the prefix
+        index, which has room for every entry the buckets may point to
+        """
+        start = self._index_start(buckets)
+        if self.prefix_index:
+            start += usable(buckets) * SLOT_SIZE
+        return start
+
+    @staticmethod
+    def _index_start(buckets: int) -> int:
+        return HEADER_SIZE + buckets * SLOT_SIZE
+
+    def _sorted(self, start: int, end: int) -> Tuple[int, ...]:
+        """
+        The entry indexes from position start to end of the prefix index
+        """
+        offset = self._index_start(self._header()[1]) + start * SLOT_SIZE
+        return struct.unpack_from(f'<{end - start}i', self._buf, offset)
+
+    def _bisect(self, key: bytes, prefix: bool = False) -> int:
+        """
+        The position of the first key of the prefix index not below key or,
+        with `prefix`, the first one above every key starting with it
+        """
+        _, buckets, count, _, _, _, _ = self._header()
+        offset = self._index_start(buckets)
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            ix = _SLOT.unpack_from(self._buf, offset + middle * SLOT_SIZE)[0]
+            other = self.key(ix)
+            if prefix:
+                other = other[: len(key)]
+            if other.tobytes() < key or prefix and other == key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _prefix_range(self, prefix: bytes) -> Tuple[int, int]:
+        return self._bisect(prefix), self._bisect(prefix, prefix=True)
+
+    def _index_insert(self, key: bytes, ix: int) -> None:
+        _, buckets, count, _, _, _, _ = self._header()
+        position = self._bisect(bytes(key))
+        offset = self._index_start(buckets) + position * SLOT_SIZE
+        end = self._index_start(buckets) + count * SLOT_SIZE
+        self._write(offset + SLOT_SIZE, self._buf[offset:end])
+        _SLOT.pack_into(self._buf, offset, ix)
+
+    def _index_remove(self, start: int, end: int) -> None:
+        """
+        Drops the positions from start to end of the prefix index, before
+        their entries are deleted
+        """
+        _, buckets, count, _, _, _, _ = self._header()
+        offset = self._index_start(buckets)
+        tail = offset + count * SLOT_SIZE
+        start, end = offset + start * SLOT_SIZE, offset + end * SLOT_SIZE
+        self._write(start, self._buf[end:tail])
+
+    def _record(self, ix: int, change: int = CHANGE_SET) -> None:
+        if self.journal is None:
+            return
+        entry = (change, self.key(ix).tobytes())
+        if not self.journal or self.journal[-1] != entry:
+            self.journal.append(entry)
+
+    def _access_offset(self, h: int) -> int:
+        slots = _ACCESS_SLOTS.unpack_from(self._buf, ACCESS_SLOTS_OFFSET)[0]
+        # crc32 of similar keys differ in few bits, so they're mixed with a
+        # Fibonacci hash and the top bits pick the slot
+        i = (h * FIBONACCI_MULTIPLIER & 0xFFFFFFFF) >> (
+            33 - slots.bit_length()
+        )
+        return self._header()[4] + i * ACCESS_SIZE
+
+    def _entries(self, reverse: bool = False, start: int = 0) -> Iterator[int]:
+        """
+        Yields the index of every entry that is not deleted, expired or not,
+        from `start` on (forwards only)
+        """
+        _, buckets, _, used, _, _, _ = self._header()
+        entries_offset = self._entries_start(buckets)
+        indexes = range(used - 1, -1, -1) if reverse else range(start, used)
+        for ix in indexes:
+            entry = _ENTRY.unpack_from(
+                self._buf, entries_offset + ix * ENTRY_SIZE
+            )
+            if not entry[4] & ENTRY_DELETED:
+                yield ix
+
+    @staticmethod
+    def _is_expired(expires: float, now: float) -> bool:
+        return 0 < expires <= now
+
+    def _add_garbage(self, nbytes: int) -> None:
+        _, buckets, count, used, size, heap_low, garbage = self._header()
+        self._write_header(
+            buckets, count, used, size, heap_low, garbage + nbytes
+        )
+
+    def _view(self, offset: int, length: int) -> memoryview:
+        end = offset + length
+        return self._buf[offset:end]
+
+    def _read(self, offset: int, length: int) -> bytes:
+        end = offset + length
+        return bytes(self._buf[offset:end])
+
+    def _write(self, offset: int, data: bytes) -> None:
+        end = offset + len(data)
+        self._buf[offset:end] = data
+
+    def _flags(self) -> int:
+        return _FLAGS.unpack_from(self._buf, FLAGS_OFFSET)[0]
+
+    def _header(self) -> Tuple[bytes, int, int, int, int, int, int]:
+        return _HEADER.unpack_from(self._buf, 0)
+
+    def _write_header(
+        self,
+        buckets: int,
+        count: int,
+        used: int,
+        size: int,
+        heap_low: int,
+        garbage: int,
+    ) -> None:
+        _HEADER.pack_into(
+            self._buf, 0, MAGIC, buckets, count, used, size, heap_low, garbage
+        )
+
+    def _clear_index(self, buckets: int) -> None:
+        end = HEADER_SIZE + buckets * SLOT_SIZE
+        self._buf[HEADER_SIZE:end] = b'\xff' * (end - HEADER_SIZE)
+
+    def _clear_free_lists(self) -> None:
+        _FREE_LISTS.pack_into(
+            self._buf, FREE_LISTS_OFFSET, *([0] * SIZE_CLASSES)
+        )
+
+    def _free_list(self, c: int) -> int:
+        offset = FREE_LISTS_OFFSET + c * _LINK.size
+        return _LINK.unpack_from(self._buf, offset)[0] << 3
+
+    def _set_free_list(self, c: int, block: int) -> None:
+        offset = FREE_LISTS_OFFSET + c * _LINK.size
+        _LINK.pack_into(self._buf, offset, block >> 3)
+
+    def _slot(self, i: int) -> int:
+        return _SLOT.unpack_from(self._buf, HEADER_SIZE + i * SLOT_SIZE)[0]
+
+    def _write_slot(self, i: int, ix: int) -> None:
+        _SLOT.pack_into(self._buf, HEADER_SIZE + i * SLOT_SIZE, ix)
+
+    def _entry_offset(self, ix: int) -> int:
+        return self._entries_start(self._header()[1]) + ix * ENTRY_SIZE
+
+    def _entry(self, ix: int) -> Tuple[int, int, int, int, int, int, float]:
+        entry = _ENTRY.unpack_from(self._buf, self._entry_offset(ix))
+        h, offset, key_len, value_len, flags, tag, expires = entry
+        return h, offset << 3, key_len, value_len, flags, tag, expires
+
+    def _write_entry(
+        self,
+        ix: int,
+        h: int,
+        offset: int,
+        key_len: int,
+        value_len: int,
+        flags: int,
+        tag: int,
+        expires: float,
+    ) -> None:
+        _ENTRY.pack_into(
+            self._buf,
+            self._entry_offset(ix),
+            h,
+            offset >> 3,
+            key_len,
+            value_len,
+            flags,
+            tag,
+            expires,
+        )
+
+    def _write_version(self, ix: int, version: int) -> None:
+        _VERSION.pack_into(
+            self._buf, self._entry_offset(ix) + _ENTRY.size, version
+        )
+
+    def _next_version(self) -> int:
+        # the generation the write in progress ends at, skipping 0 when it
+        # wraps around
+        return (self.generation + 1) & 0xFFFFFFFF or 1
+
+    def _mark_deleted(self, ix: int) -> None:
+        h, offset, key_len, value_len, flags, tag, expires = self._entry(ix)
+        self._write_entry(
+            ix,
+            h,
+            offset,
+            key_len,
+            value_len,
+            flags | ENTRY_DELETED,
+            tag,
+            expires,
+        )
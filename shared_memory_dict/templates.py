@@ -1 +1,7 @@
 MEMORY_NAME = 'sm_{name}'
+# Lock files live outside of the sm_ namespace of the memory blocks
+LOCK_NAME = 'smd_{name}.lock'
+DATA_MEMORY_NAME = 'sm_{name}.{epoch}'
+RING_MEMORY_NAME = 'sm_{name}.ring'
+# Name of the SharedMemoryDict holding a shard of a ShardedSharedMemoryDict
+SHARD_NAME = '{name}.shard{index}'
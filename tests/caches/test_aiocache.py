@@ -1,7 +1,33 @@
+import asyncio
+import multiprocessing
+import os
+from contextlib import suppress
+
 import pytest
+from aiocache.lock import OptimisticLock, OptimisticLockError, RedLock
+from aiocache.serializers import JsonSerializer, StringSerializer
 
-from shared_memory_dict import SharedMemoryDict
+from shared_memory_dict import (
+    AsyncShardedSharedMemoryDict,
+    AsyncSharedMemoryDict,
+)
+from shared_memory_dict.caches import aiocache
 from shared_memory_dict.caches.aiocache import SharedMemoryCache
+from shared_memory_dict.hooks import free_shared_memory
+
+
+def add_locks(name, count):
+    async def add():
+        cache = SharedMemoryCache(name=name, size=16384, lock=True)
+        added = []
+        for i in range(count):
+            with suppress(ValueError):
+                await cache.add(f'lock-{i}', os.getpid())
+                added.append(i)
+        await cache.close()
+        return added
+
+    return asyncio.run(add())
 
 
 @pytest.mark.asyncio
@@ -12,6 +38,7 @@ class TestAioCache:
         cache = SharedMemoryCache(name='ut', size=1024)
         yield cache
         await cache.clear()
+        await cache.close()
 
     @pytest.fixture
     def key(self):
@@ -22,7 +49,7 @@ class TestAioCache:
         return 'some-value'
 
     async def test_cache_instance_is_shared_memory_dict(self, backend):
-        assert isinstance(backend._cache, SharedMemoryDict) is True
+        assert isinstance(backend._cache, AsyncSharedMemoryDict) is True
 
     async def test_should_add_value(self, backend, key, value):
         assert await backend.add(key, value) is True
@@ -91,6 +118,21 @@ class TestAioCache:
         assert await backend.set(key, value, ttl=1) is True
         assert await backend.delete(key) == 1
 
+    @pytest.mark.parametrize(
+        'serializer', [StringSerializer(), JsonSerializer()]
+    )
+    async def test_should_increment_serialized_values(self, serializer):
+        backend = SharedMemoryCache(
+            name='ut', size=1024, serializer=serializer
+        )
+        await backend.set('key', 1, ttl=60)
+        assert await backend.increment('key', delta=2) == 3
+        assert await backend.increment('key') == 4
+        assert await backend._cache.ttl('key') > 0
+
+        await backend.clear()
+        await backend.close()
+
     async def test_should_raise_value_error_to_increment_on_a_non_number(
         self, backend, key
     ):
@@ -116,6 +158,66 @@ class TestAioCache:
         assert await backend.get('without-namespace') == 1
         assert await backend.get('with-namespace', namespace='ut') is None
 
+    async def test_should_clean_keys_of_a_namespace_with_prefix_index(self):
+        backend = SharedMemoryCache(name='ut-prefix', prefix_index=True)
+        await backend.set('key', 1, namespace='ut', ttl=60)
+        await backend.set('key', 1, namespace='other')
+        assert await backend.clear(namespace='ut') is True
+        assert await backend.get('key', namespace='ut') is None
+        assert await backend.get('key', namespace='other') == 1
+        await backend.close()
+        backend._cache.shm.unlink()
+
+    async def test_should_spread_keys_across_shards(self):
+        backend = SharedMemoryCache(name='ut-shards', size=4096, shards=2)
+        assert isinstance(backend._cache, AsyncShardedSharedMemoryDict)
+        await backend.multi_set([(f'key-{i}', i) for i in range(10)])
+        assert await backend.multi_get(['key-1', 'key-9']) == [1, 9]
+        assert await backend.increment('key-1') == 2
+        assert await backend.clear() is True
+        assert await backend.exists('key-1') is False
+        backend._cache.cleanup()
+        free_shared_memory('ut-shards', shards=2)
+
+    async def test_should_set_with_the_optimistic_lock(
+        self, backend, key, value
+    ):
+        await backend.set(key, value)
+        async with OptimisticLock(backend, key) as lock:
+            await lock.cas('changed')
+        assert await backend.get(key) == 'changed'
+
+        with pytest.raises(OptimisticLockError):
+            async with OptimisticLock(backend, key) as lock:
+                await backend.set(key, 'meanwhile')
+                await lock.cas('lost')
+        assert await backend.get(key) == 'meanwhile'
+
+    async def test_should_compare_values_given_as_cas_token(
+        self, backend, key, value
+    ):
+        await backend.set(key, value)
+        assert await backend.set(key, 'other', _cas_token='fake') is False
+        assert await backend.set(key, 'other', _cas_token=value) is True
+        assert await backend.get(key) == 'other'
+
+    async def test_should_add_a_key_only_once_across_processes(self):
+        try:
+            with multiprocessing.get_context('spawn').Pool(4) as pool:
+                results = pool.starmap(add_locks, [('ut-add', 200)] * 4)
+            added = [i for result in results for i in result]
+            assert sorted(added) == list(range(200))
+        finally:
+            free_shared_memory('ut-add')
+
+    async def test_should_release_only_its_own_redlock(self, backend, key):
+        async with RedLock(backend, key, lease=60):
+            lock_key = f'{key}-lock'
+            owner = await backend.get(lock_key)
+            assert await backend._redlock_release(lock_key, 'other') == 0
+            assert await backend.get(lock_key) == owner
+        assert await backend.exists(lock_key) is False
+
     async def test_should_check_if_a_invalid_key_is_expired(self, backend):
         assert await backend.expire('fake', ttl=1) is False
 
@@ -126,3 +228,30 @@ class TestAioCache:
     async def test_should_expire_a_key(self, backend, key, value):
         await backend.set(key, value, ttl=1)
         assert await backend.expire(key, ttl=2) is True
+
+    async def test_should_expire_keys_in_the_memory_block(
+        self, backend, key, value
+    ):
+        await backend.set(key, value, ttl=60)
+        assert 0 < await backend._cache.ttl(key) <= 60
+        await backend.multi_set([('other', value)], ttl=0.01)
+        await asyncio.sleep(0.02)
+        assert await backend.get('other') is None
+
+        other = SharedMemoryCache(name='ut', size=1024)
+        assert await other.expire(key, ttl=None) is True
+        assert await backend._cache.ttl(key) is None
+
+    async def test_should_sweep_expired_keys(self, monkeypatch, backend):
+        monkeypatch.setattr(aiocache, 'SWEEP_INTERVAL', 0.01)
+        monkeypatch.setattr(aiocache, '_sweeper', None)
+        await backend.multi_set([('a', 1), ('b', 2)], ttl=0.01)
+        assert len(backend._cache.dict) == 2
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if not len(backend._cache.dict):
+                break
+        assert len(backend._cache.dict) == 0
+
+        await backend.close()
+        assert aiocache._sweeper.cancelled()
@@ -1,7 +1,11 @@
+import threading
+import time
+
 import pytest
 
-from shared_memory_dict import SharedMemoryDict
+from shared_memory_dict import ShardedSharedMemoryDict, SharedMemoryDict
 from shared_memory_dict.caches.django import SharedMemoryCache
+from shared_memory_dict.hooks import free_shared_memory
 
 
 class TestDjangoSharedMemoryCache:
@@ -79,14 +83,123 @@ class TestDjangoSharedMemoryCache:
         assert backend.get(key) is None
 
     @pytest.mark.parametrize('value', ('fake', ('fake',), {}))
-    def test_should_prevent_key_error_for_invalid_exp_info(
-        self, backend, key, value
-    ):
+    def test_should_store_values_as_they_are(self, backend, key, value):
+        backend.set(key, value)
         formated_key = backend.make_key(key, version=None)
-        backend._cache[formated_key] = value
+        assert backend._cache[formated_key] == value
+
+    def test_should_expire_a_key(self, backend, key, value):
+        backend.set(key, value, 0.01)
+        time.sleep(0.02)
         assert backend.get(key) is None
+        assert backend.add(key, value) is True
+
+    def test_should_keep_timeout_on_incr(self, backend, key):
+        backend.set(key, 1, 60)
+        backend.incr(key)
+        formated_key = backend.make_key(key, version=None)
+        assert 0 < backend._cache.ttl(formated_key) <= 60
 
     def test_should_raise_error_for_non_int_values_on_incr(self, backend, key):
         backend.set(key, 'a')
         with pytest.raises(TypeError):
             backend.incr(key)
+
+    def test_should_set_and_get_many_values(self, backend):
+        assert backend.set_many({'key-1': 1, 'key-2': 2}) == []
+        assert backend.get_many(['key-1', 'key-2', 'key-3']) == {
+            'key-1': 1,
+            'key-2': 2,
+        }
+
+    def test_should_delete_many_keys(self, backend):
+        backend.set_many({'key-1': 1, 'key-2': 2, 'key-3': 3})
+        backend.delete_many(['key-1', 'key-2'])
+        assert backend.get_many(['key-1', 'key-2', 'key-3']) == {'key-3': 3}
+
+    def test_should_delete_keys_with_prefix(self, backend):
+        backend.set_many({'user:1': 1, 'user:2': 2, 'page:1': 3})
+        backend.set('user:3', 3, version=2)
+        assert backend.delete_prefix('user:') == 2
+        assert backend.get_many(['user:1', 'user:2', 'page:1']) == {
+            'page:1': 3
+        }
+        assert backend.get('user:3', version=2) == 3
+
+    def test_should_touch_a_key(self, backend, key, value):
+        assert backend.touch(key, 60) is False
+        backend.set(key, value)
+        assert backend.touch(key, 60) is True
+        assert 0 < backend._cache.ttl(backend.make_key(key)) <= 60
+        assert backend.touch(key, None) is True
+        assert backend._cache.ttl(backend.make_key(key)) is None
+        assert backend.touch(key, 0) is True
+        assert backend.has_key(key) is False
+
+    def test_should_check_if_it_has_a_key(self, backend, key, value):
+        assert backend.has_key(key) is False
+        backend.set(key, value, version=2)
+        assert backend.has_key(key) is False
+        assert backend.has_key(key, version=2) is True
+
+    def test_should_get_or_set_a_key(self, backend, key, value):
+        assert backend.get_or_set(key, value, timeout=60) == value
+        assert 0 < backend._cache.ttl(backend.make_key(key)) <= 60
+        assert backend.get_or_set(key, 'other') == value
+
+        calls = []
+        assert backend.get_or_set('other', lambda: calls.append(1)) is None
+        assert backend.get_or_set('other', lambda: calls.append(1)) is None
+        assert calls == [1]
+
+    def test_should_compress_big_values(self):
+        backend = SharedMemoryCache(
+            name='ut-compression',
+            params={'OPTIONS': {'COMPRESSION': 'zlib'}},
+        )
+        value = '<p>fragment</p>' * 500
+        backend.set('key', value)
+        assert backend.get('key') == value
+        backend._cache.shm.unlink()
+
+    def test_should_spread_keys_across_shards(self):
+        backend = SharedMemoryCache(
+            name='ut-shards',
+            params={'OPTIONS': {'MEMORY_BLOCK_SIZE': 4096, 'SHARDS': 2}},
+        )
+        assert isinstance(backend._cache, ShardedSharedMemoryDict)
+        backend.set_many({f'key-{i}': i for i in range(10)}, timeout=60)
+        assert backend.get_many(['key-1', 'key-9']) == {'key-1': 1, 'key-9': 9}
+        assert backend.incr('key-1') == 2
+        assert all(len(shard) > 0 for shard in backend._cache.shards)
+        backend._cache.cleanup()
+        free_shared_memory('ut-shards', shards=2)
+
+    def test_should_share_the_dict_of_a_location(self):
+        params = {'OPTIONS': {'MEMORY_BLOCK_SIZE': 2048}}
+        backends = [
+            SharedMemoryCache(name='ut-registry', params=params)
+            for _ in range(3)
+        ]
+        assert backends[0]._attached is None
+
+        threads = [
+            threading.Thread(target=backend.set, args=('key', 1))
+            for backend in backends
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert backends[0]._cache is backends[1]._cache is backends[2]._cache
+
+        other = SharedMemoryCache(
+            name='ut-registry',
+            params={'OPTIONS': {'MEMORY_BLOCK_SIZE': 2048, 'USE_LOCK': True}},
+        )
+        assert other._cache is not backends[0]._cache
+        assert other.get('key') == 1
+
+        other._cache.cleanup()
+        backends[0]._cache.cleanup()
+        free_shared_memory('ut-registry')
@@ -0,0 +1,174 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from shared_memory_dict import AsyncSharedMemoryDict, SharedMemoryDict
+from shared_memory_dict.lock import remove_lock
+
+DEFAULT_MEMORY_SIZE = 4096
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+@pytest.mark.asyncio
+class TestAsyncSharedMemoryDict:
+    @pytest.fixture
+    def smd(self):
+        smd = AsyncSharedMemoryDict(
+            name='ut-aio', size=DEFAULT_MEMORY_SIZE, lock=True
+        )
+        yield smd
+        smd.shm.unlink()
+        smd.cleanup()
+        remove_lock('ut-aio')
+
+    async def test_should_set_and_get(self, smd):
+        await smd.set('key', 'value')
+        assert await smd.get('key') == 'value'
+        assert await smd.get('unknown', 'default') == 'default'
+        assert await smd.exists('key') is True
+
+    async def test_should_share_the_memory_block(self, smd):
+        other = SharedMemoryDict(name='ut-aio', size=DEFAULT_MEMORY_SIZE)
+        other['key'] = [1, 2]
+        assert await smd.get('key') == [1, 2]
+        await smd.set('key', [3])
+        assert other['key'] == [3]
+        other.cleanup()
+
+    async def test_should_handle_many_keys(self, smd):
+        await smd.set_many({'a': 1, 'b': 2, 'c': 3}, ttl=60)
+        assert await smd.get_many(['a', 'b', 'd']) == {'a': 1, 'b': 2}
+        assert await smd.delete_many(['a', 'd']) == 1
+        assert await smd.delete('b') is True
+        assert await smd.delete('b') is False
+        assert await smd.pop('c') == 3
+        assert await smd.pop('c', None) is None
+
+    async def test_should_increment(self, smd):
+        await asyncio.gather(*(smd.incr('hits', default=0) for _ in range(10)))
+        assert await smd.decr('hits', 2) == 8
+
+    async def test_should_compare_and_swap(self, smd):
+        await smd.set('key', 'value')
+        value, version = await smd.get_with_version('key')
+        assert value == 'value'
+        assert await smd.cas('key', version, 'other') is True
+        assert await smd.cas('key', version, 'another') is False
+        assert await smd.get('key') == 'other'
+        assert await smd.cas_delete('key', version) is False
+        assert await smd.cas_delete('key', smd.dict.get_with_version('key')[1])
+        assert await smd.get_with_version('key', 'default') == ('default', 0)
+
+    async def test_should_expire(self, smd):
+        await smd.set('key', 'value')
+        assert await smd.expire('key', 60) is True
+        assert 0 < await smd.ttl('key') <= 60
+
+    async def test_should_clear(self, smd):
+        await smd.set('key', 'value')
+        await smd.clear()
+        assert await smd.get('key') is None
+
+    async def test_should_offload_big_values(self):
+        executor = CountingExecutor()
+        smd = AsyncSharedMemoryDict(
+            name='ut-aio-offload',
+            size=DEFAULT_MEMORY_SIZE,
+            offload_threshold=1024,
+            executor=executor,
+        )
+        await smd.set('small', 'x')
+        assert await smd.get('small') == 'x'
+        assert executor.submitted == 0
+
+        await smd.set('big', 'x' * 2048)
+        assert await smd.get('big') == 'x' * 2048
+        assert executor.submitted == 2
+
+        await smd.delete('big')
+        nested = {'items': [{'id': i, 'name': f'item-{i}'} for i in range(20)]}
+        await smd.set('nested', nested)
+        assert executor.submitted == 3
+        await smd.set_many({'a': nested, 'b': 1})
+        assert executor.submitted == 4
+
+        smd.shm.unlink()
+        smd.cleanup()
+        executor.shutdown()
+
+    async def test_should_not_block_the_loop_waiting_for_the_lock(self, smd):
+        held, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with smd.dict._lock:
+                held.set()
+                release.wait()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        held.wait()
+
+        writer = asyncio.ensure_future(smd.set('key', 'value'))
+        for _ in range(5):
+            await asyncio.sleep(0.001)
+        assert not writer.done()
+
+        release.set()
+        await writer
+        thread.join()
+        assert await smd.get('key') == 'value'
+
+    async def test_should_not_block_the_loop_reading_during_a_write(self, smd):
+        await smd.set('key', 'value')
+        table = smd.dict._table
+        held, release = threading.Event(), threading.Event()
+
+        def write():
+            with smd.dict._lock:
+                table.begin_write()
+                held.set()
+                release.wait(1)
+                table.end_write()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        held.wait()
+
+        reader = asyncio.ensure_future(smd.get('key'))
+        for _ in range(5):
+            await asyncio.sleep(0.001)
+        assert not reader.done()
+
+        release.set()
+        assert await reader == 'value'
+        thread.join()
+
+    async def test_should_watch_writes(self, smd):
+        async with smd.watch() as watcher:
+            assert await watcher.wait(timeout=0.01) == set()
+            waiting = asyncio.ensure_future(watcher.__anext__())
+            await asyncio.sleep(0.01)
+            assert not waiting.done()
+
+            await smd.set('key', 'value')
+            assert await asyncio.wait_for(waiting, 5) == {'key'}
+            await smd.clear()
+            assert await watcher.wait(timeout=5) is None
+
+            await smd.delete_many(['key'])
+            await smd.set('key', 'value')
+            changes = await watcher.changes(timeout=5)
+            assert [change.key for change in changes] == ['key']
+            assert changes[0].seq == watcher.seq
+        smd.dict._ring.unlink()
@@ -0,0 +1,91 @@
+import pytest
+
+from shared_memory_dict.codec import (
+    TAG_BYTES,
+    TAG_FLOAT,
+    TAG_INT,
+    TAG_SERIALIZED,
+    TAG_STR,
+    create_compressor,
+    decode,
+    encode,
+    pack_int,
+)
+from shared_memory_dict.serializers import BytesSerializer, PickleSerializer
+
+
+class Name(str):
+    pass
+
+
+class TestCodec:
+    @pytest.fixture
+    def serializer(self):
+        return PickleSerializer()
+
+    @pytest.mark.parametrize(
+        'value, data, tag',
+        [
+            (b'\x00bytes', b'\x00bytes', TAG_BYTES),
+            ('açaí', 'açaí'.encode(), TAG_STR),
+            (-2, b'\xfe' + b'\xff' * 7, TAG_INT),
+            (0.5, b'\x00' * 6 + b'\xe0\x3f', TAG_FLOAT),
+        ],
+    )
+    def test_should_skip_the_serializer_for_simple_values(
+        self, serializer, value, data, tag
+    ):
+        assert encode(value, serializer) == (data, tag)
+        assert decode(memoryview(data), tag, serializer) == value
+
+    @pytest.mark.parametrize(
+        'value', [True, 2**64, Name('name'), '\udc80', [1, 'a'], None]
+    )
+    def test_should_serialize_other_values(self, serializer, value):
+        data, tag = encode(value, serializer)
+        assert tag == TAG_SERIALIZED
+        assert data == serializer.dumps(value)
+        decoded = decode(data, tag, serializer)
+        assert decoded == value
+        assert type(decoded) is type(value)
+
+    def test_should_serialize_everything_without_fast_path(self):
+        serializer = BytesSerializer()
+        assert encode(b'value', serializer) == (b'value', TAG_SERIALIZED)
+
+    def test_raise_an_error_when_int_overflows(self):
+        with pytest.raises(OverflowError):
+            pack_int(2**63)
+
+
+class TestCompressor:
+    @pytest.fixture
+    def serializer(self):
+        return PickleSerializer()
+
+    @pytest.mark.parametrize('name', ['zlib', 'lzma'])
+    def test_should_compress_values_above_threshold(self, serializer, name):
+        compressor = create_compressor(name, threshold=64)
+        data, tag = compressor.compress(*encode('a' * 1000, serializer))
+        assert len(data) < 1000
+        assert tag == TAG_STR | compressor.tag
+        assert decode(memoryview(data), tag, serializer) == 'a' * 1000
+
+    def test_should_not_compress_values_below_threshold(self, serializer):
+        compressor = create_compressor('zlib', threshold=64)
+        assert compressor.compress(b'a' * 63, TAG_BYTES) == (
+            b'a' * 63,
+            TAG_BYTES,
+        )
+
+    def test_should_not_compress_when_it_doesnt_shrink(self, serializer):
+        compressor = create_compressor('zlib', threshold=0)
+        data = bytes(range(256))
+        assert compressor.compress(data, TAG_BYTES) == (data, TAG_BYTES)
+
+    def test_should_not_create_compressor_when_disabled(self):
+        assert create_compressor(None) is None
+
+    def test_raise_an_error_when_compression_is_unknown(self):
+        with pytest.raises(ValueError, match='unknown compression'):
+            create_compressor('gzip')
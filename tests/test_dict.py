@@ -1,13 +1,51 @@
+import multiprocessing
 import sys
+import threading
+import time
 
 import pytest
 
 from shared_memory_dict import SharedMemoryDict
 from shared_memory_dict.dict import DEFAULT_SERIALIZER
-from shared_memory_dict.serializers import JSONSerializer
+from shared_memory_dict.hooks import free_shared_memory
+from shared_memory_dict.lock import remove_lock
+from shared_memory_dict.serializers import DeserializationError, JSONSerializer
+from shared_memory_dict.storage import (
+    CHANGE_CLEAR,
+    CHANGE_DELETE,
+    CHANGE_SET,
+)
 from multiprocessing.shared_memory import SharedMemory
 
 DEFAULT_MEMORY_SIZE = 1024
+# Big enough for writes to happen while a snapshot is copied
+SNAPSHOT_SIZE = 1024 * 1024
+
+
+def write_values(name, size, times):
+    smd = SharedMemoryDict(name=name, size=size)
+    for i in range(times):
+        smd['key'] = bytes([i % 256]) * (i % 300 + 1)
+        smd[f'key-{i % 3}'] = bytes([i % 256]) * (i % 100)
+    smd['done'] = True
+    smd.cleanup()
+
+
+def increment(name, size, times):
+    smd = SharedMemoryDict(name=name, size=size, lock=True)
+    for _ in range(times):
+        smd.incr('counter')
+    smd.cleanup()
+
+
+def cas_append(name, size, times):
+    smd = SharedMemoryDict(name=name, size=size, lock=True)
+    for _ in range(times):
+        while True:
+            value, version = smd.get_with_version('log')
+            if smd.cas('log', version, value + 'x'):
+                break
+    smd.cleanup()
 
 
 class TestSharedMemoryDict:
@@ -82,7 +120,7 @@ class TestSharedMemoryDict:
             shared_memory_dict[key]
 
     def test_should_finalize_dict(self):
-        smd = SharedMemoryDict(name='unit-tests', size=64)
+        smd = SharedMemoryDict(name='unit-tests', size=DEFAULT_MEMORY_SIZE)
         try:
             del smd
         except Exception as e:
@@ -169,6 +207,63 @@ class TestSharedMemoryDict:
         shared_memory_dict[key] = value
         assert list(shared_memory_dict.items()) == [(key, value)]
 
+    def test_should_decode_values_only_when_iterated(
+        self, shared_memory_dict, key
+    ):
+        shared_memory_dict[key] = [1]
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(DEFAULT_SERIALIZER, 'loads', None)
+            assert list(shared_memory_dict.keys()) == [key]
+            assert len(shared_memory_dict.values()) == 1
+        assert list(shared_memory_dict.items()) == [(key, [1])]
+
+    def test_should_scan_keys_with_prefix(self, shared_memory_dict):
+        for i in range(10):
+            shared_memory_dict[f'{i % 2}-{i}'] = i
+        assert list(shared_memory_dict.scan(prefix='1-', batch=3)) == [
+            '1-1',
+            '1-3',
+            '1-5',
+            '1-7',
+            '1-9',
+        ]
+        assert len(list(shared_memory_dict.scan(batch=3))) == 10
+
+    def test_should_scan_while_keys_are_written(self):
+        smd = SharedMemoryDict(name='ut-scan', size=4096)
+        for i in range(10):
+            smd[f'key-{i}'] = i
+        scanned = []
+        for key in smd.scan(batch=2):
+            scanned.append(key)
+            # moves key-0 to the end, until the index drops deleted entries
+            del smd['key-0']
+            smd['key-0'] = 0
+        assert set(scanned) == {f'key-{i}' for i in range(10)}
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_should_iterate_and_delete_keys_with_prefix(self):
+        smd = SharedMemoryDict(name='ut-prefix', size=4096, prefix_index=True)
+        smd.update({'user:2': 2, 'page:1': 1, 'user:1': 1})
+        assert list(smd.iter_prefix('user:')) == [('user:1', 1), ('user:2', 2)]
+        assert smd.delete_prefix('user:') == 2
+        assert smd == {'page:1': 1}
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_should_keep_prefix_index_when_growing(self):
+        smd = SharedMemoryDict(
+            name='ut-prefix-grow', size=1024, max_size=8192, prefix_index=True
+        )
+        for i in range(20):
+            smd[f'key-{19 - i:02}'] = 'x' * 100
+        assert [key for key, _ in smd.iter_prefix('key-1')] == [
+            f'key-{i}' for i in range(10, 20)
+        ]
+        free_shared_memory('ut-prefix-grow')
+        smd.cleanup()
+
     def test_pop_an_item_without_default(self, shared_memory_dict, key, value):
         shared_memory_dict[key] = value
         assert shared_memory_dict.pop(key) == value
@@ -214,13 +309,13 @@ class TestSharedMemoryDict:
     def test_use_custom_serializer_when_specified(self):
         serializer = JSONSerializer()
         smd = SharedMemoryDict(
-            name='unit-tests', size=64, serializer=serializer
+            name='unit-tests', size=DEFAULT_MEMORY_SIZE, serializer=serializer
         )
         assert smd._serializer is serializer
 
     def test_shoud_initialize_when_memory_is_empty(self):
-        SharedMemory(name='sm_ut', create=True, size=64)
-        smd = SharedMemoryDict(name='ut', size=64)
+        SharedMemory(name='sm_ut', create=True, size=DEFAULT_MEMORY_SIZE)
+        smd = SharedMemoryDict(name='ut', size=DEFAULT_MEMORY_SIZE)
         try:
             print(smd)
         except Exception as e:
@@ -228,3 +323,596 @@ class TestSharedMemoryDict:
         smd.clear()
         smd.cleanup()
         smd.shm.unlink()
+
+    def test_raise_an_error_when_memory_is_too_small(self):
+        with pytest.raises(ValueError, match="memory block is too small"):
+            SharedMemoryDict(name='ut-small', size=64)
+        SharedMemory(name='sm_ut-small').unlink()
+
+    def test_should_share_keys_between_instances(
+        self, shared_memory_dict, key, value
+    ):
+        other = SharedMemoryDict(name='ut', size=DEFAULT_MEMORY_SIZE)
+        shared_memory_dict[key] = value
+        assert other[key] == value
+        del other[key]
+        assert key not in shared_memory_dict
+        other.cleanup()
+
+    def test_should_accept_non_string_keys(self, shared_memory_dict, value):
+        shared_memory_dict[1] = value
+        shared_memory_dict[('a', 2)] = value
+        assert shared_memory_dict[1] == value
+        assert shared_memory_dict[('a', 2)] == value
+        assert '1' not in shared_memory_dict
+        assert list(shared_memory_dict.keys()) == [1, ('a', 2)]
+
+    def test_should_keep_insertion_order(self, shared_memory_dict):
+        for i in range(12):
+            shared_memory_dict[f'key-{i}'] = i
+        for i in range(0, 12, 2):
+            del shared_memory_dict[f'key-{i}']
+        shared_memory_dict['key-1'] = 'overwritten'
+        expected = {f'key-{i}': i for i in range(1, 12, 2)}
+        expected['key-1'] = 'overwritten'
+        assert list(shared_memory_dict.items()) == list(expected.items())
+
+    def test_should_reuse_space_of_removed_keys(
+        self, shared_memory_dict, value
+    ):
+        for i in range(200):
+            shared_memory_dict[f'key-{i}'] = value * (i % 5)
+            if i >= 3:
+                del shared_memory_dict[f'key-{i - 3}']
+        assert len(shared_memory_dict) == 3
+        assert shared_memory_dict['key-199'] == value * 4
+
+    def test_should_close_memory_after_a_failed_deserialization(
+        self, shared_memory_dict, key, value
+    ):
+        # strings skip the serializer, a list is pickled
+        shared_memory_dict[key] = [value]
+        smd = SharedMemoryDict(
+            name='ut', size=DEFAULT_MEMORY_SIZE, serializer=JSONSerializer()
+        )
+        with pytest.raises(DeserializationError):
+            smd[key]
+        try:
+            smd.cleanup()
+        except BufferError as e:
+            pytest.fail(f'Its should not raises: {e}')
+
+    def test_should_bump_generation_on_writes(
+        self, shared_memory_dict, key, value
+    ):
+        generation = shared_memory_dict.generation
+        shared_memory_dict[key] = value
+        del shared_memory_dict[key]
+        shared_memory_dict.clear()
+        assert shared_memory_dict.generation == generation + 3
+
+    def test_should_not_cache_values_by_default(
+        self, shared_memory_dict, key, value
+    ):
+        shared_memory_dict[key] = value
+        shared_memory_dict[key]
+        assert shared_memory_dict.cache_info() == (0, 0, 0)
+
+    def test_should_cache_decoded_values_until_a_write(self, key, value):
+        smd = SharedMemoryDict(
+            name='ut-cache', size=DEFAULT_MEMORY_SIZE, cache=True
+        )
+        other = SharedMemoryDict(name='ut-cache', size=DEFAULT_MEMORY_SIZE)
+        other[key] = value
+
+        assert smd[key] == value
+        assert smd[key] == value
+        assert smd.cache_info() == (1, 1, 1)
+
+        other[key] = 'another-value'
+        assert smd[key] == 'another-value'
+        assert smd == {key: 'another-value'}
+        assert smd.cache_info() == (1, 3, 1)
+
+        other.cleanup()
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_should_recover_from_an_interrupted_write(self, key, value):
+        smd = SharedMemoryDict(
+            name='ut-recover', size=DEFAULT_MEMORY_SIZE, lock=True
+        )
+        smd[key] = value
+
+        # simulate a writer dying before updating the live entries count
+        _, buckets, count, used, size, heap_low, garbage = smd._table._header()
+        smd._table.begin_write()
+        smd._table._write_header(
+            buckets, count + 5, used, size, heap_low, garbage
+        )
+
+        smd['another-key'] = value
+        assert smd._table.dirty is False
+        assert smd == {key: value, 'another-key': value}
+
+        smd.shm.unlink()
+        smd.cleanup()
+        remove_lock('ut-recover')
+
+    def test_should_not_read_half_written_values(self):
+        smd = SharedMemoryDict(name='ut-seqlock', size=2048)
+        smd['key'] = b'\x00'
+        writer = multiprocessing.get_context('spawn').Process(
+            target=write_values, args=('ut-seqlock', 2048, 3000)
+        )
+        writer.start()
+        while 'done' not in smd and writer.is_alive():
+            value = smd['key']
+            assert value == value[:1] * len(value)
+        writer.join()
+        assert writer.exitcode == 0
+
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_should_read_from_threads_while_another_process_grows(self):
+        errors = []
+
+        def read(smd, done):
+            try:
+                while not done.is_set():
+                    assert smd['key'] == 'value'
+                    assert 'key' in smd
+                    assert len(smd) > 0
+            except Exception as e:
+                errors.append(e)
+
+        for _ in range(10):
+            smd = SharedMemoryDict(name='ut-grow-threads', size=1024)
+            other = SharedMemoryDict(
+                name='ut-grow-threads', size=1024, max_size=64 * 1024
+            )
+            smd['key'] = 'value'
+            done = threading.Event()
+            threads = [
+                threading.Thread(target=read, args=(smd, done))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            try:
+                for i in range(6):
+                    other[f'key-{i}'] = 'x' * (512 << i)
+            finally:
+                done.set()
+                for thread in threads:
+                    thread.join()
+                smd.cleanup()
+                other.cleanup()
+                free_shared_memory('ut-grow-threads')
+        assert errors == []
+
+    def test_should_not_share_locks_between_segments(self, key, value):
+        smd = SharedMemoryDict(
+            name='ut-lock-a', size=DEFAULT_MEMORY_SIZE, lock=True
+        )
+        other = SharedMemoryDict(
+            name='ut-lock-b', size=DEFAULT_MEMORY_SIZE, lock=True
+        )
+        with smd._lock:
+            assert other._lock.acquire(blocking=False) is True
+            other._lock.release()
+
+        for instance in (smd, other):
+            instance.shm.unlink()
+            instance.cleanup()
+        remove_lock('ut-lock-a')
+        remove_lock('ut-lock-b')
+
+    def test_should_grow_up_to_max_size(self, key, big_value):
+        smd = SharedMemoryDict(
+            name='ut-grow', size=DEFAULT_MEMORY_SIZE, max_size=64 * 1024
+        )
+        other = SharedMemoryDict(
+            name='ut-grow', size=DEFAULT_MEMORY_SIZE, max_size=64 * 1024
+        )
+        smd['first'] = 1
+        smd[key] = big_value
+        assert other[key] == big_value
+        assert other == {'first': 1, key: big_value}
+
+        other['second'] = big_value
+        assert smd['second'] == big_value
+        with pytest.raises(ValueError, match='exceeds available storage'):
+            smd['third'] = big_value * 8
+
+        other.cleanup()
+        free_shared_memory('ut-grow')
+        smd.cleanup()
+
+    def test_should_expire_keys(self, shared_memory_dict, key, value):
+        shared_memory_dict.set(key, value, ttl=60)
+        shared_memory_dict.set('expired', value, ttl=-1)
+        assert 59 < shared_memory_dict.ttl(key) <= 60
+        assert 'expired' not in shared_memory_dict
+        assert shared_memory_dict == {key: value}
+
+        assert shared_memory_dict.expire(key, None) is True
+        assert shared_memory_dict.ttl(key) is None
+        assert shared_memory_dict.expire('expired', 60) is False
+        with pytest.raises(KeyError):
+            shared_memory_dict.ttl('expired')
+
+    def test_should_reclaim_expired_keys_when_full(self, shared_memory_dict):
+        for i in range(5):
+            shared_memory_dict.set(f'key-{i}', 'x' * 100, ttl=0.01)
+        time.sleep(0.02)
+        for i in range(5):
+            shared_memory_dict[f'other-{i}'] = 'x' * 100
+        assert len(shared_memory_dict) == 5
+
+    def test_should_not_cache_expired_values(self, key, value):
+        smd = SharedMemoryDict(
+            name='ut-cache-ttl', size=DEFAULT_MEMORY_SIZE, cache=True
+        )
+        smd.set(key, value, ttl=0.01)
+        assert smd[key] == value
+        assert smd == {key: value}
+        time.sleep(0.02)
+        assert key not in smd
+        assert smd == {}
+
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_should_increment_counters(self, shared_memory_dict, key):
+        assert shared_memory_dict.incr(key, default=0) == 1
+        assert shared_memory_dict.incr(key, 5) == 6
+        assert shared_memory_dict.decr(key, 2) == 4
+        assert shared_memory_dict[key] == 4
+        assert shared_memory_dict == {key: 4}
+        assert shared_memory_dict.pop(key) == 4
+
+    def test_should_increment_an_integer_value(self, shared_memory_dict, key):
+        shared_memory_dict.set(key, 10, ttl=60)
+        assert shared_memory_dict.incr(key) == 11
+        assert shared_memory_dict.ttl(key) > 59
+        shared_memory_dict[key] = 'overwritten'
+        assert shared_memory_dict[key] == 'overwritten'
+
+    def test_raise_an_error_when_incrementing_a_missing_key(
+        self, shared_memory_dict, key
+    ):
+        with pytest.raises(KeyError):
+            shared_memory_dict.incr(key)
+
+    def test_raise_an_error_when_incrementing_a_non_integer(
+        self, shared_memory_dict, key, value
+    ):
+        shared_memory_dict[key] = value
+        with pytest.raises(TypeError):
+            shared_memory_dict.incr(key)
+
+    def test_raise_an_error_when_counter_overflows(
+        self, shared_memory_dict, key
+    ):
+        shared_memory_dict.incr(key, 2**63 - 1, default=0)
+        with pytest.raises(OverflowError):
+            shared_memory_dict.incr(key)
+        assert shared_memory_dict[key] == 2**63 - 1
+
+    @pytest.mark.parametrize(
+        'value', [b'bytes', 'str', 1, 2**64, 1.5, True, None, ['list']]
+    )
+    def test_should_keep_the_type_of_values(self, shared_memory_dict, value):
+        shared_memory_dict['key'] = value
+        assert shared_memory_dict['key'] == value
+        assert type(shared_memory_dict['key']) is type(value)
+
+    def test_should_serialize_every_value_without_fast_path(self):
+        class Serializer(JSONSerializer):
+            fast_path = False
+
+        smd = SharedMemoryDict(
+            name='ut-json', size=DEFAULT_MEMORY_SIZE, serializer=Serializer()
+        )
+        with pytest.raises(ValueError, match='Failed to serialize data'):
+            smd['key'] = b'bytes'
+
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_should_compress_big_values(self):
+        smd = SharedMemoryDict(
+            name='ut-compression', size=4096, compression='zlib'
+        )
+        other = SharedMemoryDict(name='ut-compression', size=4096)
+        smd['html'] = '<p>fragment</p>' * 1000
+        smd['small'] = 'small'
+        assert other['html'] == '<p>fragment</p>' * 1000
+        assert other == smd
+
+        other.cleanup()
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_should_not_lose_increments_of_other_processes(self):
+        smd = SharedMemoryDict(
+            name='ut-incr', size=DEFAULT_MEMORY_SIZE, lock=True
+        )
+        smd['counter'] = 0
+        context = multiprocessing.get_context('spawn')
+        processes = [
+            context.Process(
+                target=increment, args=('ut-incr', DEFAULT_MEMORY_SIZE, 500)
+            )
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        assert smd['counter'] == 2000
+
+        smd.shm.unlink()
+        smd.cleanup()
+        remove_lock('ut-incr')
+
+    def test_should_compare_and_swap(self, shared_memory_dict, key, value):
+        assert shared_memory_dict.get_with_version(key) == (None, 0)
+        assert shared_memory_dict.cas(key, 0, value) is True
+        assert shared_memory_dict.cas(key, 0, 'other') is False
+
+        current, version = shared_memory_dict.get_with_version(key)
+        assert current == value
+        assert version != 0
+        assert shared_memory_dict.cas(key, version, 'other', ttl=60) is True
+        assert shared_memory_dict.cas(key, version, 'another') is False
+        assert shared_memory_dict[key] == 'other'
+        assert 0 < shared_memory_dict.ttl(key) <= 60
+
+        shared_memory_dict.incr('counter', default=0)
+        _, counted = shared_memory_dict.get_with_version('counter')
+        shared_memory_dict.incr('counter')
+        assert shared_memory_dict.cas('counter', counted, 0) is False
+
+    def test_should_delete_only_the_version_given(
+        self, shared_memory_dict, key, value
+    ):
+        shared_memory_dict[key] = value
+        _, version = shared_memory_dict.get_with_version(key)
+        assert shared_memory_dict.cas_delete(key, 0) is False
+        shared_memory_dict[key] = value
+        assert shared_memory_dict.cas_delete(key, version) is False
+        _, version = shared_memory_dict.get_with_version(key)
+        assert shared_memory_dict.cas_delete(key, version) is True
+        assert key not in shared_memory_dict
+
+    def test_should_not_lose_swaps_of_other_processes(self):
+        smd = SharedMemoryDict(
+            name='ut-cas', size=DEFAULT_MEMORY_SIZE, lock=True
+        )
+        smd['log'] = ''
+        context = multiprocessing.get_context('spawn')
+        processes = [
+            context.Process(
+                target=cas_append, args=('ut-cas', DEFAULT_MEMORY_SIZE, 50)
+            )
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        assert smd['log'] == 'x' * 200
+
+        smd.shm.unlink()
+        smd.cleanup()
+        remove_lock('ut-cas')
+
+    def test_should_get_and_set_many_keys(self, shared_memory_dict, value):
+        shared_memory_dict.set_many({'key-1': 1, 2: value})
+        assert shared_memory_dict.get_many(['key-1', 2, 'key-3']) == {
+            'key-1': 1,
+            2: value,
+        }
+
+    def test_should_not_set_part_of_a_batch_that_does_not_fit(
+        self, shared_memory_dict
+    ):
+        shared_memory_dict['a'] = 'old'
+        _, version = shared_memory_dict.get_with_version('a')
+        with pytest.raises(ValueError, match='exceeds available storage'):
+            shared_memory_dict.set_many(
+                {'a': 'x' * 100, 'b': 'y' * 2000, 'c': 'z'}
+            )
+        with pytest.raises(ValueError, match='exceeds available storage'):
+            shared_memory_dict.update({'c': 'z' * 100, 'd': 'y' * 2000})
+        assert shared_memory_dict == {'a': 'old'}
+        assert shared_memory_dict.get_with_version('a') == ('old', version)
+
+    def test_should_keep_the_keys_of_a_batch_that_does_not_fit(self):
+        smd = SharedMemoryDict(name='ut-batch', size=1024)
+        sizes = {'k3': 21, 'k4': 108, 'k2': 139, 'k1': 139, 'k5': 126}
+        smd.update({key: 'x' * size for key, size in sizes.items()})
+        with pytest.raises(ValueError, match='exceeds available storage'):
+            smd.update({'k5': 'y' * 173, 'k2': 'y' * 149})
+        assert list(smd.items()) == [
+            (key, 'x' * size) for key, size in sizes.items()
+        ]
+        assert smd.popitem() == ('k5', 'x' * 126)
+
+        smd.cleanup()
+        smd.shm.unlink()
+
+    def test_should_not_set_part_of_a_batch_that_grew_the_dict(self):
+        smd = SharedMemoryDict(name='ut-batch-grow', size=1024, max_size=2048)
+        smd.update({'a': 'x' * 100, 'b': 'x' * 100})
+        with pytest.raises(ValueError, match='exceeds available storage'):
+            smd.update({'c': 'y' * 600, 'a': 'y' * 200, 'd': 'y' * 1500})
+        assert list(smd.items()) == [('a', 'x' * 100), ('b', 'x' * 100)]
+
+        free_shared_memory('ut-batch-grow')
+
+    def test_should_delete_many_keys(self, shared_memory_dict, value):
+        shared_memory_dict.update({'key-1': 1, 'key-2': 2, 'key-3': 3})
+        assert shared_memory_dict.delete_many(['key-1', 'key-2', 'x']) == 2
+        assert shared_memory_dict == {'key-3': 3}
+
+    def test_should_get_many_cached_keys(self, value):
+        smd = SharedMemoryDict(
+            name='ut-cache-many', size=DEFAULT_MEMORY_SIZE, cache=True
+        )
+        smd.set_many({'key-1': value, 'key-2': value}, ttl=60)
+        assert smd.get_many(['key-1']) == {'key-1': value}
+        assert smd.get_many(['key-1', 'key-2']) == {
+            'key-1': value,
+            'key-2': value,
+        }
+        assert smd.cache_info() == (1, 2, 2)
+
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_should_watch_writes(self):
+        smd = SharedMemoryDict(name='ut-watch', size=DEFAULT_MEMORY_SIZE)
+        smd['before'] = 1
+        with smd.watch() as watcher:
+            assert watcher.wait(timeout=0.01) == set()
+            smd['key'] = 1
+            smd.update({'key': 2, 3: 'three'})
+            assert watcher.wait(timeout=1) == {'key', 3}
+            del smd['before']
+            assert watcher.wait(timeout=1) == {'before'}
+            smd.clear()
+            assert watcher.wait(timeout=1) is None
+
+        smd.cleanup()
+        free_shared_memory('ut-watch')
+
+    def test_should_be_woken_by_writes_of_other_processes(self):
+        smd = SharedMemoryDict(name='ut-watch-wake', size=2048)
+        watcher = smd.watch()
+        writer = multiprocessing.get_context('spawn').Process(
+            target=write_values, args=('ut-watch-wake', 2048, 1)
+        )
+        start = time.monotonic()
+        writer.start()
+        changed = set()
+        while 'done' not in changed and time.monotonic() - start < 30:
+            changed |= watcher.wait(timeout=30)
+        writer.join()
+        assert changed == {'key', 'key-0', 'done'}
+
+        watcher.close()
+        smd.cleanup()
+        free_shared_memory('ut-watch-wake')
+
+    def test_should_not_record_writes_nobody_watches(self):
+        smd = SharedMemoryDict(name='ut-unwatched', size=DEFAULT_MEMORY_SIZE)
+        smd['key'] = 1
+        assert smd._ring is None
+        smd.watch().close()
+        smd['key'] = 2
+        assert smd._ring.head == 0
+
+        smd.cleanup()
+        free_shared_memory('ut-unwatched')
+
+    def test_should_log_changes(self):
+        smd = SharedMemoryDict(name='ut-log', size=DEFAULT_MEMORY_SIZE)
+        smd['key'] = 1
+        with smd.watch() as watcher:
+            smd.set_many({'key': 2, 'other': 3}, ttl=60)
+            smd.incr('key')
+            smd.expire('other', None)
+            del smd['key']
+            smd.clear()
+            assert watcher.changes() == [
+                (1, CHANGE_SET, 'key'),
+                (2, CHANGE_SET, 'other'),
+                (3, CHANGE_SET, 'key'),
+                (4, CHANGE_SET, 'other'),
+                (5, CHANGE_DELETE, 'key'),
+                (6, CHANGE_CLEAR, None),
+            ]
+            with smd.watch(since=4) as resumed:
+                assert [c.seq for c in resumed.changes()] == [5, 6]
+
+        smd.cleanup()
+        free_shared_memory('ut-log')
+
+    def test_should_restore_snapshots(self, tmp_path, value):
+        path = str(tmp_path / 'smd.snapshot')
+        smd = SharedMemoryDict(name='ut-snapshot', size=DEFAULT_MEMORY_SIZE)
+        smd.update({'key': value, 'expired': 1, 'counter': 2})
+        smd.expire('expired', 0.01)
+        smd.snapshot(path)
+        smd.clear()
+        smd['other'] = 3
+
+        smd.load_from(path)
+        assert smd['key'] == value
+        assert 'other' not in smd
+        time.sleep(0.01)
+        assert smd.incr('counter') == 3
+
+        bigger = SharedMemoryDict(
+            name='ut-snapshot-bigger', size=2 * DEFAULT_MEMORY_SIZE
+        )
+        bigger['other'] = 3
+        bigger.load_from(path)
+        assert bigger == {'key': value, 'counter': 2}
+
+        bigger.cleanup()
+        free_shared_memory('ut-snapshot-bigger')
+        smd.cleanup()
+        free_shared_memory('ut-snapshot')
+
+    def test_should_not_snapshot_half_written_values(self, tmp_path):
+        path = str(tmp_path / 'smd.snapshot')
+        smd = SharedMemoryDict(name='ut-snapshot-writes', size=SNAPSHOT_SIZE)
+        copy = SharedMemoryDict(name='ut-snapshot-copy', size=SNAPSHOT_SIZE)
+        smd['key'] = b'\x00'
+        writer = multiprocessing.get_context('spawn').Process(
+            target=write_values,
+            args=('ut-snapshot-writes', SNAPSHOT_SIZE, 10000),
+        )
+        writer.start()
+        while 'done' not in smd and writer.is_alive():
+            smd.snapshot(path)
+            copy.load_from(path)
+            value = copy['key']
+            assert value == value[:1] * len(value)
+        writer.join()
+        assert writer.exitcode == 0
+
+        copy.cleanup()
+        free_shared_memory('ut-snapshot-copy')
+        smd.cleanup()
+        free_shared_memory('ut-snapshot-writes')
+
+    def test_should_grow_to_load_bigger_snapshots(self, tmp_path):
+        path = str(tmp_path / 'smd.snapshot')
+        smd = SharedMemoryDict(
+            name='ut-snapshot-grown', size=DEFAULT_MEMORY_SIZE, max_size=8192
+        )
+        smd.update({f'key-{i}': 'x' * 50 for i in range(40)})
+        smd.snapshot(path)
+
+        small = SharedMemoryDict(
+            name='ut-snapshot-small', size=DEFAULT_MEMORY_SIZE, max_size=8192
+        )
+        small.load_from(path)
+        assert small == smd
+
+        small.cleanup()
+        free_shared_memory('ut-snapshot-small')
+        smd.cleanup()
+        free_shared_memory('ut-snapshot-grown')
+
+    def test_should_setdefault_with_ttl(self, shared_memory_dict):
+        assert shared_memory_dict.setdefault('key', 1, ttl=60) == 1
+        assert 0 < shared_memory_dict.ttl('key') <= 60
+        assert shared_memory_dict.setdefault('key', 2, ttl=1) == 1
+        assert 1 < shared_memory_dict.ttl('key') <= 60
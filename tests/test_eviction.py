@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from shared_memory_dict import SharedMemoryDict
+from shared_memory_dict.dict import FULL_SWEEP_STEP
+from shared_memory_dict.eviction import (
+    ClockPolicy,
+    LFUPolicy,
+    LRUPolicy,
+    create_policy,
+)
+from shared_memory_dict.storage import HashTable
+
+POLICIES = ['lru', 'lfu', 'clock']
+
+
+class TestCreatePolicy:
+    @pytest.mark.parametrize(
+        'name, policy',
+        [('lru', LRUPolicy), ('lfu', LFUPolicy), ('clock', ClockPolicy)],
+    )
+    def test_should_create_policy_by_name(self, name, policy):
+        assert isinstance(create_policy(name), policy)
+
+    def test_should_not_create_policy_when_disabled(self):
+        assert create_policy(None) is None
+
+    def test_raise_an_error_when_policy_is_unknown(self):
+        with pytest.raises(ValueError, match='unknown eviction policy'):
+            create_policy('fifo')
+
+
+class TestPolicies:
+    @pytest.fixture
+    def table(self):
+        table = HashTable(memoryview(bytearray(4096)))
+        table.initialize()
+        for i in range(8):
+            table.insert(b'key-%d' % i, b'value')
+        return table
+
+    @pytest.mark.parametrize('name', POLICIES)
+    def test_should_choose_a_live_entry(self, table, name):
+        table.remove(table.lookup(b'key-0'))
+        ix = create_policy(name).victim(table)
+        assert table.is_live(ix)
+
+    @pytest.mark.parametrize('name', POLICIES)
+    def test_should_not_choose_from_an_empty_table(self, table, name):
+        table.clear()
+        assert create_policy(name).victim(table) == -1
+
+    def test_clock_should_skip_referenced_entries(self, table):
+        policy = ClockPolicy()
+        policy.touch(table, b'key-0')
+        assert policy.victim(table) == table.lookup(b'key-1')
+        assert policy.victim(table) == table.lookup(b'key-2')
+
+
+class TestSharedMemoryDictEviction:
+    @pytest.fixture(params=POLICIES)
+    def eviction(self, request):
+        random.seed(0)
+        return request.param
+
+    @pytest.fixture
+    def shared_memory_dict(self, eviction):
+        smd = SharedMemoryDict(
+            name='ut-eviction', size=1024, eviction=eviction
+        )
+        yield smd
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_should_evict_instead_of_raising(self, shared_memory_dict):
+        for i in range(100):
+            shared_memory_dict[f'key-{i}'] = 'x' * 50
+        assert 0 < len(shared_memory_dict) < 100
+        assert shared_memory_dict['key-99'] == 'x' * 50
+
+    def test_should_sweep_a_few_keys_on_every_write_when_full(
+        self, monkeypatch, shared_memory_dict
+    ):
+        limits = []
+        sweep = HashTable.sweep
+
+        def spy(table, limit=None):
+            limits.append(limit)
+            return sweep(table, limit)
+
+        monkeypatch.setattr(HashTable, 'sweep', spy)
+        for i in range(100):
+            shared_memory_dict[f'key-{i}'] = 'x' * 50
+        assert FULL_SWEEP_STEP in limits
+        assert None not in limits
+
+    def test_should_keep_keys_read_by_other_instances(self, eviction):
+        smd = SharedMemoryDict(
+            name='ut-eviction-big', size=64 * 1024, eviction=eviction
+        )
+        other = SharedMemoryDict(
+            name='ut-eviction-big', size=64 * 1024, eviction=eviction
+        )
+        smd['hot'] = 'value'
+        for i in range(1000):
+            smd[f'key-{i}'] = 'x' * 500
+            assert other['hot'] == 'value'
+        assert len(smd) < 1000
+
+        other.cleanup()
+        smd.shm.unlink()
+        smd.cleanup()
+
+    def test_raise_an_error_when_value_is_bigger_than_memory(
+        self, shared_memory_dict
+    ):
+        shared_memory_dict['key'] = 'value'
+        with pytest.raises(ValueError, match='exceeds available storage'):
+            shared_memory_dict['big'] = 'x' * 2048
+        assert shared_memory_dict['key'] == 'value'
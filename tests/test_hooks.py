@@ -1,5 +1,6 @@
 from unittest.mock import patch
 
+from shared_memory_dict import SharedMemoryDict
 from shared_memory_dict.hooks import create_shared_memory, free_shared_memory
 from shared_memory_dict.templates import MEMORY_NAME
 
@@ -21,9 +22,26 @@ class TestHooks:
 
     def test_should_free_shared_memory(self):
         expected_name = 'unit-test'
+        expected_size = 64
 
         with patch('shared_memory_dict.hooks.SharedMemory') as mock:
+            mock.return_value.buf = memoryview(bytearray(expected_size))
             free_shared_memory(expected_name)
 
         mock.assert_called_once_with(MEMORY_NAME.format(name=expected_name))
         mock.return_value.unlink.assert_called_once()
+
+    def test_should_warm_shared_memory_from_snapshots(self, tmp_path):
+        path = str(tmp_path / 'smd.snapshot')
+        smd = SharedMemoryDict('unit-test-warm', 2048)
+        smd['key'] = 'value'
+        smd.snapshot(path)
+        smd.cleanup()
+        free_shared_memory('unit-test-warm')
+
+        create_shared_memory('unit-test-warm', 1024, warm_from=path)
+        smd = SharedMemoryDict('unit-test-warm', 1024)
+        assert smd.shm.size >= 2048
+        assert smd['key'] == 'value'
+        smd.cleanup()
+        free_shared_memory('unit-test-warm')
@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+from contextlib import suppress
+
+import pytest
+
+from shared_memory_dict.lock import (
+    NullLock,
+    SegmentLock,
+    create_lock,
+    lock_path,
+    remove_lock,
+)
+
+LOCK_NAME = 'ut-lock'
+
+
+def try_acquire(name):
+    return SegmentLock(name).acquire(blocking=False)
+
+
+def acquire_and_die(name):
+    SegmentLock(name).acquire()
+    os._exit(0)
+
+
+class TestNullLock:
+    def test_should_always_acquire(self):
+        lock = NullLock()
+        assert lock.acquire() is True
+        assert lock.acquire(blocking=False) is True
+        lock.release()
+
+    def test_should_not_be_exclusive(self):
+        assert NullLock.exclusive is False
+
+
+class TestSegmentLock:
+    @pytest.fixture
+    def lock(self):
+        lock = SegmentLock(LOCK_NAME)
+        yield lock
+        lock.close()
+        with suppress(FileNotFoundError):
+            os.unlink(lock_path(LOCK_NAME))
+
+    @pytest.fixture
+    def pool(self):
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            yield pool
+
+    def test_should_be_reentrant(self, lock):
+        assert lock.acquire() is True
+        assert lock.acquire() is True
+        lock.release()
+        lock.release()
+
+    def test_should_exclude_other_instances(self, lock):
+        other = SegmentLock(LOCK_NAME)
+        with lock:
+            assert other.acquire(blocking=False) is False
+        assert other.acquire(blocking=False) is True
+        other.release()
+        other.close()
+
+    def test_should_exclude_spawned_processes(self, lock, pool):
+        with lock:
+            assert pool.apply(try_acquire, (LOCK_NAME,)) is False
+        assert pool.apply(try_acquire, (LOCK_NAME,)) is True
+
+    def test_should_be_released_when_holder_dies(self, lock):
+        process = multiprocessing.get_context('spawn').Process(
+            target=acquire_and_die, args=(LOCK_NAME,)
+        )
+        process.start()
+        process.join()
+        assert lock.acquire(blocking=False) is True
+        lock.release()
+
+    def test_should_not_use_the_names_of_memory_blocks(self):
+        assert not os.path.basename(lock_path(LOCK_NAME)).startswith('sm_')
+
+    def test_should_remove_the_lock_file(self, lock):
+        with lock:
+            pass
+        remove_lock(LOCK_NAME)
+        assert os.path.exists(lock_path(LOCK_NAME)) is False
+
+    def test_should_take_a_removed_lock_on_the_new_file(self, lock):
+        waiting = SegmentLock(LOCK_NAME)
+        with lock:
+            assert waiting.acquire(blocking=False) is False
+        remove_lock(LOCK_NAME)
+
+        # the file waiting opened is gone, so it locks the new one
+        assert waiting.acquire(blocking=False) is True
+        other = SegmentLock(LOCK_NAME)
+        assert other.acquire(blocking=False) is False
+        waiting.release()
+        waiting.close()
+        other.close()
+
+
+class TestCreateLock:
+    def test_should_create_a_segment_lock_when_enabled(self):
+        assert isinstance(create_lock(LOCK_NAME, True), SegmentLock)
+
+    def test_should_create_a_null_lock_when_disabled(self, monkeypatch):
+        monkeypatch.setattr('shared_memory_dict.lock.USE_LOCK', True)
+        assert type(create_lock(LOCK_NAME, False)) is NullLock
+
+    @pytest.mark.parametrize('use_lock, lock_class', (
+        (True, SegmentLock), (False, NullLock)
+    ))
+    def test_should_use_environment_variable_by_default(
+        self, monkeypatch, use_lock, lock_class
+    ):
+        monkeypatch.setattr('shared_memory_dict.lock.USE_LOCK', use_lock)
+        assert type(create_lock(LOCK_NAME)) is lock_class
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from shared_memory_dict.lock import NullLock
+from shared_memory_dict.ring import (
+    KEY_SIZE,
+    RECORDS,
+    Change,
+    ChangeRing,
+    Watcher,
+    futex_wait,
+)
+from shared_memory_dict.storage import CHANGE_CLEAR, CHANGE_DELETE, CHANGE_SET
+
+
+class TestChangeRing:
+    @pytest.fixture
+    def ring(self):
+        ring = ChangeRing('ut-ring')
+        ring.register()
+        yield ring
+        ring.unlink()
+        ring.close()
+
+    def test_should_read_published_changes(self, ring):
+        ring.publish([(CHANGE_SET, b'a'), (CHANGE_DELETE, b'b')])
+        ring.publish([(CHANGE_CLEAR, None)])
+        assert ring.writes == 2
+        assert ring.read(0) == (
+            [(1, CHANGE_SET, b'a'), (2, CHANGE_DELETE, b'b'), (3, 3, None)],
+            3,
+        )
+        assert ring.read(2) == ([(3, CHANGE_CLEAR, None)], 3)
+        assert ring.read(3) == ([], 3)
+
+    def test_should_not_publish_without_watchers(self, ring):
+        ring.register(-1)
+        ring.publish([(CHANGE_SET, b'a')])
+        assert ring.writes == 0
+        assert ring.head == 0
+
+    def test_should_not_keep_long_keys(self, ring):
+        ring.publish([(CHANGE_DELETE, b'x' * (KEY_SIZE + 1))])
+        assert ring.read(0) == ([(1, CHANGE_DELETE, None)], 1)
+
+    def test_should_overwrite_the_oldest_changes(self, ring):
+        for i in range(RECORDS + 1):
+            ring.publish([(CHANGE_SET, b'%d' % i)])
+        assert ring.read(0) == (None, RECORDS + 1)
+        records, cursor = ring.read(1)
+        assert cursor == RECORDS + 1
+        assert records[0] == (2, CHANGE_SET, b'1')
+        assert records[-1] == (RECORDS + 1, CHANGE_SET, b'%d' % RECORDS)
+
+    def test_should_keep_the_latest_changes_of_big_writes(self, ring):
+        ring.publish([(CHANGE_SET, b'%d' % i) for i in range(RECORDS + 2)])
+        assert ring.head == RECORDS + 2
+        assert ring.read(0) == (None, RECORDS + 2)
+        assert ring.read(RECORDS + 1) == (
+            [(RECORDS + 2, CHANGE_SET, b'%d' % (RECORDS + 1))],
+            RECORDS + 2,
+        )
+
+    def test_should_detect_cursors_ahead_of_the_log(self, ring):
+        assert ring.read(10) == (None, 0)
+
+    def test_should_wake_waiting_threads(self, ring):
+        thread = threading.Timer(0.05, ring.publish, [[(CHANGE_SET, b'k')]])
+        thread.start()
+        start = time.monotonic()
+        while ring.writes == 0 and time.monotonic() - start < 5:
+            ring.wait(0, timeout=5)
+        assert time.monotonic() - start < 5
+        thread.join()
+
+    def test_should_not_sleep_when_the_word_changed(self, ring):
+        start = time.monotonic()
+        futex_wait(ring._memory_block.buf, 0, 1, 5)
+        assert time.monotonic() - start < 5
+
+
+class TestWatcher:
+    @pytest.fixture
+    def ring(self):
+        ring = ChangeRing('ut-watcher')
+        yield ring
+        ring.unlink()
+        ring.close()
+
+    def test_should_wait_for_keys(self, ring):
+        watcher = Watcher(ring, NullLock(), bytes.decode)
+        assert ring.watchers == 1
+        assert watcher.wait(timeout=0) == set()
+
+        ring.publish([(CHANGE_SET, b'key')])
+        assert next(iter(watcher)) == {'key'}
+        ring.publish([(CHANGE_SET, b'key'), (CHANGE_CLEAR, None)])
+        assert watcher.wait(timeout=0) is None
+
+        watcher.close()
+        watcher.close()
+        assert ring.watchers == 0
+
+    def test_should_tail_changes(self, ring):
+        watcher = Watcher(ring, NullLock(), bytes.decode)
+        ring.publish([(CHANGE_SET, b'a'), (CHANGE_DELETE, b'b')])
+        assert watcher.changes() == [
+            Change(1, CHANGE_SET, 'a'),
+            Change(2, CHANGE_DELETE, 'b'),
+        ]
+        assert watcher.seq == 2
+        assert watcher.changes() == []
+
+        resumed = Watcher(ring, NullLock(), bytes.decode, since=1)
+        assert resumed.changes() == [Change(2, CHANGE_DELETE, 'b')]
+
+        for i in range(RECORDS + 1):
+            ring.publish([(CHANGE_SET, b'%d' % i)])
+        assert watcher.changes() is None
+        assert watcher.seq == RECORDS + 3
+        watcher.close()
+        resumed.close()
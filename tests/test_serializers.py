@@ -1,7 +1,10 @@
 import pytest
 
 from shared_memory_dict.serializers import (
+    BytesSerializer,
     JSONSerializer,
+    MarshalSerializer,
+    MsgpackSerializer,
     PickleSerializer,
     SerializationError,
     DeserializationError,
@@ -46,6 +49,12 @@ class TestPickleSerializer:
     ):
         assert pickle_serializer.dumps(dict_content) == bytes_content
 
+    def test_loads_should_accept_a_memoryview(
+        self, pickle_serializer, bytes_content, dict_content
+    ):
+        data = memoryview(bytearray(bytes_content))
+        assert pickle_serializer.loads(data) == dict_content
+
     def test_should_raise_deserialization_error_when_content_is_not_pickle(
         self, pickle_serializer, bytes_content_with_invalid_pickle
     ):
@@ -95,6 +104,12 @@ class TestJSONSerializer:
     ):
         assert json_serializer.dumps(dict_content) == bytes_content
 
+    def test_loads_should_accept_a_memoryview_without_null_byte(
+        self, json_serializer, dict_content
+    ):
+        data = memoryview(bytearray(b'{"key": "value"}'))
+        assert json_serializer.loads(data) == dict_content
+
     def test_should_raise_desserialization_error_when_content_is_not_json(
         self, json_serializer, bytes_content_with_invalid_json
     ):
@@ -111,3 +126,78 @@ class TestJSONSerializer:
         ):
             # sets are not json serializable
             json_serializer.dumps(dict_not_serializable)
+
+
+class TestMarshalSerializer:
+    @pytest.fixture
+    def marshal_serializer(self):
+        return MarshalSerializer()
+
+    def test_should_dumps_and_loads_builtin_types(self, marshal_serializer):
+        content = {"key": [1, 2.5, b'bytes', (None, True)]}
+        data = memoryview(marshal_serializer.dumps(content))
+        assert marshal_serializer.loads(data) == content
+
+    def test_should_raise_deserialization_error_when_content_is_invalid(
+        self, marshal_serializer
+    ):
+        with pytest.raises(
+            DeserializationError, match="Failed to deserialize data"
+        ):
+            marshal_serializer.loads(b'not marshal')
+
+    def test_should_raise_serialization_error_when_type_is_not_builtin(
+        self, marshal_serializer
+    ):
+        with pytest.raises(
+            SerializationError, match="Failed to serialize data"
+        ):
+            marshal_serializer.dumps({"key": object()})
+
+
+class TestMsgpackSerializer:
+    @pytest.fixture
+    def msgpack_serializer(self):
+        pytest.importorskip('msgpack')
+        return MsgpackSerializer()
+
+    def test_should_dumps_and_loads_dict(self, msgpack_serializer):
+        content = {"key": [1, 2.5, b'bytes', None, True]}
+        data = memoryview(msgpack_serializer.dumps(content))
+        assert msgpack_serializer.dumps(content) == (
+            b'\x81\xa3key\x95\x01\xcb@\x04\x00\x00\x00\x00\x00\x00'
+            b'\xc4\x05bytes\xc0\xc3'
+        )
+        assert msgpack_serializer.loads(data) == content
+
+    def test_should_raise_deserialization_error_when_content_is_invalid(
+        self, msgpack_serializer
+    ):
+        with pytest.raises(
+            DeserializationError, match="Failed to deserialize data"
+        ):
+            msgpack_serializer.loads(b'\x92\x01')
+
+    def test_should_raise_serialization_error_when_type_is_unknown(
+        self, msgpack_serializer
+    ):
+        with pytest.raises(
+            SerializationError, match="Failed to serialize data"
+        ):
+            msgpack_serializer.dumps({"key": {1, 2, 3}})
+
+
+class TestBytesSerializer:
+    def test_should_keep_bytes_as_they_are(self):
+        serializer = BytesSerializer()
+        data = serializer.dumps(b'\x00value')
+        assert data == b'\x00value'
+        assert serializer.loads(memoryview(data)) == b'\x00value'
+
+    def test_should_raise_serialization_error_when_content_is_not_bytes(
+        self,
+    ):
+        with pytest.raises(
+            SerializationError, match="Failed to serialize data"
+        ):
+            BytesSerializer().dumps('value')
@@ -0,0 +1,113 @@
+import multiprocessing
+
+import pytest
+
+from shared_memory_dict import (
+    AsyncShardedSharedMemoryDict,
+    ShardedSharedMemoryDict,
+    SharedMemoryDict,
+)
+from shared_memory_dict.hooks import free_shared_memory
+from shared_memory_dict.sharded import shard_index
+
+SHARDS = 4
+
+
+def increment(name, times):
+    smd = ShardedSharedMemoryDict(name, 4096, shards=SHARDS, lock=True)
+    for i in range(times):
+        smd.incr(f'counter-{i % 8}', default=0)
+    smd.cleanup()
+
+
+class TestShardedSharedMemoryDict:
+    @pytest.fixture
+    def smd(self):
+        smd = ShardedSharedMemoryDict('ut-sharded', 8192, shards=SHARDS)
+        yield smd
+        smd.cleanup()
+        free_shared_memory('ut-sharded', shards=SHARDS)
+
+    def test_should_spread_keys_across_shards(self, smd):
+        smd.update({f'key-{i}': i for i in range(40)})
+        assert all(len(shard) > 0 for shard in smd.shards)
+        assert len(smd) == 40
+        assert smd == {f'key-{i}': i for i in range(40)}
+        assert sorted(smd.values()) == list(range(40))
+        for key in ['key-1', 2, ('a', 1)]:
+            smd[key] = 'value'
+            assert key in smd.shards[shard_index(key, SHARDS)]
+
+    def test_should_keep_the_mapping_api(self, smd):
+        smd['key'] = 'value'
+        assert smd['key'] == 'value'
+        assert smd.get('other', 'default') == 'default'
+        assert smd.setdefault('other', 1) == 1
+        assert smd.incr('other') == 2
+        assert smd.pop('other') == 2
+        del smd['key']
+        assert 'key' not in smd
+        with pytest.raises(KeyError):
+            smd['key']
+        smd.set('key', 'value', ttl=60)
+        assert 0 < smd.ttl('key') <= 60
+        assert list(smd) == ['key']
+        smd.clear()
+        assert len(smd) == 0
+
+    def test_should_group_batches_by_shard(self, smd):
+        mapping = {f'key-{i}': i for i in range(20)}
+        smd.set_many(mapping)
+        assert smd.get_many(list(mapping) + ['x']) == mapping
+        assert smd.delete_many(['key-1', 'key-2', 'x']) == 2
+        assert sorted(smd.scan(prefix='key-1')) == [
+            'key-1' + str(i) for i in range(10)
+        ]
+        assert smd.delete_prefix('key-1') == 10
+        assert len(smd) == 8
+
+    def test_should_compare_and_swap_in_the_shard_of_the_key(self, smd):
+        smd['key'] = 'value'
+        value, version = smd.get_with_version('key')
+        assert smd.shard('key').get_with_version('key') == (value, version)
+        assert smd.cas('key', version, 'other') is True
+        assert smd.cas('key', version, 'another') is False
+        assert smd.cas_delete('key', smd.get_with_version('key')[1]) is True
+        assert 'key' not in smd
+
+    def test_should_size_the_shards(self, smd):
+        assert all(shard.shm.size == 2048 for shard in smd.shards)
+        assert isinstance(smd.shards[0], SharedMemoryDict)
+
+    def test_should_not_lose_increments_of_other_processes(self, smd):
+        context = multiprocessing.get_context('spawn')
+        processes = [
+            context.Process(target=increment, args=('ut-sharded', 400))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        assert smd.get_many([f'counter-{i}' for i in range(8)]) == {
+            f'counter-{i}': 200 for i in range(8)
+        }
+
+
+@pytest.mark.asyncio
+class TestAsyncShardedSharedMemoryDict:
+    async def test_should_spread_keys_across_shards(self):
+        smd = AsyncShardedSharedMemoryDict('ut-async-sharded', 4096, shards=2)
+        mapping = {f'key-{i}': i for i in range(20)}
+        await smd.set_many(mapping, ttl=60)
+        assert await smd.get_many(list(mapping)) == mapping
+        assert await smd.get('key-1') == 1
+        assert await smd.incr('key-1') == 2
+        assert await smd.delete_many(['key-1', 'key-2']) == 2
+        assert await smd.delete_prefix('key-1') == 10
+        assert await smd.exists('key-3') is True
+        await smd.clear()
+        assert await smd.get_many(list(mapping)) == {}
+
+        smd.cleanup()
+        free_shared_memory('ut-async-sharded', shards=2)
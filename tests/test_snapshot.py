@@ -0,0 +1,76 @@
+import pytest
+
+from shared_memory_dict.snapshot import (
+    SnapshotError,
+    read_snapshot,
+    snapshot_size,
+    write_snapshot,
+)
+from shared_memory_dict.storage import HashTable
+
+
+class TestSnapshot:
+    @pytest.fixture
+    def table(self):
+        table = HashTable(memoryview(bytearray(1024)))
+        table.initialize()
+        table.insert(b'key', b'value', 0, 0)
+        return table
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / 'smd.snapshot')
+
+    def test_should_write_and_read_the_memory_block(self, table, path):
+        write_snapshot(table.buf, path)
+        assert snapshot_size(path) == 1024
+        with read_snapshot(path) as data:
+            assert data == table.buf
+            assert bytes(HashTable(data).get(b'key')) == b'value'
+
+    def test_should_reject_corrupted_snapshots(self, table, path):
+        write_snapshot(table.buf, path)
+        with open(path, 'r+b') as file:
+            file.seek(-1, 2)
+            file.write(b'x')
+        with pytest.raises(SnapshotError, match='corrupted'):
+            with read_snapshot(path):
+                pass
+
+    def test_should_reject_truncated_snapshots(self, table, path):
+        write_snapshot(table.buf, path)
+        with open(path, 'r+b') as file:
+            file.truncate(512)
+        with pytest.raises(SnapshotError, match='truncated'):
+            with read_snapshot(path):
+                pass
+
+    def test_should_reject_other_files(self, path):
+        with open(path, 'wb') as file:
+            file.write(b'not a snapshot at all')
+        with pytest.raises(SnapshotError):
+            snapshot_size(path)
+
+
+class TestLoad:
+    def test_should_keep_the_counters_of_the_table(self):
+        source = HashTable(memoryview(bytearray(1024)))
+        source.initialize(prefix_index=True)
+        source.insert(b'key', b'value', 0, 0)
+
+        table = HashTable(memoryview(bytearray(1024)))
+        table.initialize()
+        table.watched = True
+        for _ in range(5):
+            table.begin_write()
+            table.end_write()
+        table.begin_write()
+        table.journal = []
+        table.load(source.buf)
+
+        assert table.generation == 5
+        assert table.sequence % 2 == 1
+        assert table.watched and table.prefix_index
+        assert table.journal == [(3, None)]
+        table.end_write()
+        assert bytes(table.get(b'key')) == b'value'
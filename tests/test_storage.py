@@ -0,0 +1,225 @@
+import random
+import time
+
+import pytest
+
+from shared_memory_dict.storage import MIN_BUCKETS, HashTable, StorageFullError
+
+
+class TestHashTable:
+    @pytest.fixture
+    def table(self):
+        table = HashTable(memoryview(bytearray(4096)))
+        table.initialize()
+        return table
+
+    def test_should_be_initialized(self, table):
+        assert table.is_initialized() is True
+        assert len(table) == 0
+
+    def test_should_not_be_initialized_when_memory_is_empty(self):
+        assert HashTable(memoryview(bytearray(4096))).is_initialized() is False
+
+    def test_should_insert_and_get(self, table):
+        table.insert(b'key', b'value')
+        assert table.get(b'key') == b'value'
+        assert table.get(b'unknown') is None
+
+    def test_should_grow_index(self, table):
+        for i in range(MIN_BUCKETS * 4):
+            table.insert(b'key-%d' % i, b'%d' % i)
+        assert len(table) == MIN_BUCKETS * 4
+        assert all(
+            table.get(b'key-%d' % i) == b'%d' % i
+            for i in range(MIN_BUCKETS * 4)
+        )
+
+    def test_should_replace_with_a_bigger_value(self, table):
+        table.insert(b'key', b'small')
+        table.insert(b'other', b'value')
+        table.insert(b'key', b'a much bigger value')
+        assert list(table.items()) == [
+            (b'key', b'a much bigger value'),
+            (b'other', b'value'),
+        ]
+
+    def test_should_compact_heap_when_full(self, table):
+        for i in range(100):
+            table.insert(b'key', b'x' * (i % 7 + 1) * 100)
+        assert table.get(b'key') == b'x' * (99 % 7 + 1) * 100
+
+    def test_should_reuse_freed_blocks(self, table):
+        for i in range(4):
+            table.insert(b'key-%d' % i, b'x' * 100)
+        table.delete(b'key-1')
+        assert table.fragmentation > 0
+        table.insert(b'other', b'y' * 100)
+        assert table.fragmentation == 0
+        assert table.get(b'key-2') == b'x' * 100
+
+    def test_should_merge_freed_blocks(self, table):
+        for i in range(5):
+            table.insert(b'key-%d' % i, b'x' * 100)
+        table.delete(b'key-1')
+        table.delete(b'key-3')
+        table.delete(b'key-2')
+        table.insert(b'other', b'y' * 340)
+        assert table.fragmentation == 0
+
+    def test_should_compact(self, table):
+        for i in range(10):
+            table.insert(b'key-%d' % i, b'%d' % i * 100)
+        for i in range(0, 10, 2):
+            table.delete(b'key-%d' % i)
+        assert table.fragmentation > 0
+        while table.compact(2):
+            pass
+        assert table.fragmentation == 0
+        assert {bytes(k): bytes(v) for k, v in table.items()} == {
+            b'key-%d' % i: b'%d' % i * 100 for i in range(1, 10, 2)
+        }
+
+    def test_should_keep_values_under_churn(self, table):
+        rand = random.Random(0)
+        expected = {}
+        for i in range(2000):
+            key = b'key-%d' % rand.randrange(20)
+            if rand.random() < 0.7:
+                value = bytes([i % 256]) * rand.choice([1, 30, 100, 400])
+                try:
+                    table.insert(key, value)
+                except ValueError:
+                    continue
+                expected[key] = value
+            else:
+                table.delete(key)
+                expected.pop(key, None)
+        assert {bytes(k): bytes(v) for k, v in table.items()} == expected
+
+    def test_should_not_repack_on_every_insert_when_nearly_full(
+        self, monkeypatch
+    ):
+        repacks = []
+        repack = HashTable._repack
+        monkeypatch.setattr(
+            HashTable, '_repack', lambda table: repacks.append(repack(table))
+        )
+        rand = random.Random(1)
+        table = HashTable(memoryview(bytearray(64 * 1024)))
+        table.initialize()
+        for _ in range(5000):
+            key = b'key-%d' % rand.randrange(1000)
+            try:
+                table.insert(key, b'x' * rand.randrange(10, 120))
+            except StorageFullError:
+                table.delete(b'key-%d' % rand.randrange(1000))
+        assert len(repacks) < 50
+        assert len(table) > 300
+
+    def test_should_find_keys_by_prefix(self):
+        table = HashTable(memoryview(bytearray(4096)))
+        table.initialize(prefix_index=True)
+        for key in (b'b:2', b'a:1', b'c:1', b'b:1', b'a:2'):
+            table.insert(key, b'value')
+        assert [table.key(ix) for ix in table.prefixed(b'b:')] == [
+            b'b:1',
+            b'b:2',
+        ]
+        assert table.delete_prefix(b'a:') == 2
+        assert list(table.keys()) == [b'b:2', b'c:1', b'b:1']
+        assert [table.key(ix) for ix in table.prefixed(b'')] == [
+            b'b:1',
+            b'b:2',
+            b'c:1',
+        ]
+
+    def test_should_find_keys_by_prefix_without_index(self, table):
+        for key in (b'b:2', b'a:1', b'b:1'):
+            table.insert(key, b'value')
+        assert [table.key(ix) for ix in table.prefixed(b'b:')] == [
+            b'b:2',
+            b'b:1',
+        ]
+        assert table.delete_prefix(b'b:') == 2
+        assert list(table.keys()) == [b'a:1']
+
+    def test_should_keep_prefix_index_when_the_index_grows(self):
+        table = HashTable(memoryview(bytearray(8192)))
+        table.initialize(prefix_index=True)
+        for i in range(MIN_BUCKETS * 4):
+            table.insert(b'key-%02d' % (MIN_BUCKETS * 4 - i), b'%d' % i)
+        keys = [table.key(ix).tobytes() for ix in table.prefixed(b'key-')]
+        assert keys == sorted(keys)
+        assert len(keys) == MIN_BUCKETS * 4
+
+    def test_should_keep_value_when_storage_is_exceeded(self, table):
+        table.insert(b'key', b'value')
+        with pytest.raises(ValueError, match='exceeds available storage'):
+            table.insert(b'key', b'x' * 4096)
+        assert table.get(b'key') == b'value'
+
+    def test_should_pop_last_inserted(self, table):
+        table.insert(b'first', b'1')
+        table.insert(b'last', b'2')
+        assert table.pop_last() == (b'last', b'2', 0)
+        assert list(table.keys()) == [b'first']
+
+    def test_should_raise_key_error_when_pop_last_on_empty(self, table):
+        with pytest.raises(KeyError):
+            table.pop_last()
+
+    def test_should_clear(self, table):
+        table.insert(b'key', b'value')
+        table.clear()
+        assert len(table) == 0
+        assert table.get(b'key') is None
+
+    def test_should_remove_entry(self, table):
+        table.insert(b'first', b'1')
+        table.insert(b'last', b'2')
+        table.remove(table.lookup(b'first'))
+        assert list(table.keys()) == [b'last']
+        assert table.is_live(0) is False
+
+    def test_should_keep_access_slots_out_of_the_heap(self, table):
+        table.set_access(123, 42)
+        for i in range(100):
+            table.insert(b'key', b'x' * (i % 7 + 1) * 100)
+        assert table.access(123) == 42
+
+    def test_should_skip_expired_entries(self, table):
+        table.insert(b'expired', b'1', time.time() - 1)
+        table.insert(b'alive', b'2', time.time() + 60)
+        assert table.get(b'expired') is None
+        assert list(table.keys()) == [b'alive']
+        assert table.delete(b'expired') is False
+        assert len(table) == 1
+
+    def test_should_sweep_expired_entries(self, table):
+        for i in range(10):
+            table.insert(b'key-%d' % i, b'value', time.time() + i % 2 * 60)
+        assert table.sweep(4) == 2
+        assert table.sweep() == 3
+        assert len(table) == 5
+
+    def test_should_version_entries_on_every_write(self, table):
+        table.insert(b'key', b'\x00' * 8)
+        first = table.version(table.lookup(b'key'))
+        assert first != 0
+        table.end_write()
+        table.insert(b'key', b'\x01' * 8)
+        second = table.version(table.lookup(b'key'))
+        assert second != first
+        table.end_write()
+        table.increment(table.lookup(b'key'), 1)
+        assert table.version(table.lookup(b'key')) not in (0, first, second)
+
+    def test_should_keep_versions_when_copied(self, table):
+        table.insert(b'key', b'value')
+        table.end_write()
+        other = HashTable(memoryview(bytearray(8192)))
+        other.initialize()
+        table.copy_to(other)
+        assert other.version(other.lookup(b'key')) == table.version(
+            table.lookup(b'key')
+        )